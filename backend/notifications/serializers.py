@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from swiftcourier_backend.instrumentation import TimedSerializerMixin
 from .models import Notification
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
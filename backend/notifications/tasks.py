@@ -109,4 +109,57 @@ def send_admin_notification_email(package_id, recipient_email, subject, message)
         
     except Exception as e:
         logger.error(f"Failed to send admin email: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+@shared_task()
+def send_bulk_created_notification_email(sender_id, tracking_numbers):
+    """Send a single summary email for a batch of packages created together"""
+    from django.contrib.auth import get_user_model
+
+    try:
+        sender = get_user_model().objects.get(id=sender_id)
+        packages = list(Package.objects.filter(tracking_number__in=tracking_numbers))
+
+        listing = '\n'.join(
+            f"  {package.tracking_number} - {package.recipient_name}" for package in packages
+        )
+        email_content = f"""
+Dear {sender.get_full_name() or sender.username},
+
+{len(packages)} packages have been created and are awaiting pickup:
+
+{listing}
+
+Track your packages: {settings.FRONTEND_URL}/dashboard
+
+Thank you for choosing SwiftCourier!
+
+Best regards,
+SwiftCourier Team
+        """
+
+        success = send_mail(
+            subject=f"SwiftCourier: {len(packages)} Packages Created - Awaiting Pickup",
+            message=email_content,
+            from_email=settings.EMAIL_HOST_USER,
+            recipient_list=[sender.email],
+            fail_silently=False,
+        )
+
+        Notification.objects.bulk_create([
+            Notification(
+                package=package,
+                type='email',
+                recipient=sender.email,
+                message=email_content,
+                status='sent' if success else 'failed'
+            ) for package in packages
+        ])
+
+        logger.info(f"Bulk creation email sent to {sender.email} for {len(packages)} packages")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to send bulk creation email: {str(e)}")
+        return False
@@ -0,0 +1,136 @@
+# backend/packages/bulk.py
+"""
+Single-transaction write path for bulk package intake.
+
+``bulk_create`` skips ``Package.save()`` and the post_save signals, so this
+module does the work they would have done - initial tracking events, QR and
+geocoding queueing, WebSocket broadcasts and emails - once per batch or once
+per sender instead of once per package.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Package
+from .geocoding import join_address, queue_geocoding
+from .list_cache import package_list_cache
+from .pricing import quote_many
+from .qr import queue_qr_code
+from .tracking_numbers import get_tracking_number_generator
+
+logger = logging.getLogger(__name__)
+
+
+def price_rows(rows):
+    """
+    Set ``shipping_cost``, ``base_rate`` and ``distance_rate`` on validated
+    ``rows`` with one ``quote_many`` call for the whole batch.
+    """
+    # Only already geocoded addresses are used, as for single packages
+    items = [
+        {
+            'sender_address': join_address(row.get('sender_address'), row.get('sender_city'),
+                                           row.get('sender_state'), row.get('sender_zip')),
+            'recipient_address': join_address(row.get('recipient_address'), row.get('recipient_city'),
+                                              row.get('recipient_state'), row.get('recipient_zip')),
+            'weight': row.get('weight', 0),
+            'length': row.get('length', 0),
+            'width': row.get('width', 0),
+            'height': row.get('height', 0),
+            'package_type': row.get('package_type'),
+        }
+        for row in rows
+    ]
+    for row, breakdown in zip(rows, quote_many(items, remote=False)):
+        row['shipping_cost'] = breakdown['total_cost']
+        row['base_rate'] = breakdown['base_rate']
+        row['distance_rate'] = breakdown['distance_cost']
+    return rows
+
+
+def create_packages_in_bulk(sender, rows):
+    """
+    Create packages for already validated ``rows`` (dicts of model fields).
+
+    Returns the saved packages in input order.
+    """
+    from tracking.models import TrackingEvent
+
+    batch_size = getattr(settings, 'PACKAGE_BULK_BATCH_SIZE', 500)
+
+    # One block reservation for the whole batch
+    tracking_numbers = get_tracking_number_generator().generate_many(len(rows))
+
+    packages = [
+        Package(sender=sender, tracking_number=tracking_number, **row)
+        for row, tracking_number in zip(rows, tracking_numbers)
+    ]
+
+    with transaction.atomic():
+        Package.objects.bulk_create(packages, batch_size=batch_size)
+
+        events = []
+        for package in packages:
+            events.extend(TrackingEvent.initial_events_for(package))
+        TrackingEvent.objects.bulk_create(events, batch_size=batch_size)
+
+        for package in packages:
+            queue_qr_code(package.tracking_number)
+            if package.recipient_latitude is None and package.recipient_address:
+                queue_geocoding(package.id)
+
+        transaction.on_commit(lambda: notify_packages_created(packages))
+
+    return packages
+
+
+def notify_packages_created(packages):
+    """Send one WebSocket message and one email task per sender"""
+    by_sender = defaultdict(list)
+    for package in packages:
+        by_sender[package.sender_id].append(package)
+
+    from notifications.tasks import send_bulk_created_notification_email
+    from tracking.broadcasts import send_group_messages
+
+    messages = []
+    for sender_id, sender_packages in by_sender.items():
+        package_list_cache.bump(sender_id)
+        messages.append((
+            f'notifications_{sender_id}',
+            {
+                'type': 'new_packages',
+                'data': {
+                    'sender_id': sender_id,
+                    'count': len(sender_packages),
+                    'packages': [
+                        {
+                            'package_id': package.id,
+                            'tracking_number': package.tracking_number,
+                            'status': package.status,
+                            'recipient_name': package.recipient_name,
+                            'recipient_address': package.recipient_address,
+                            'created_at': package.created_at.isoformat(),
+                        } for package in sender_packages
+                    ]
+                }
+            }
+        ))
+
+    try:
+        send_group_messages(messages)
+    except Exception as e:
+        logger.warning(f"Bulk intake broadcast failed: {e}")
+
+    for sender_id, sender_packages in by_sender.items():
+        try:
+            tracking_numbers = [package.tracking_number for package in sender_packages]
+            if hasattr(send_bulk_created_notification_email, 'delay'):
+                send_bulk_created_notification_email.delay(sender_id, tracking_numbers)
+            else:
+                # Fallback to synchronous call
+                send_bulk_created_notification_email(sender_id, tracking_numbers)
+        except Exception as e:
+            logger.warning(f"Bulk intake email failed for sender {sender_id}: {e}")
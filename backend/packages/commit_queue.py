@@ -0,0 +1,55 @@
+# backend/packages/commit_queue.py
+"""
+Per-transaction queues for background work on new packages.
+
+Items queued during a transaction are collected in one batch and handed to
+``dispatch`` once, when the transaction commits. The batch is registered
+with ``on_commit`` in the savepoint it was started in, so rolling back the
+transaction or that savepoint drops it together with its items. Queuing
+inside a different savepoint starts a new batch for that savepoint.
+
+In autocommit mode each item is dispatched immediately.
+"""
+import threading
+
+from django.db import transaction
+
+
+class CommitBatch:
+
+    def __init__(self, dispatch, savepoint_ids):
+        self.dispatch = dispatch
+        self.savepoint_ids = savepoint_ids
+        self.items = []
+        # Kept so the registered on_commit callback can be recognised later
+        self.callback = self.flush
+
+    def flush(self):
+        items, self.items = self.items, []
+        if items:
+            self.dispatch(items)
+
+
+class CommitQueue:
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        self._local = threading.local()
+
+    def add(self, item):
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self.dispatch([item])
+            return
+
+        savepoint_ids = tuple(connection.savepoint_ids)
+        batch = getattr(self._local, 'batch', None)
+        if (
+            batch is None
+            or batch.savepoint_ids != savepoint_ids
+            # Dropped by a rollback, or already run by a commit
+            or not any(entry[1] is batch.callback for entry in connection.run_on_commit)
+        ):
+            batch = self._local.batch = CommitBatch(self.dispatch, savepoint_ids)
+            transaction.on_commit(batch.callback)
+        batch.items.append(item)
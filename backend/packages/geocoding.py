@@ -0,0 +1,225 @@
+# backend/packages/geocoding.py
+"""
+Address geocoding.
+
+Each normalized address is geocoded once: results live in a bounded
+in-process LRU and in the ``GeocodedAddress`` table, and only a miss in both
+reaches the geocoding provider. Package recipients are geocoded in the
+background after their package is committed, mirroring QR rendering, so the
+write path never waits on the network.
+"""
+import hashlib
+import json
+import logging
+import re
+from collections import defaultdict
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from swiftcourier_backend.cache_utils import LocalLRUCache
+
+from .commit_queue import CommitQueue
+
+logger = logging.getLogger(__name__)
+
+# Stored in the local cache for addresses the provider could not resolve
+NOT_FOUND = 'not-found'
+
+
+def normalize_address(address):
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', address or '')).strip().lower()
+
+
+def address_hash(address):
+    return hashlib.sha256(normalize_address(address).encode()).hexdigest()
+
+
+def join_address(*parts):
+    return ', '.join(part for part in parts if part)
+
+
+def recipient_address(package):
+    return join_address(
+        package.recipient_address, package.recipient_city,
+        package.recipient_state, package.recipient_zip
+    )
+
+
+def sender_address(package):
+    return join_address(
+        package.sender_address, package.sender_city,
+        package.sender_state, package.sender_zip
+    )
+
+
+class BaseGeocoder:
+    """Interface for geocoding providers"""
+
+    def geocode(self, address):
+        """Return ``(latitude, longitude)`` or None"""
+        raise NotImplementedError
+
+
+class NullGeocoder(BaseGeocoder):
+    """Used when no provider is configured: only stored coordinates are known"""
+
+    def geocode(self, address):
+        return None
+
+
+class GoogleMapsGeocoder(BaseGeocoder):
+    url = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+    def __init__(self, api_key=None, timeout=None):
+        self.api_key = api_key or settings.GOOGLE_MAPS_API_KEY
+        self.timeout = timeout or getattr(settings, 'GEOCODING_TIMEOUT', 3)
+
+    def geocode(self, address):
+        query = urlencode({'address': address, 'key': self.api_key})
+        try:
+            with urlopen(f'{self.url}?{query}', timeout=self.timeout) as response:
+                payload = json.load(response)
+        except (URLError, OSError, ValueError) as e:
+            logger.warning(f"Geocoding request failed: {e}")
+            return None
+
+        if payload.get('status') != 'OK' or not payload.get('results'):
+            return None
+        location = payload['results'][0]['geometry']['location']
+        return location['lat'], location['lng']
+
+
+def get_geocoder():
+    path = getattr(settings, 'GEOCODER', None)
+    if path:
+        return import_string(path)()
+    if getattr(settings, 'GOOGLE_MAPS_API_KEY', None):
+        return GoogleMapsGeocoder()
+    return NullGeocoder()
+
+
+class AddressGeocodeCache:
+
+    def __init__(self):
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'GEOCODING_CACHE_MAX_ENTRIES', 50000),
+            timeout=getattr(settings, 'GEOCODING_CACHE_TIMEOUT', 86400)
+        )
+        self._geocoder = None
+
+    @property
+    def geocoder(self):
+        if self._geocoder is None:
+            self._geocoder = get_geocoder()
+        return self._geocoder
+
+    def lookup(self, address, remote=True):
+        """
+        Return ``(latitude, longitude)`` for ``address`` or None. With
+        ``remote=False`` only coordinates already known are returned.
+        """
+        from .models import GeocodedAddress
+
+        if not normalize_address(address):
+            return None
+
+        key = address_hash(address)
+        cached = self._local.get(key)
+        if cached == NOT_FOUND:
+            return None
+        if cached is not None:
+            return cached
+
+        stored = GeocodedAddress.objects.filter(address_hash=key).values_list('latitude', 'longitude').first()
+        if stored is not None:
+            point = (float(stored[0]), float(stored[1]))
+            self._local.set(key, point)
+            return point
+
+        if not remote:
+            return None
+
+        point = self.geocoder.geocode(address)
+        if point is None:
+            self._local.set(key, NOT_FOUND)
+            return None
+
+        GeocodedAddress.objects.get_or_create(
+            address_hash=key,
+            defaults={'address': address, 'latitude': point[0], 'longitude': point[1]}
+        )
+        point = (float(point[0]), float(point[1]))
+        self._local.set(key, point)
+        return point
+
+
+geocode_cache = AddressGeocodeCache()
+
+
+def geocode_address(address, remote=True):
+    return geocode_cache.lookup(address, remote=remote)
+
+
+def geocode_packages(package_ids):
+    """Store recipient coordinates for every listed package that lacks them"""
+    from .models import Package
+
+    packages = list(
+        Package.objects.filter(id__in=package_ids, recipient_latitude__isnull=True)
+        .only('id', 'recipient_address', 'recipient_city', 'recipient_state', 'recipient_zip')
+    )
+
+    located = []
+    for package in packages:
+        point = geocode_address(recipient_address(package))
+        if point is not None:
+            package.recipient_latitude, package.recipient_longitude = (round(value, 7) for value in point)
+            located.append(package)
+
+    if located:
+        # bulk_update keeps the package post_save broadcasts quiet
+        Package.objects.bulk_update(located, ['recipient_latitude', 'recipient_longitude'])
+
+        from routes.distance import stop_tables
+        from .service_areas import service_area_index
+
+        by_area = defaultdict(list)
+        for package in located:
+            latitude, longitude = float(package.recipient_latitude), float(package.recipient_longitude)
+            area = service_area_index.locate(latitude, longitude)
+            by_area[area.name if area is not None else None].append((package.id, latitude, longitude))
+        for area, stops in by_area.items():
+            stop_tables.add_many(stops, area)
+
+    return len(located)
+
+
+def dispatch_geocoding(package_ids):
+    """Hand ``package_ids`` to the worker in batches of GEOCODING_BATCH_SIZE"""
+    batch_size = getattr(settings, 'GEOCODING_BATCH_SIZE', 200)
+
+    from .tasks import geocode_packages_task
+
+    for start in range(0, len(package_ids), batch_size):
+        batch = package_ids[start:start + batch_size]
+        try:
+            if hasattr(geocode_packages_task, 'delay'):
+                geocode_packages_task.delay(batch)
+            else:
+                # Fallback to synchronous call
+                geocode_packages_task(batch)
+        except Exception as e:
+            # Route planning falls back to ZIP clustering for these packages
+            logger.warning(f"Could not queue geocoding for {len(batch)} packages: {e}")
+
+
+_queue = CommitQueue(dispatch_geocoding)
+
+
+def queue_geocoding(package_id):
+    """Queue a package for background geocoding once the transaction commits"""
+    _queue.add(package_id)
@@ -0,0 +1,183 @@
+# backend/packages/list_cache.py
+"""
+Generation-stamped cache for package list results.
+
+Results are keyed by list scope (one customer, or everything for admins),
+the scope's generation counter and the request's filter
+parameters. Changing a package bumps its sender's generation and the global
+one, so every cached list that could contain it stops matching immediately
+and ages out of the bounded cache instead of being served stale.
+
+Generations start with the time of the bump. Within
+``DATABASE_REPLICA_MAX_LAG`` seconds of it, lists are built from the primary,
+since a replica may not have the change yet and the stale list would be
+cached under the new generation.
+"""
+import contextlib
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+from swiftcourier_backend.cache_utils import LocalLRUCache
+from swiftcourier_backend.routers import primary_reads
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = 'all'
+
+
+def package_list_scope(user):
+    """
+    Customers only ever see their own packages and admins see everything.
+    Driver lists depend on route assignments, which do not bump generations,
+    so they are not cached (None).
+    """
+    user_type = getattr(user, 'user_type', None)
+    if user_type == 'customer':
+        return f'user:{user.id}'
+    if user_type == 'admin':
+        return GLOBAL_SCOPE
+    return None
+
+
+class PackageListCache:
+
+    def __init__(self):
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'PACKAGE_LIST_CACHE_MAX_ENTRIES', 2000),
+            timeout=self.timeout
+        )
+        # Generations used when there is no shared cache
+        self._local_generations = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'generation_bumps': 0}
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'PACKAGE_LIST_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'PACKAGE_LIST_CACHE_TIMEOUT', 300)
+
+    def lookup(self, scope, params):
+        """
+        Return ``(data, generation)``. ``data`` is None on a miss; pass the
+        returned generation to ``store`` so a result computed while a package
+        changed is stored under the old, already retired generation.
+        """
+        generation = self._generation(scope)
+        key = self._key(scope, generation, params)
+
+        data = self._local.get(key)
+        if data is None and self.shared is not None:
+            try:
+                data = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Shared package list cache unavailable: {e}")
+            if data is not None:
+                self._local.set(key, data)
+
+        self._count('hits' if data is not None else 'misses')
+        return data, generation
+
+    def store(self, scope, params, generation, data):
+        key = self._key(scope, generation, params)
+        self._local.set(key, data)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, data, self.timeout)
+            except Exception as e:
+                logger.warning(f"Could not store package list for {scope}: {e}")
+        self._count('stores')
+
+    def reads_for(self, generation):
+        """Context to build a list for ``generation`` in: the primary right after a bump"""
+        return primary_reads() if self._recently_bumped(generation) else contextlib.nullcontext()
+
+    def bump(self, sender_id):
+        """Retire every cached list that may contain a package of ``sender_id``"""
+        for scope in (f'user:{sender_id}', GLOBAL_SCOPE):
+            self._bump_scope(scope)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['local_entries'] = len(self._local)
+        stats['local_evictions'] = self._local.evictions
+        return stats
+
+    def _bump_scope(self, scope):
+        self._count('generation_bumps')
+        generation = self._new_generation()
+        with self._lock:
+            self._local_generations[scope] = generation
+
+        shared = self.shared
+        if shared is None:
+            return
+
+        try:
+            shared.set(self._generation_key(scope), generation, None)
+        except Exception as e:
+            logger.error(f"Package list generation bump failed for {scope}: {e}")
+
+    def _generation(self, scope):
+        shared = self.shared
+        if shared is None:
+            with self._lock:
+                return self._local_generations.get(scope, 0)
+
+        key = self._generation_key(scope)
+        try:
+            generation = shared.get(key)
+            if generation is None:
+                # Missing or evicted: the last bump time is unknown, so the
+                # new generation counts as a fresh bump
+                shared.add(key, self._new_generation(), None)
+                generation = shared.get(key)
+            return generation
+        except Exception as e:
+            logger.warning(f"Shared package list cache unavailable: {e}")
+            # Never match a cached entry while the generation is unknown
+            return f'unknown-{time.monotonic_ns()}'
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _new_generation():
+        return f'{time.time():.3f}:{uuid.uuid4().hex}'
+
+    @staticmethod
+    def _recently_bumped(generation):
+        """Whether the write behind ``generation`` may not have reached the replicas yet"""
+        bumped_at, _, _ = str(generation).partition(':')
+        try:
+            age = time.time() - float(bumped_at)
+        except ValueError:
+            return False
+        return age < getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+
+    @staticmethod
+    def _generation_key(scope):
+        return f'packages:list:generation:{scope}'
+
+    @staticmethod
+    def _key(scope, generation, params):
+        query = urlencode(sorted(params.lists()), doseq=True) if hasattr(params, 'lists') else urlencode(sorted(params.items()))
+        digest = hashlib.md5(query.encode()).hexdigest()
+        return f'packages:list:{scope}:{generation}:{digest}'
+
+
+package_list_cache = PackageListCache()
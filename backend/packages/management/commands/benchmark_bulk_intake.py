@@ -0,0 +1,65 @@
+# backend/packages/management/commands/benchmark_bulk_intake.py
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from packages.bulk import create_packages_in_bulk
+from packages.models import Package
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare bulk package intake with the per-item create path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Packages per run')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        User = get_user_model()
+        sender, _ = User.objects.get_or_create(
+            username='benchmark-merchant',
+            defaults={'email': 'benchmark@example.com'}
+        )
+        rows = [self._row(i) for i in range(count)]
+
+        self.stdout.write(f'Creating {count} packages per path (changes are rolled back)...')
+
+        per_item = self._timed(lambda: [Package.objects.create(sender=sender, **row) for row in rows])
+        bulk = self._timed(lambda: create_packages_in_bulk(sender, rows))
+
+        self.stdout.write(f'Per-item path: {per_item:.2f}s ({count / per_item:.0f} packages/s)')
+        self.stdout.write(f'Bulk path:     {bulk:.2f}s ({count / bulk:.0f} packages/s)')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {per_item / bulk:.1f}x'))
+
+    def _timed(self, func):
+        """Seconds ``func`` takes inside a transaction that is always rolled back"""
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                func()
+                elapsed = time.perf_counter() - start
+                raise _Rollback()
+        except _Rollback:
+            # Only reached after func() returned; its own errors propagate as is
+            return elapsed
+
+    def _row(self, i):
+        return {
+            'sender_name': 'Benchmark Merchant',
+            'sender_address': '1 Warehouse Way',
+            'recipient_name': f'Recipient {i}',
+            'recipient_address': f'{i} Main Street',
+            'package_type': 'package',
+            'weight': Decimal('1.50'),
+            'length': Decimal('20.00'),
+            'width': Decimal('15.00'),
+            'height': Decimal('10.00'),
+            'shipping_cost': Decimal('13.01'),
+        }
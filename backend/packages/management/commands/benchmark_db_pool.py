@@ -0,0 +1,91 @@
+# backend/packages/management/commands/benchmark_db_pool.py
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import RequestFactory
+
+from packages import views
+from packages.models import Package
+from packages.snapshots import build_tracking_snapshot
+from swiftcourier_backend.db_pool.pool import pool_stats
+
+
+class UncachedSnapshots:
+    """Build the snapshot on every request so each one reaches the database"""
+
+    def get(self, tracking_number):
+        return build_tracking_snapshot(tracking_number)
+
+
+class Command(BaseCommand):
+    help = 'Compare track_package latency when reconnecting on every request with pooled connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tracking-number', help='Defaults to the first package')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per thread')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--cached', action='store_true', help='Keep the snapshot cache in front of the database')
+
+    def handle(self, *args, **options):
+        tracking_number = options['tracking_number'] or (
+            Package.objects.order_by('id').values_list('tracking_number', flat=True).first()
+        )
+        if tracking_number is None:
+            raise CommandError('No packages to track; create one or pass --tracking-number.')
+        connections.close_all()
+
+        engine = connections['default'].settings_dict['ENGINE']
+        self.stdout.write(f'track_package({tracking_number}) on {engine}, {options["threads"]} threads')
+
+        snapshots = views.tracking_snapshots
+        if not options['cached']:
+            views.tracking_snapshots = UncachedSnapshots()
+        try:
+            for label, reconnect in (('reconnect per request (previous middleware)', True), ('pooled', False)):
+                latencies = self._run(tracking_number, reconnect, options)
+                latencies.sort()
+                self.stdout.write(
+                    f'{label}: p50 {statistics.median(latencies):.2f}ms, '
+                    f'p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f}ms, '
+                    f'mean {statistics.fmean(latencies):.2f}ms over {len(latencies)} requests'
+                )
+        finally:
+            views.tracking_snapshots = snapshots
+
+        for alias, stats in pool_stats().items():
+            self.stdout.write(f'pool {alias}: {stats}')
+
+    def _run(self, tracking_number, reconnect, options):
+        factory = RequestFactory()
+        path = f'/api/packages/{tracking_number}/track/'
+
+        def worker(_):
+            latencies = []
+            for _ in range(options['requests']):
+                request = factory.get(path)
+                start = time.perf_counter()
+                if reconnect:
+                    self._disconnect()
+                close_old_connections()  # request_started
+                response = views.track_package(request, tracking_number=tracking_number)
+                response.render()
+                close_old_connections()  # request_finished
+                latencies.append((time.perf_counter() - start) * 1000)
+            connections.close_all()
+            return latencies
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            return [latency for chunk in executor.map(worker, range(options['threads'])) for latency in chunk]
+
+    @staticmethod
+    def _disconnect():
+        """What DatabaseConnectionMiddleware did: end every open session"""
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None:
+                # Closing the driver connection first ends the session even
+                # when the wrapper would return it to a pool
+                connection.connection.close()
+            connection.close()
@@ -0,0 +1,85 @@
+# backend/packages/management/commands/benchmark_rate_limiter.py
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from swiftcourier_backend.middleware import EnhancedRateLimitMiddleware
+from swiftcourier_backend.rate_limiting import LocalTokenBucketLimiter, RedisSlidingWindowLimiter
+
+
+class CacheListLimiter:
+    """The previous approach: a list of timestamps per rule, read and rewritten through the cache"""
+
+    def check(self, client_id, rules):
+        now = int(time.time())
+        allowed = True
+        for rule in rules:
+            key = f'benchmark-ratelimit:{rule.name}:{client_id}'
+            requests = [t for t in cache.get(key, []) if now - t < rule.window]
+            if len(requests) >= rule.limit:
+                allowed = False
+                break
+            requests.append(now)
+            cache.set(key, requests, rule.window * 2)
+        return _Decision(allowed)
+
+
+class _Decision:
+    def __init__(self, allowed):
+        self.allowed = allowed
+
+    def headers(self):
+        return {}
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request overhead of the rate limiting middleware for each limiter engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--clients', type=int, default=1000, help='Distinct client IPs')
+        parser.add_argument('--path', default='/api/tracking/SC123/')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        factory = RequestFactory()
+        requests = [
+            factory.get(options['path'], REMOTE_ADDR=f'10.0.{n // 256}.{n % 256}')
+            for n in (rng.randrange(options['clients']) for _ in range(options['requests']))
+        ]
+
+        def view(request):
+            return HttpResponse('ok')
+
+        baseline = self._time(view, requests)
+        self.stdout.write(f'No middleware: {baseline:.1f}us per request')
+
+        engines = [('local token buckets', LocalTokenBucketLimiter()), ('cache list (previous)', CacheListLimiter())]
+        url = getattr(settings, 'RATE_LIMIT_REDIS_URL', None)
+        if url:
+            engines.insert(0, ('redis sliding window', RedisSlidingWindowLimiter(url, prefix='benchmark-ratelimit')))
+        else:
+            self.stdout.write('RATE_LIMIT_REDIS_URL is not set; skipping the Redis engine')
+
+        for label, limiter in engines:
+            middleware = EnhancedRateLimitMiddleware(view)
+            middleware.limiter = limiter
+            elapsed = self._time(middleware, requests)
+            denied = sum(1 for request in requests[:1000] if middleware(request).status_code == 429)
+            self.stdout.write(
+                f'{label}: {elapsed:.1f}us per request '
+                f'(+{elapsed - baseline:.1f}us overhead, {denied}/1000 denied afterwards)'
+            )
+
+    @staticmethod
+    def _time(handler, requests):
+        start = time.perf_counter()
+        for request in requests:
+            handler(request)
+        return (time.perf_counter() - start) / len(requests) * 1e6
@@ -0,0 +1,69 @@
+# backend/packages/management/commands/benchmark_rate_quotes.py
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from packages.pricing import package_types, quote_many, rate_card
+
+
+class Command(BaseCommand):
+    help = 'Compare per-item Decimal rate quotes with the compiled pricing engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Quotes per batch')
+        parser.add_argument('--repeat', type=int, default=20, help='Batches per path')
+
+    def handle(self, *args, **options):
+        count, repeat = options['count'], options['repeat']
+        rng = random.Random(0)
+        types = package_types()
+        items = [
+            {
+                'sender_address': '1 Warehouse Way',
+                'recipient_address': f'{rng.randint(1, 50)} Main Street',
+                'weight': Decimal(f'{rng.uniform(0.1, 30):.2f}'),
+                'length': Decimal(f'{rng.uniform(5, 100):.2f}'),
+                'width': Decimal(f'{rng.uniform(5, 100):.2f}'),
+                'height': Decimal(f'{rng.uniform(5, 100):.2f}'),
+                'package_type': rng.choice(types),
+            }
+            for _ in range(count)
+        ]
+        distances = [rng.uniform(1, 300) for _ in range(count)]
+
+        self.stdout.write(f'Pricing {count} items x {repeat} batches...')
+
+        legacy = self._timed(repeat, lambda: [self._legacy_quote(item) for item in items])
+        card = rate_card()
+        engine = self._timed(repeat, lambda: card.price(
+            [None] * count,
+            [item['package_type'] for item in items],
+            [item['weight'] for item in items],
+            [item['length'] for item in items],
+            [item['width'] for item in items],
+            [item['height'] for item in items],
+            distances,
+        ))
+        # Full request path: address dedupe, cached geocodes, Decimal output
+        full = self._timed(repeat, lambda: quote_many(items, remote=False))
+
+        total = count * repeat
+        self.stdout.write(f'Per-item Decimal:        {total / legacy:,.0f} quotes/s')
+        self.stdout.write(f'Compiled rate card:      {total / engine:,.0f} quotes/s')
+        self.stdout.write(f'quote_many (end to end): {total / full:,.0f} quotes/s')
+        self.stdout.write(self.style.SUCCESS(f'Rate card speedup: {legacy / engine:.1f}x'))
+
+    def _timed(self, repeat, func):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return time.perf_counter() - start
+
+    def _legacy_quote(self, item):
+        """The formula calculate_rate used before the pricing engine"""
+        weight_cost = item['weight'] * Decimal('2.00')
+        volume = item['length'] * item['width'] * item['height'] / 1000000
+        volume_cost = Decimal(str(volume)) * Decimal('5.00')
+        return Decimal('10.00') + weight_cost + volume_cost
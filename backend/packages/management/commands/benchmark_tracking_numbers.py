@@ -0,0 +1,60 @@
+# backend/packages/management/commands/benchmark_tracking_numbers.py
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from packages.tracking_numbers import SEQUENCE_START, format_tracking_number
+
+
+class Command(BaseCommand):
+    help = 'Compare insert throughput and index size of tracking number schemes (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Rows per scheme')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs PostgreSQL (index sizes come from pg_relation_size).')
+
+        rows = options['rows']
+        batch_size = options['batch_size']
+
+        schemes = {
+            'legacy_uuid': lambda i: f"SC{uuid.uuid4().hex[:8].upper()}",
+            'sequence_block': lambda i: format_tracking_number(SEQUENCE_START + i),
+        }
+
+        for name, generate in schemes.items():
+            table = f'bench_tracking_{name}'
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+                cursor.execute(
+                    f'CREATE UNLOGGED TABLE {table} ('
+                    f'id bigserial PRIMARY KEY, tracking_number varchar(20) UNIQUE NOT NULL)'
+                )
+
+                self.stdout.write(f'Inserting {rows} rows with {name}...')
+                start = time.perf_counter()
+                for offset in range(0, rows, batch_size):
+                    batch = [(generate(i),) for i in range(offset, min(offset + batch_size, rows))]
+                    cursor.executemany(
+                        f'INSERT INTO {table} (tracking_number) VALUES (%s) ON CONFLICT DO NOTHING',
+                        batch
+                    )
+                elapsed = time.perf_counter() - start
+
+                cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                inserted = cursor.fetchone()[0]
+                cursor.execute(f"SELECT pg_relation_size('{table}_tracking_number_key')")
+                index_size = cursor.fetchone()[0]
+                cursor.execute(f'DROP TABLE {table}')
+
+            self.stdout.write(
+                f'  {rows / elapsed:,.0f} rows/s, index {index_size / 1024 / 1024:,.1f} MB, '
+                f'{rows - inserted} collisions'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark completed'))
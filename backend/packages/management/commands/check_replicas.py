@@ -0,0 +1,46 @@
+# backend/packages/management/commands/check_replicas.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from packages.models import Package
+from swiftcourier_backend.routers import end_pin, replica_monitor, start_pin
+
+
+class Command(BaseCommand):
+    help = 'Check replica health and lag and show where reads are routed before and after a write'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reads', type=int, default=1000, help='Routing decisions sampled')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS.')
+
+        for alias in settings.DATABASE_REPLICAS:
+            replica_monitor.check(alias)
+        for alias, state in replica_monitor.stats()['replicas'].items():
+            status = 'healthy' if state['healthy'] else 'unavailable'
+            self.stdout.write(f'{alias}: {status}, {state["lag_seconds"]}s behind')
+
+        _, token = start_pin()
+        try:
+            self.stdout.write(f'Reads before a write: {self._sample(options["reads"])}')
+            router.db_for_write(Package)
+            self.stdout.write(f'Reads after a write: {self._sample(options["reads"])}')
+        finally:
+            end_pin(token)
+
+        _, token = start_pin(pinned=True)
+        try:
+            self.stdout.write(f'Reads of a client pinned by its cookie: {self._sample(options["reads"])}')
+        finally:
+            end_pin(token)
+
+    @staticmethod
+    def _sample(reads):
+        routed = {}
+        for _ in range(reads):
+            alias = router.db_for_read(Package)
+            routed[alias] = routed.get(alias, 0) + 1
+        return routed
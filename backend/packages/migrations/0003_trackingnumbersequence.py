@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+def create_tracking_number_sequence(apps, schema_editor):
+    # Only PostgreSQL has real sequences; other databases use the counter table
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE SEQUENCE IF NOT EXISTS packages_tracking_number_seq START WITH 10000000000'
+    )
+
+
+def drop_tracking_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP SEQUENCE IF EXISTS packages_tracking_number_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_alter_package_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingNumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_tracking_number_sequence, drop_tracking_number_sequence),
+    ]
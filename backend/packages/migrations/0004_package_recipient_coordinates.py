@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_trackingnumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='recipient_latitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='recipient_longitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+    ]
@@ -1,12 +1,10 @@
 # backend/packages/models.py
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
-from django.core.files.storage import default_storage
-import uuid
-import qrcode
-import os
-from PIL import Image
-from io import BytesIO
+from .geocoding import queue_geocoding
+from .qr import ensure_qr_code, queue_qr_code
+from .service_areas import invalidate_service_areas
+from .tracking_numbers import get_tracking_number_generator
 
 
 class Package(models.Model):
@@ -59,6 +57,8 @@ class Package(models.Model):
     recipient_city = models.CharField(max_length=100, blank=True)
     recipient_state = models.CharField(max_length=100, blank=True)
     recipient_zip = models.CharField(max_length=10, blank=True)
+    recipient_latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    recipient_longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
     
     # Package specifications
     weight = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
@@ -112,41 +112,45 @@ class Package(models.Model):
             models.Index(fields=['recipient_name'], name='package_recipient_idx'),
         ]
 
+    # Attempts before giving up when a generated tracking number is taken
+    TRACKING_NUMBER_ATTEMPTS = 3
+
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         if not self.tracking_number:
-            self.tracking_number = self.generate_tracking_number()
-        
-        super().save(*args, **kwargs)
+            generator = get_tracking_number_generator()
+            self.tracking_number = generator.generate()
+            if not generator.collision_free:
+                self._save_with_retry(generator, *args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
         
+        # Render the QR image in the background instead of on the request
         if not self.qr_code:
-            self.generate_qr_code()
+            queue_qr_code(self.tracking_number)
+        if adding and self.recipient_latitude is None and self.recipient_address:
+            queue_geocoding(self.pk)
+
+    def _save_with_retry(self, generator, *args, **kwargs):
+        """Insert, drawing a new tracking number if the generated one is taken"""
+        for attempt in range(self.TRACKING_NUMBER_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Package.objects.filter(tracking_number=self.tracking_number).exists()
+                if not taken or attempt == self.TRACKING_NUMBER_ATTEMPTS - 1:
+                    raise
+                self.tracking_number = generator.generate()
 
     def generate_tracking_number(self):
-        return f"SC{uuid.uuid4().hex[:8].upper()}"
+        return get_tracking_number_generator().generate()
 
     def generate_qr_code(self):
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(self.tracking_number)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill='black', back_color='white')
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Save to storage
-        file_name = f'{self.tracking_number}.png'
-        file_path = f'qr_codes/{file_name}'
-        
-        if default_storage.exists(file_path):
-            default_storage.delete(file_path)
-            
-        self.qr_code.save(file_path, buffer, save=False)
-        
-        # Close buffer
-        buffer.close()
+        """Render the QR code synchronously (used when the image is still missing)"""
+        return ensure_qr_code(self)
 
     def __str__(self):
         return f"{self.tracking_number} - {self.recipient_name}"
@@ -156,6 +160,27 @@ class Package(models.Model):
         return dict(self.STATUS_CHOICES)[self.status]
 
 
+class TrackingNumberSequence(models.Model):
+    """Counter for tracking number blocks on databases without sequences"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} ({self.last_value})"
+
+
+class GeocodedAddress(models.Model):
+    """Coordinates for a normalized address, so each address is geocoded once"""
+    address_hash = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.address} ({self.latitude}, {self.longitude})"
+
+
 class ServiceArea(models.Model):
     area_name = models.CharField(max_length=100, unique=True, db_index=True)
     base_rate = models.DecimalField(max_digits=10, decimal_places=2)
@@ -171,5 +196,14 @@ class ServiceArea(models.Model):
             models.Index(fields=['active'], name='servicearea_active_idx'),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_service_areas()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_service_areas()
+        return result
+
     def __str__(self):
         return self.area_name
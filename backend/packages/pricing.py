@@ -0,0 +1,195 @@
+# backend/packages/pricing.py
+"""
+Shipping price calculation shared by rate quotes and package creation.
+
+The price is a base rate plus weight, volume and distance components. The
+distance is the road-adjusted distance between the geocoded sender and
+recipient addresses, read through the shared distance cache. The service area
+containing the recipient supplies the base and per-mile rates; outside every
+area the defaults apply and the quote is flagged as out of coverage.
+
+Rates are compiled into a ``RateCard``: one NumPy array per rate component,
+indexed by (service area, package type). Quotes are priced as whole arrays
+and converted to exact cents once, at the output boundary, so a single quote
+and a batch of thousands go through the same code.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .geocoding import geocode_address
+from .service_areas import service_area_index
+
+BASE_RATE = Decimal('10.00')
+WEIGHT_RATE = Decimal('2.00')
+VOLUME_RATE = Decimal('5.00')
+
+COMPONENTS = ('base_rate', 'weight_cost', 'volume_cost', 'distance_cost')
+
+
+def per_mile_rate():
+    return Decimal(str(getattr(settings, 'PRICING_PER_MILE_RATE', '0.50')))
+
+
+def package_types():
+    from .models import Package
+    return [value for value, _ in Package.PACKAGE_TYPE_CHOICES]
+
+
+class RateCard:
+    """
+    Rate arrays of shape (areas + 1, package types). Row 0 holds the default
+    rates used outside every service area; unknown package types use the
+    defaults for the whole row.
+    """
+
+    def __init__(self, areas, types, type_rates=None):
+        type_rates = type_rates or {}
+        self.area_rows = {area.id: row for row, area in enumerate(areas, start=1)}
+        self.type_columns = {package_type: column for column, package_type in enumerate(types)}
+        # Extra column for package types without their own rates
+        self.default_column = len(types)
+
+        shape = (len(areas) + 1, len(types) + 1)
+        self.base = np.empty(shape)
+        self.per_mile = np.empty(shape)
+        self.weight = np.empty(shape)
+        self.volume = np.empty(shape)
+
+        bases = [float(BASE_RATE)] + [float(area.base_rate) for area in areas]
+        per_miles = [float(per_mile_rate())] + [float(area.per_mile_rate) for area in areas]
+        self.base[:] = np.array(bases)[:, np.newaxis]
+        self.per_mile[:] = np.array(per_miles)[:, np.newaxis]
+
+        for package_type, column in list(self.type_columns.items()) + [(None, self.default_column)]:
+            rates = type_rates.get(package_type, {})
+            self.weight[:, column] = float(rates.get('weight_rate', WEIGHT_RATE))
+            self.volume[:, column] = float(rates.get('volume_rate', VOLUME_RATE))
+
+    def price(self, areas, types, weights, lengths, widths, heights, distances):
+        """
+        Price N packages. ``areas`` holds service area ids (or None),
+        ``types`` package types and ``distances`` miles (NaN when unknown).
+        Returns a dict of integer-cent arrays, one per component plus total.
+        """
+        rows = np.array([self.area_rows.get(area, 0) for area in areas], dtype=np.intp)
+        columns = np.array(
+            [self.type_columns.get(package_type, self.default_column) for package_type in types],
+            dtype=np.intp
+        )
+
+        weights = np.asarray(weights, dtype=np.float64)
+        volumes = (
+            np.asarray(lengths, dtype=np.float64)
+            * np.asarray(widths, dtype=np.float64)
+            * np.asarray(heights, dtype=np.float64)
+        ) / 1000000  # cubic meters
+        distances = np.nan_to_num(np.asarray(distances, dtype=np.float64), nan=0.0)
+
+        cents = {
+            'base_rate': self.base[rows, columns],
+            'weight_cost': weights * self.weight[rows, columns],
+            'volume_cost': volumes * self.volume[rows, columns],
+            'distance_cost': distances * self.per_mile[rows, columns],
+        }
+        cents = {name: np.rint(values * 100).astype(np.int64) for name, values in cents.items()}
+        cents['total_cost'] = sum(cents[name] for name in COMPONENTS)
+        return cents
+
+
+_compiled = {'areas': None, 'card': None}
+
+
+def rate_card():
+    """The rate card for the current service areas, recompiled when they change"""
+    areas = service_area_index.areas
+    if _compiled['areas'] is not areas:
+        _compiled['card'] = RateCard(areas, package_types(), getattr(settings, 'PRICING_PACKAGE_TYPE_RATES', None))
+        _compiled['areas'] = areas
+    return _compiled['card']
+
+
+def to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def quote_many(items, remote=True):
+    """
+    Quote every item, a dict with ``sender_address``, ``recipient_address``,
+    ``weight``, ``length``, ``width``, ``height`` and ``package_type``.
+
+    Each distinct address is geocoded once and each distinct address pair
+    measured once. With ``remote=False`` only addresses geocoded before are
+    used, so no geocoding request is made.
+    """
+    from routes.distance import distance_cache
+
+    if not items:
+        return []
+
+    points = {}
+    for item in items:
+        for address in (item['sender_address'], item['recipient_address']):
+            if address not in points:
+                points[address] = geocode_address(address, remote=remote)
+
+    pairs = {}
+    for item in items:
+        origin, destination = points[item['sender_address']], points[item['recipient_address']]
+        if origin is not None and destination is not None:
+            pairs.setdefault((origin, destination), None)
+    if pairs:
+        measured = distance_cache.distances([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+        pairs = dict(zip(pairs, measured))
+
+    located = {}
+    for address, point in points.items():
+        located[address] = service_area_index.locate(*point) if point is not None else None
+    enforce_coverage = service_area_index.has_coverage
+
+    distances, areas = [], []
+    for item in items:
+        origin, destination = points[item['sender_address']], points[item['recipient_address']]
+        distances.append(pairs.get((origin, destination), np.nan))
+        areas.append(located[item['recipient_address']])
+
+    cents = rate_card().price(
+        [area.id if area is not None else None for area in areas],
+        [item.get('package_type') for item in items],
+        [item.get('weight') or 0 for item in items],
+        [item.get('length') or 0 for item in items],
+        [item.get('width') or 0 for item in items],
+        [item.get('height') or 0 for item in items],
+        distances,
+    )
+
+    quotes = []
+    for index, item in enumerate(items):
+        area = areas[index]
+        distance = distances[index]
+        destination = points[item['recipient_address']]
+        breakdown = {
+            'service_area': area.name if area is not None else None,
+            'distance_miles': None if np.isnan(distance) else round(float(distance), 2),
+            'out_of_coverage': destination is not None and area is None and enforce_coverage,
+        }
+        for name in COMPONENTS + ('total_cost',):
+            breakdown[name] = to_decimal(cents[name][index])
+        quotes.append(breakdown)
+    return quotes
+
+
+def price_shipment(weight, length, width, height, origin_address, destination_address,
+                   package_type=None, remote=True):
+    """Quote a single package between two addresses"""
+    item = {
+        'sender_address': origin_address,
+        'recipient_address': destination_address,
+        'weight': weight,
+        'length': length,
+        'width': width,
+        'height': height,
+        'package_type': package_type,
+    }
+    return quote_many([item], remote=remote)[0]
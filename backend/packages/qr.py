@@ -0,0 +1,119 @@
+# backend/packages/qr.py
+"""
+QR code rendering for package labels.
+
+Rendering is kept off the request path: new tracking numbers are queued when
+their package is committed and rendered in batches by the
+``packages.tasks.render_qr_codes`` Celery task. ``ensure_qr_code`` renders
+lazily for packages whose image is still missing when they are first read.
+"""
+import logging
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+from .commit_queue import CommitQueue
+
+logger = logging.getLogger(__name__)
+
+QR_CODE_DIR = 'qr_codes'
+
+def qr_code_path(tracking_number):
+    return f'{QR_CODE_DIR}/{tracking_number}.png'
+
+
+def render_qr_png(tracking_number):
+    """Render the QR image for a tracking number and return the PNG bytes"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(tracking_number)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill='black', back_color='white')
+
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def store_qr_code(tracking_number):
+    """Write the QR image to storage (once) and return its storage path"""
+    path = qr_code_path(tracking_number)
+    if default_storage.exists(path):
+        # The image only depends on the tracking number, so reuse it
+        return path
+    return default_storage.save(path, ContentFile(render_qr_png(tracking_number)))
+
+
+def ensure_qr_code(package):
+    """Render the QR code for a single package if it does not have one yet"""
+    if package.qr_code or not package.pk:
+        return package.qr_code
+
+    path = store_qr_code(package.tracking_number)
+
+    # Queryset update so the package post_save broadcasts do not fire again
+    type(package).objects.filter(pk=package.pk).update(qr_code=path)
+    package.qr_code = path
+    return package.qr_code
+
+
+def render_qr_codes(tracking_numbers):
+    """Render QR codes for every listed package that is still missing one"""
+    from .models import Package
+
+    packages = list(
+        Package.objects.filter(tracking_number__in=tracking_numbers)
+        .filter(Q(qr_code='') | Q(qr_code__isnull=True))
+        .only('id', 'tracking_number', 'qr_code')
+    )
+
+    rendered = []
+    for package in packages:
+        try:
+            package.qr_code = store_qr_code(package.tracking_number)
+            rendered.append(package)
+        except Exception as e:
+            logger.error(f"Failed to render QR code for {package.tracking_number}: {e}")
+
+    if rendered:
+        Package.objects.bulk_update(rendered, ['qr_code'])
+
+    return len(rendered)
+
+
+def dispatch_qr_rendering(tracking_numbers):
+    """Hand ``tracking_numbers`` to the worker in batches of QR_CODE_BATCH_SIZE"""
+    batch_size = getattr(settings, 'QR_CODE_BATCH_SIZE', 200)
+
+    from .tasks import render_qr_codes_task
+
+    for start in range(0, len(tracking_numbers), batch_size):
+        batch = tracking_numbers[start:start + batch_size]
+        try:
+            if hasattr(render_qr_codes_task, 'delay'):
+                render_qr_codes_task.delay(batch)
+            else:
+                # Fallback to synchronous call
+                render_qr_codes_task(batch)
+        except Exception as e:
+            # The serializer renders missing images lazily, so losing the
+            # batch only moves the cost to the first read
+            logger.warning(f"Could not queue QR rendering for {len(batch)} packages: {e}")
+
+
+_queue = CommitQueue(dispatch_qr_rendering)
+
+
+def queue_qr_code(tracking_number):
+    """
+    Queue a tracking number for background rendering.
+
+    Numbers are handed to the worker in batches once the surrounding
+    transaction commits, so a rolled back package is never rendered and bulk
+    intake produces a handful of tasks instead of one per row.
+    """
+    _queue.add(tracking_number)
@@ -1,14 +1,22 @@
 from rest_framework import serializers
+from swiftcourier_backend.instrumentation import TimedSerializerMixin
+from django.conf import settings
+from django.db import transaction
 from .models import Package, ServiceArea
-from decimal import Decimal
+from .geocoding import join_address
+from .pricing import price_shipment
+from .qr import ensure_qr_code
+import logging
 # import googlemaps
 
-class ServiceAreaSerializer(serializers.ModelSerializer):
+logger = logging.getLogger(__name__)
+
+class ServiceAreaSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ServiceArea
         fields = '__all__'
 
-class PackageSerializer(serializers.ModelSerializer):
+class PackageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True)
     qr_code_url = serializers.SerializerMethodField()
 
@@ -18,11 +26,32 @@ class PackageSerializer(serializers.ModelSerializer):
         read_only_fields = ('tracking_number', 'qr_code', 'created_at', 'updated_at')
 
     def get_qr_code_url(self, obj):
+        if not obj.qr_code:
+            # Background rendering has not caught up yet - render on first access
+            try:
+                ensure_qr_code(obj)
+            except Exception as e:
+                logger.warning(f"Lazy QR rendering failed for {obj.tracking_number}: {e}")
+                return None
         if obj.qr_code:
             return obj.qr_code.url
         return None
 
-class PackageCreateSerializer(serializers.ModelSerializer):
+class PackageSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Slim package representation for nested listings such as route stops"""
+    sender_username = serializers.CharField(source='sender.username', read_only=True)
+
+    class Meta:
+        model = Package
+        fields = (
+            'id', 'tracking_number', 'status', 'package_type', 'weight',
+            'recipient_name', 'recipient_phone', 'recipient_address',
+            'recipient_city', 'recipient_state', 'recipient_zip',
+            'estimated_delivery', 'sender_username',
+        )
+        read_only_fields = fields
+
+class PackageCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Package
         fields = (
@@ -77,27 +106,71 @@ class PackageCreateSerializer(serializers.ModelSerializer):
         # print(f"✅ User authenticated: {user.username} (ID: {user.id})")
         
         # Calculate shipping cost
-        shipping_cost = self.calculate_shipping_cost(validated_data)
-        
-        # Create package with sender
-        validated_data['shipping_cost'] = shipping_cost
+        self.apply_pricing(validated_data)
         validated_data['sender'] = user
         
-        return Package.objects.create(**validated_data)
+        # The package and its initial events go out as one broadcast on commit
+        with transaction.atomic():
+            return Package.objects.create(**validated_data)
     
+    def price(self, data):
+        """Price breakdown for validated package data"""
+        # Only already geocoded addresses are used here; rate quotes geocode
+        # on demand, so a quoted address is known by the time it is shipped
+        return price_shipment(
+            data.get('weight', 0), data.get('length', 0), data.get('width', 0), data.get('height', 0),
+            join_address(data.get('sender_address'), data.get('sender_city'),
+                         data.get('sender_state'), data.get('sender_zip')),
+            join_address(data.get('recipient_address'), data.get('recipient_city'),
+                         data.get('recipient_state'), data.get('recipient_zip')),
+            package_type=data.get('package_type'),
+            remote=False
+        )
+
+    def apply_pricing(self, data):
+        breakdown = self.price(data)
+        data['shipping_cost'] = breakdown['total_cost']
+        data['base_rate'] = breakdown['base_rate']
+        data['distance_rate'] = breakdown['distance_cost']
+        return data
+
     def calculate_shipping_cost(self, data):
         """Calculate shipping cost based on package specifications"""
-        base_cost = Decimal('10.00')
-        weight_cost = data.get('weight', 0) * Decimal('2.00')
-        
-        # Volume calculation (length × width × height in cubic meters)
-        length = data.get('length', 0)
-        width = data.get('width', 0)
-        height = data.get('height', 0)
-        volume = (length * width * height) / 1000000  # Convert to cubic meters
-        volume_cost = Decimal(str(volume)) * Decimal('5.00')
-        
-        return base_cost + weight_cost + volume_cost
+        return self.price(data)['total_cost']
+
+class PackageBulkCreateSerializer(serializers.Serializer):
+    """Validate a batch of packages row by row, keeping per-row errors"""
+    packages = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_packages(self, value):
+        max_items = getattr(settings, 'PACKAGE_BULK_MAX_ITEMS', 10000)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} packages can be created per request.")
+        return value
+
+    def validate_rows(self):
+        """
+        Run PackageCreateSerializer validation over every row.
+
+        Returns ``(valid_rows, errors)`` where ``valid_rows`` is a list of
+        ``(index, validated_data)`` and ``errors`` a list of
+        ``{'index': ..., 'errors': ...}`` for rejected rows. Rows are not
+        priced here; ``bulk.price_rows`` prices the whole batch at once.
+        """
+        # One child serializer is reused for every row, as ListSerializer does
+        child = PackageCreateSerializer(context=self.context)
+        valid_rows, errors = [], []
+
+        for index, row in enumerate(self.validated_data['packages']):
+            try:
+                data = child.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+                continue
+
+            valid_rows.append((index, data))
+
+        return valid_rows, errors
 
 class RateCalculationSerializer(serializers.Serializer):
     sender_address = serializers.CharField()
@@ -107,3 +180,16 @@ class RateCalculationSerializer(serializers.Serializer):
     width = serializers.DecimalField(max_digits=10, decimal_places=2)
     height = serializers.DecimalField(max_digits=10, decimal_places=2)
     package_type = serializers.CharField()
+
+class RateBatchSerializer(serializers.Serializer):
+    items = RateCalculationSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            max_items = getattr(settings, 'PRICING_BATCH_MAX_ITEMS', 1000)
+        else:
+            max_items = getattr(settings, 'PRICING_BATCH_MAX_ITEMS_ANONYMOUS', 50)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} items can be quoted per request.")
+        return value
@@ -0,0 +1,220 @@
+# backend/packages/service_areas.py
+"""
+In-memory point-in-polygon index over active service areas.
+
+``ServiceArea.coordinates`` holds GeoJSON (Polygon, MultiPolygon, Feature or
+FeatureCollection, coordinates in ``[longitude, latitude]`` order). The index
+buckets every polygon's bounding box into a uniform grid, so a lookup only
+ray-casts the few polygons whose box covers the point's cell.
+
+The index is built lazily and rebuilt only after a service area is saved or
+deleted: the local process drops it on commit, and other processes notice a
+bumped version in the shared cache within ``SERVICE_AREA_INDEX_CHECK_INTERVAL``
+seconds.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'service_areas:version'
+
+
+@dataclass
+class AreaPolygon:
+    area: 'Area'
+    # Outer ring first, then holes; each ring is a list of (longitude, latitude)
+    rings: list
+    bbox: tuple
+
+
+@dataclass
+class Area:
+    id: int
+    name: str
+    base_rate: Decimal
+    per_mile_rate: Decimal
+    polygons: list = field(default_factory=list)
+
+
+def geojson_polygons(geometry):
+    """Yield the rings of every polygon in a GeoJSON object"""
+    if not isinstance(geometry, dict):
+        return
+    kind = geometry.get('type')
+    if kind == 'FeatureCollection':
+        for feature in geometry.get('features', []):
+            yield from geojson_polygons(feature)
+    elif kind == 'Feature':
+        yield from geojson_polygons(geometry.get('geometry'))
+    elif kind == 'GeometryCollection':
+        for child in geometry.get('geometries', []):
+            yield from geojson_polygons(child)
+    elif kind == 'Polygon':
+        yield geometry.get('coordinates', [])
+    elif kind == 'MultiPolygon':
+        yield from geometry.get('coordinates', [])
+
+
+def point_in_ring(lng, lat, ring):
+    """Even-odd ray casting"""
+    inside = False
+    count = len(ring)
+    j = count - 1
+    for i in range(count):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def point_in_polygon(lng, lat, rings):
+    if not rings or not point_in_ring(lng, lat, rings[0]):
+        return False
+    return not any(point_in_ring(lng, lat, hole) for hole in rings[1:])
+
+
+class ServiceAreaIndex:
+
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size or getattr(settings, 'SERVICE_AREA_INDEX_CELL_DEGREES', 0.25)
+        self._grid = None
+        self._areas = []
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'SERVICE_AREA_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def has_coverage(self):
+        """True when at least one active area has a boundary"""
+        return bool(self._ensure_built())
+
+    @property
+    def areas(self):
+        """Active areas with boundaries; a new list object after every rebuild"""
+        self._ensure_built()
+        return self._areas
+
+    def locate(self, latitude, longitude):
+        """Return the ``Area`` containing the point, or None when it is out of coverage"""
+        if latitude is None or longitude is None:
+            return None
+        grid = self._ensure_built()
+
+        lat, lng = float(latitude), float(longitude)
+        for polygon in grid.get(self._cell(lng, lat), ()):
+            min_lng, min_lat, max_lng, max_lat = polygon.bbox
+            if min_lng <= lng <= max_lng and min_lat <= lat <= max_lat:
+                if point_in_polygon(lng, lat, polygon.rings):
+                    return polygon.area
+        return None
+
+    def invalidate(self):
+        """Drop the local index and tell other processes to drop theirs"""
+        with self._lock:
+            self._grid = None
+        shared = self.shared
+        if shared is not None:
+            try:
+                shared.set(VERSION_KEY, uuid.uuid4().hex, None)
+            except Exception as e:
+                logger.warning(f"Could not publish service area index version: {e}")
+
+    def stats(self):
+        grid = self._ensure_built()
+        return {
+            'areas': len(self._areas),
+            'polygons': sum(len(area.polygons) for area in self._areas),
+            'cells': len(grid),
+        }
+
+    def _ensure_built(self):
+        """Return the current grid, rebuilding it if an area changed"""
+        now = time.monotonic()
+        interval = getattr(settings, 'SERVICE_AREA_INDEX_CHECK_INTERVAL', 5)
+        grid = self._grid
+        if grid is not None and now - self._checked_at < interval:
+            return grid
+
+        with self._lock:
+            version = self._shared_version()
+            self._checked_at = now
+            if self._grid is None or version != self._version:
+                self._build()
+                self._version = version
+            return self._grid
+
+    def _shared_version(self):
+        shared = self.shared
+        if shared is None:
+            return None
+        try:
+            return shared.get(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Shared service area version unavailable: {e}")
+            return self._version
+
+    def _build(self):
+        from .models import ServiceArea
+
+        areas = []
+        grid = defaultdict(list)
+        for record in ServiceArea.objects.filter(active=True).exclude(coordinates__isnull=True):
+            area = Area(
+                id=record.id, name=record.area_name,
+                base_rate=record.base_rate, per_mile_rate=record.per_mile_rate
+            )
+            for rings in geojson_polygons(record.coordinates):
+                try:
+                    rings = [[(float(point[0]), float(point[1])) for point in ring] for ring in rings]
+                except (TypeError, ValueError, IndexError):
+                    logger.warning(f"Skipping malformed boundary for service area {record.area_name}")
+                    continue
+                if not rings or len(rings[0]) < 3:
+                    continue
+
+                lngs = [point[0] for point in rings[0]]
+                lats = [point[1] for point in rings[0]]
+                polygon = AreaPolygon(area=area, rings=rings, bbox=(min(lngs), min(lats), max(lngs), max(lats)))
+                area.polygons.append(polygon)
+                for cell in self._cells(polygon.bbox):
+                    grid[cell].append(polygon)
+            areas.append(area)
+
+        self._areas = areas
+        self._grid = dict(grid)
+        logger.info(f"Built service area index: {len(areas)} areas, {len(self._grid)} cells")
+
+    def _cell(self, lng, lat):
+        return math.floor(lng / self.cell_size), math.floor(lat / self.cell_size)
+
+    def _cells(self, bbox):
+        min_x, min_y = self._cell(bbox[0], bbox[1])
+        max_x, max_y = self._cell(bbox[2], bbox[3])
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield x, y
+
+
+service_area_index = ServiceAreaIndex()
+
+
+def invalidate_service_areas():
+    transaction.on_commit(service_area_index.invalidate)
@@ -0,0 +1,308 @@
+# backend/packages/snapshots.py
+"""
+Read-through cache for the public tracking endpoints.
+
+Snapshots (the serialized package, the location and ETA payloads and the live
+payload WebSocket trackers receive) are kept in a bounded in-process LRU and,
+when Redis is available, in the shared cache.
+Every snapshot is stamped with the package's current version token, which is
+stored in the shared cache and replaced by the post_save hooks in
+``tracking.signals`` once the write has committed. A reader only serves a
+snapshot whose stamp matches the current token, so no process serves a
+snapshot from before a status change once that change has committed.
+
+Without a shared cache (no Redis) version tokens are per process, which is
+only safe for single-process deployments such as ``runserver``.
+
+Tokens set by an invalidation start with its time. Within
+``DATABASE_REPLICA_MAX_LAG`` seconds of it, snapshots are built from the
+primary, since a replica may not have the change yet.
+"""
+import logging
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+
+from swiftcourier_backend.cache_utils import LocalLRUCache
+from swiftcourier_backend.routers import primary_reads
+
+logger = logging.getLogger(__name__)
+
+
+RECENT_EVENTS = 10
+
+
+def build_tracking_snapshot(tracking_number):
+    """Load a package and build every public tracking payload for it"""
+    from tracking.models import TrackingEvent
+    from .models import Package
+    from .serializers import PackageSerializer
+
+    # One query: the latest events joined to their package and its sender.
+    # Every package gets initial events on creation, so the package lookup
+    # below only runs for packages without any.
+    events = list(
+        TrackingEvent.objects
+        .filter(package__tracking_number=tracking_number)
+        .select_related('package__sender', 'created_by')
+        .order_by('-timestamp', '-id')[:RECENT_EVENTS]
+    )
+    if events:
+        package = events[0].package
+    else:
+        try:
+            package = Package.objects.select_related('sender').get(tracking_number=tracking_number)
+        except Package.DoesNotExist:
+            return None
+
+    return {
+        'package': dict(PackageSerializer(package).data),
+        'location': {
+            'tracking_number': package.tracking_number,
+            'current_location': package.current_location,
+            'latitude': package.current_latitude,
+            'longitude': package.current_longitude,
+            'status': package.status,
+            'last_updated': package.updated_at
+        },
+        'eta': {
+            'tracking_number': package.tracking_number,
+            'estimated_delivery': package.estimated_delivery,
+            'status': package.status
+        },
+        'live': live_tracking_payload(package, events),
+    }
+
+
+def live_tracking_payload(package, events):
+    """The ``package_status`` message TrackingConsumer sends on connect and refresh"""
+    return {
+        'tracking_number': package.tracking_number,
+        'status': package.status,
+        'current_location': package.current_location,
+        'latitude': float(package.current_latitude) if package.current_latitude else None,
+        'longitude': float(package.current_longitude) if package.current_longitude else None,
+        'estimated_delivery': package.estimated_delivery.isoformat() if package.estimated_delivery else None,
+        'last_updated': package.updated_at.isoformat(),
+        'recipient_name': package.recipient_name,
+        'recipient_address': package.recipient_address,
+        'sender_name': package.sender_name,
+        'weight': str(package.weight),
+        'package_type': package.package_type,
+        'tracking_events': [
+            {
+                'id': event.id,
+                'status': event.status,
+                'description': event.description,
+                'location': event.location,
+                'timestamp': event.timestamp.isoformat(),
+                'created_by': event.created_by.username if event.created_by else 'System'
+            } for event in events
+        ]
+    }
+
+
+class TrackingSnapshotCache:
+    """Two-tier, version-stamped snapshot cache keyed by tracking number"""
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, builder=build_tracking_snapshot):
+        self.builder = builder
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'TRACKING_CACHE_LOCAL_MAX_ENTRIES', 10000),
+            timeout=self.timeout
+        )
+        # Version counters used when there is no shared cache
+        self._local_versions = {}
+        self._local_lock = threading.Lock()
+        self._build_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._counters = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'builds': 0,
+            'invalidations': 0,
+        }
+
+    # Configuration is read lazily so tests and settings overrides apply
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'TRACKING_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'TRACKING_CACHE_TIMEOUT', 300)
+
+    def get(self, tracking_number, wait=True):
+        """
+        Return the snapshot for ``tracking_number`` (None if no such package).
+
+        With ``wait=False`` a snapshot another thread or process is building
+        is not waited for; this call builds its own copy instead. Callers on
+        the shared ``database_sync_to_async`` thread use it, since a wait
+        there stalls every other consumer.
+        """
+        version = self._current_version(tracking_number)
+
+        entry = self._local_get(tracking_number)
+        if entry is not None and entry[0] == version:
+            self._count('local_hits')
+            return entry[1]
+
+        lock = self._build_locks[hash(tracking_number) % self.LOCK_STRIPES]
+        if not lock.acquire(blocking=wait):
+            return self._load(tracking_number, version, wait)
+        try:
+            # Another thread may have loaded it while we waited
+            entry = self._local_get(tracking_number)
+            if entry is not None and entry[0] == version:
+                self._count('local_hits')
+                return entry[1]
+
+            return self._load(tracking_number, version, wait)
+        finally:
+            lock.release()
+
+    def invalidate(self, tracking_number):
+        """Retire every cached snapshot of ``tracking_number``"""
+        self._count('invalidations')
+        self._local.delete(tracking_number)
+        version = f'{time.time():.3f}:{uuid.uuid4().hex}'
+        with self._local_lock:
+            self._local_versions[tracking_number] = version
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                shared.set(self._version_key(tracking_number), version, None)
+            except Exception as e:
+                logger.error(f"Tracking cache invalidation failed for {tracking_number}: {e}")
+
+    def stats(self):
+        with self._local_lock:
+            stats = dict(self._counters)
+        stats['local_entries'] = len(self._local)
+        stats['local_evictions'] = self._local.evictions
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
+
+    def _load(self, tracking_number, version, wait=True):
+        shared = self.shared
+        snapshot_key = self._snapshot_key(tracking_number)
+        lock_key = f'{snapshot_key}:lock'
+        locked = False
+
+        if shared is not None:
+            try:
+                cached = shared.get(snapshot_key)
+                if cached is not None and cached['version'] == version:
+                    self._count('shared_hits')
+                    self._local_set(tracking_number, version, cached['data'])
+                    return cached['data']
+
+                # Stampede protection across processes: one builder per key,
+                # everyone else waits briefly for its result
+                locked = shared.add(lock_key, 1, getattr(settings, 'TRACKING_CACHE_LOCK_TIMEOUT', 5))
+                if not locked and wait:
+                    cached = self._wait_for_snapshot(shared, snapshot_key, version)
+                    if cached is not None:
+                        self._count('shared_hits')
+                        self._local_set(tracking_number, version, cached['data'])
+                        return cached['data']
+            except Exception as e:
+                logger.warning(f"Shared tracking cache unavailable: {e}")
+                shared = None
+
+        self._count('misses')
+        try:
+            if self._recently_written(version):
+                with primary_reads():
+                    data = self.builder(tracking_number)
+            else:
+                data = self.builder(tracking_number)
+            self._count('builds')
+            if data is None:
+                # Not cached: packages created through bulk_create skip the
+                # post_save hooks, so a cached "not found" would never expire
+                return None
+            self._local_set(tracking_number, version, data)
+            if shared is not None:
+                try:
+                    shared.set(snapshot_key, {'version': version, 'data': data}, self.timeout)
+                except Exception as e:
+                    logger.warning(f"Could not store tracking snapshot for {tracking_number}: {e}")
+            return data
+        finally:
+            if locked:
+                try:
+                    shared.delete(lock_key)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _recently_written(version):
+        """Whether the write behind ``version`` may not have reached the replicas yet"""
+        written_at, _, _ = str(version).partition(':')
+        try:
+            age = time.time() - float(written_at)
+        except ValueError:
+            return False
+        return age < getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+
+    def _wait_for_snapshot(self, shared, snapshot_key, version):
+        interval = 0.02
+        deadline = time.monotonic() + getattr(settings, 'TRACKING_CACHE_LOCK_WAIT', 0.5)
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            cached = shared.get(snapshot_key)
+            if cached is not None and cached['version'] == version:
+                return cached
+        return None
+
+    def _current_version(self, tracking_number):
+        """Fetch (or initialise) the version token a snapshot must carry to be served"""
+        shared = self.shared
+        if shared is None:
+            with self._local_lock:
+                return self._local_versions.get(tracking_number, 0)
+
+        key = self._version_key(tracking_number)
+        try:
+            version = shared.get(key)
+            if version is None:
+                # A fresh random token can never match a snapshot stored
+                # under a token that has since been evicted
+                shared.add(key, uuid.uuid4().hex, None)
+                version = shared.get(key)
+            return version
+        except Exception as e:
+            logger.warning(f"Shared tracking cache unavailable: {e}")
+            # Never match a cached entry while the version is unknown
+            return uuid.uuid4().hex
+
+    def _local_get(self, tracking_number):
+        return self._local.get(tracking_number)
+
+    def _local_set(self, tracking_number, version, data):
+        self._local.set(tracking_number, (version, data))
+
+    def _count(self, name):
+        with self._local_lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _version_key(tracking_number):
+        return f'tracking:version:{tracking_number}'
+
+    @staticmethod
+    def _snapshot_key(tracking_number):
+        return f'tracking:snapshot:v2:{tracking_number}'
+
+
+tracking_snapshots = TrackingSnapshotCache()
@@ -0,0 +1,29 @@
+import logging
+from .geocoding import geocode_packages
+from .qr import render_qr_codes
+
+logger = logging.getLogger(__name__)
+
+# Import Celery shared_task
+try:
+    from celery import shared_task
+except ImportError:
+    # Fallback if Celery is not available
+    def shared_task(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+@shared_task()
+def render_qr_codes_task(tracking_numbers):
+    """Render QR codes for a batch of newly created packages"""
+    rendered = render_qr_codes(tracking_numbers)
+    logger.info(f"Rendered {rendered} of {len(tracking_numbers)} queued QR codes")
+    return rendered
+
+@shared_task()
+def geocode_packages_task(package_ids):
+    """Geocode recipient addresses for a batch of newly created packages"""
+    located = geocode_packages(package_ids)
+    logger.info(f"Geocoded {located} of {len(package_ids)} queued packages")
+    return located
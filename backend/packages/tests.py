@@ -0,0 +1,268 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from packages.geocoding import geocode_cache
+from packages.list_cache import package_list_cache
+from packages.models import GeocodedAddress, Package
+from packages.pricing import quote_many
+from packages.snapshots import TrackingSnapshotCache
+from packages.tracking_numbers import SequenceBlockGenerator, format_tracking_number, is_valid_tracking_number
+from swiftcourier_backend.rate_limiting import LocalTokenBucketLimiter, rate_limiter
+
+
+class TrackingNumberValidationTests(TestCase):
+
+    def test_generated_numbers_are_valid(self):
+        self.assertTrue(is_valid_tracking_number(format_tracking_number(10000000001)))
+
+    def test_wrong_check_digit_is_rejected(self):
+        number = format_tracking_number(10000000001)
+        wrong = str((int(number[-1]) + 1) % 10)
+        self.assertFalse(is_valid_tracking_number(number[:-1] + wrong))
+
+    def test_non_ascii_digits_are_rejected(self):
+        self.assertFalse(is_valid_tracking_number('SC' + '١' * 12))  # Arabic-Indic one
+        self.assertFalse(is_valid_tracking_number('SC' + '１' * 12))  # Fullwidth one
+
+    def test_public_endpoints_answer_400_for_non_ascii_digits(self):
+        number = 'SC' + '١' * 12
+        for endpoint in ('track', 'location', 'eta'):
+            response = self.client.get(f'/api/packages/{number}/{endpoint}/', secure=True)
+            self.assertEqual(response.status_code, 400, endpoint)
+
+
+class SequenceBlockGeneratorTests(TestCase):
+
+    def test_counter_fallback_does_not_reissue_after_a_rollback(self):
+        worker, other_worker = SequenceBlockGenerator(block_size=10), SequenceBlockGenerator(block_size=10)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                worker.generate_many(2)
+                raise RuntimeError
+
+        issued = other_worker.generate_many(3) + worker.generate_many(3)
+        self.assertEqual(len(set(issued)), 6)
+
+
+class DeferredRenderingTests(TestCase):
+
+    def setUp(self):
+        self.sender = get_user_model().objects.create_user(username='merchant', password='pw-12345678')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def create_package(self, **fields):
+        return Package.objects.create(sender=self.sender, weight='1.00', **fields)
+
+    def queued(self, task):
+        return [number for call in task.delay.call_args_list for number in call.args[0]]
+
+    def test_qr_codes_are_queued_once_per_transaction(self):
+        with mock.patch('packages.tasks.render_qr_codes_task') as task, \
+                self.captureOnCommitCallbacks(execute=True):
+            packages = [self.create_package() for _ in range(3)]
+
+        task.delay.assert_called_once()
+        self.assertEqual(self.queued(task), [package.tracking_number for package in packages])
+
+    def test_rolled_back_numbers_are_not_queued(self):
+        with mock.patch('packages.tasks.render_qr_codes_task') as task:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.create_package()
+                raise RuntimeError
+
+            with self.captureOnCommitCallbacks(execute=True):
+                kept = self.create_package()
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    self.create_package()
+                    raise RuntimeError
+                last = self.create_package()
+
+        self.assertEqual(self.queued(task), [kept.tracking_number, last.tracking_number])
+
+    def test_rolled_back_packages_are_not_geocoded(self):
+        with mock.patch('packages.tasks.geocode_packages_task') as task, \
+                self.captureOnCommitCallbacks(execute=True):
+            kept = self.create_package(recipient_address='1 Main Street')
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.create_package(recipient_address='2 Main Street')
+                raise RuntimeError
+
+        self.assertEqual(self.queued(task), [kept.id])
+
+    def test_missing_image_is_rendered_on_first_read(self):
+        with mock.patch('packages.tasks.render_qr_codes_task'), \
+                self.captureOnCommitCallbacks(execute=True):
+            package = self.create_package()
+        self.assertFalse(Package.objects.get(pk=package.pk).qr_code)
+
+        self.client.force_login(self.sender)
+        response = self.client.get(f'/api/packages/{package.pk}/', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['qr_code_url'].endswith(f'{package.tracking_number}.png'))
+        self.assertEqual(Package.objects.get(pk=package.pk).qr_code, f'qr_codes/{package.tracking_number}.png')
+
+
+class RecordingGeocoder:
+    def __init__(self):
+        self.addresses = []
+
+    def geocode(self, address):
+        self.addresses.append(address)
+        return (40.0 + len(self.addresses) / 100, -74.0)
+
+
+class RateQuoteGeocodingTests(TestCase):
+
+    def setUp(self):
+        self.geocoder = RecordingGeocoder()
+        patcher = mock.patch.object(geocode_cache, '_geocoder', self.geocoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        geocode_cache._local.clear()
+        # Package POSTs share a 10 per hour limit per client
+        limiter = mock.patch.object(rate_limiter, 'local', LocalTokenBucketLimiter())
+        limiter.start()
+        self.addCleanup(limiter.stop)
+
+    def quote(self, address):
+        return {
+            'sender_address': '1 Origin Road',
+            'recipient_address': address,
+            'weight': '2.00', 'length': '10', 'width': '10', 'height': '10',
+            'package_type': 'package',
+        }
+
+    def test_anonymous_quote_does_not_geocode_remotely(self):
+        response = self.client.post('/api/packages/calculate-rate/', self.quote('2 New Street'),
+                                    content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.geocoder.addresses, [])
+        self.assertFalse(GeocodedAddress.objects.exists())
+
+    def test_authenticated_quote_geocodes_new_addresses(self):
+        user = get_user_model().objects.create_user(username='quoter', password='pw-12345678')
+        self.client.force_login(user)
+        response = self.client.post('/api/packages/calculate-rate/', self.quote('2 New Street'),
+                                    content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.geocoder.addresses), 2)
+
+    def test_anonymous_batch_does_not_geocode_remotely(self):
+        items = [self.quote(f'{n} New Street') for n in range(5)]
+        response = self.client.post('/api/packages/calculate-rate/batch/', {'items': items},
+                                    content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 5)
+        self.assertEqual(self.geocoder.addresses, [])
+
+    @override_settings(PRICING_BATCH_MAX_ITEMS_ANONYMOUS=3)
+    def test_anonymous_batch_size_is_capped(self):
+        items = [self.quote(f'{n} New Street') for n in range(4)]
+        response = self.client.post('/api/packages/calculate-rate/batch/', {'items': items},
+                                    content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkIntakePricingTests(TestCase):
+
+    def setUp(self):
+        limiter = mock.patch.object(rate_limiter, 'local', LocalTokenBucketLimiter())
+        limiter.start()
+        self.addCleanup(limiter.stop)
+        self.client.force_login(get_user_model().objects.create_user(username='merchant', password='pw-12345678'))
+
+    def row(self, n):
+        return {
+            'sender_name': 'Merchant', 'sender_phone': '5550100', 'sender_address': '1 Warehouse Way',
+            'sender_city': 'Springfield', 'sender_state': 'IL', 'sender_zip': '62701',
+            'recipient_name': f'Recipient {n}', 'recipient_phone': '5550101',
+            'recipient_address': f'{n} Main Street', 'recipient_city': 'Springfield',
+            'recipient_state': 'IL', 'recipient_zip': '62702',
+            'package_type': 'package', 'weight': '1.50', 'length': '20', 'width': '15', 'height': '10',
+            'declared_value': '10.00',
+        }
+
+    def test_batch_is_priced_with_one_quote(self):
+        rows = [self.row(n) for n in range(5)] + [dict(self.row(5), weight='0')]
+        with mock.patch('packages.bulk.quote_many', wraps=quote_many) as quote:
+            response = self.client.post('/api/packages/bulk/', {'packages': rows},
+                                        content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(quote.call_count, 1)
+        self.assertEqual(len(quote.call_args.args[0]), 5)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [5])
+        self.assertTrue(all(package.shipping_cost > 0 for package in Package.objects.all()))
+
+
+@override_settings(TRACKING_CACHE_ALIAS='default', TRACKING_CACHE_LOCK_WAIT=0.5)
+class TrackingSnapshotCacheTests(TestCase):
+
+    def setUp(self):
+        self.snapshots = TrackingSnapshotCache(builder=lambda tracking_number: {'live': tracking_number})
+        # Another process is building this snapshot
+        cache.add(f"{self.snapshots._snapshot_key('SC1')}:lock", 1, 5)
+        self.addCleanup(cache.clear)
+
+    def test_readers_wait_for_another_builder(self):
+        with mock.patch('packages.snapshots.time.sleep') as sleep:
+            self.assertEqual(self.snapshots.get('SC1'), {'live': 'SC1'})
+        self.assertTrue(sleep.called)
+
+    def test_no_wait_builds_directly(self):
+        with mock.patch('packages.snapshots.time.sleep') as sleep:
+            self.assertEqual(self.snapshots.get('SC1', wait=False), {'live': 'SC1'})
+        sleep.assert_not_called()
+
+
+class PackageListCacheTests(TestCase):
+
+    def setUp(self):
+        package_list_cache._local.clear()
+        self.customer = get_user_model().objects.create_user(username='customer', password='pw-12345678')
+        self.client.force_login(self.customer)
+
+    def create_package(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Package.objects.create(sender=self.customer, weight='1.00')
+
+    def tracking_numbers(self):
+        response = self.client.get('/api/packages/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [package['tracking_number'] for package in response.json()['results']]
+
+    def test_list_endpoint_is_cached_until_a_package_changes(self):
+        first = self.create_package()
+        self.assertEqual(self.tracking_numbers(), [first.tracking_number])
+
+        hits = package_list_cache.stats()['hits']
+        self.assertEqual(self.tracking_numbers(), [first.tracking_number])
+        self.assertEqual(package_list_cache.stats()['hits'], hits + 1)
+
+        second = self.create_package()
+        self.assertEqual(self.tracking_numbers(), [second.tracking_number, first.tracking_number])
+
+    def test_lists_are_built_on_the_primary_right_after_a_bump(self):
+        self.create_package()
+        with mock.patch('packages.list_cache.primary_reads') as primary_reads:
+            self.tracking_numbers()
+        primary_reads.assert_called_once()
+
+        self.create_package()
+        with override_settings(DATABASE_REPLICA_MAX_LAG=0), \
+                mock.patch('packages.list_cache.primary_reads') as primary_reads:
+            self.tracking_numbers()
+        primary_reads.assert_not_called()
@@ -0,0 +1,157 @@
+# backend/packages/tracking_numbers.py
+"""
+Tracking number generation and validation.
+
+Tracking numbers look like ``SC`` + 11-digit sequence + Luhn check digit
+(``SC100000000017``). Sequences are reserved from the database in blocks and
+handed out from worker-local memory, so numbers are collision-free and
+roughly increasing, which keeps inserts at the right edge of the
+``tracking_number`` B-tree instead of scattering them across it.
+
+The generator is pluggable through ``settings.TRACKING_NUMBER_GENERATOR``.
+"""
+import logging
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'SC'
+SEQUENCE_DIGITS = 11
+SEQUENCE_START = 10 ** (SEQUENCE_DIGITS - 1)
+SEQUENCE_NAME = 'packages_tracking_number_seq'
+
+# Current format and the legacy ``SC`` + 8 hex digits from uuid4.
+# [0-9], not \d, which also matches digits of other scripts.
+TRACKING_NUMBER_RE = re.compile(rf'{PREFIX}([0-9]{{{SEQUENCE_DIGITS + 1}}})')
+LEGACY_TRACKING_NUMBER_RE = re.compile(rf'{PREFIX}[0-9A-F]{{8}}')
+MAX_LENGTH = len(PREFIX) + SEQUENCE_DIGITS + 1
+
+# Luhn doubling table indexed by digit
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def luhn_check_digit(digits):
+    """Return the Luhn check digit for a string of decimal digits"""
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        digit = ord(char) - 48
+        total += _LUHN_DOUBLED[digit] if position % 2 == 0 else digit
+    return str((10 - total % 10) % 10)
+
+
+def format_tracking_number(sequence):
+    digits = f'{sequence:0{SEQUENCE_DIGITS}d}'
+    return f'{PREFIX}{digits}{luhn_check_digit(digits)}'
+
+
+def is_valid_tracking_number(value):
+    """
+    Cheap format check run before any query.
+
+    The input is length-capped before matching, so the cost is bounded no
+    matter what the client sends.
+    """
+    if not isinstance(value, str) or len(value) > MAX_LENGTH:
+        return False
+
+    match = TRACKING_NUMBER_RE.fullmatch(value)
+    if match:
+        body = match.group(1)
+        return luhn_check_digit(body[:-1]) == body[-1]
+
+    return LEGACY_TRACKING_NUMBER_RE.fullmatch(value) is not None
+
+
+class BaseTrackingNumberGenerator:
+    """Interface for tracking number generators"""
+
+    # Whether two calls can ever return the same number. Package.save() only
+    # retries on a unique constraint violation when this is False.
+    collision_free = True
+
+    def generate(self):
+        return self.generate_many(1)[0]
+
+    def generate_many(self, count):
+        raise NotImplementedError
+
+
+class SequenceBlockGenerator(BaseTrackingNumberGenerator):
+    """
+    Hand out numbers from blocks of sequence values reserved in bulk.
+
+    Blocks are only kept on PostgreSQL, where they come from ``nextval()`` on
+    a dedicated sequence. ``nextval()`` is non-transactional: a rolled back
+    request never gives its values back, so they cannot be handed out twice.
+
+    Other databases fall back to a counter row in ``TrackingNumberSequence``,
+    which is updated in the caller's transaction. A rollback also undoes the
+    reservation, so a block kept in memory past it would be handed out again.
+    The fallback therefore reserves exactly the numbers each call returns.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'TRACKING_NUMBER_BLOCK_SIZE', 100)
+        self._block = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def collision_free(self):
+        return connection.vendor == 'postgresql'
+
+    def generate_many(self, count):
+        if connection.vendor != 'postgresql':
+            return [format_tracking_number(value) for value in self._reserve_from_counter(count)]
+
+        with self._lock:
+            if len(self._block) < count:
+                self._block.extend(self._reserve(max(self.block_size, count - len(self._block))))
+            values = [self._block.popleft() for _ in range(count)]
+        return [format_tracking_number(value) for value in values]
+
+    def _reserve(self, size):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)',
+                [SEQUENCE_NAME, size]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _reserve_from_counter(self, size):
+        from .models import TrackingNumberSequence
+
+        with transaction.atomic():
+            sequence, _ = TrackingNumberSequence.objects.select_for_update().get_or_create(
+                name=SEQUENCE_NAME,
+                defaults={'last_value': SEQUENCE_START - 1}
+            )
+            TrackingNumberSequence.objects.filter(pk=sequence.pk).update(
+                last_value=F('last_value') + size
+            )
+        start = sequence.last_value + 1
+        return range(start, start + size)
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_tracking_number_generator():
+    """Return the process-wide generator configured in settings"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                path = getattr(
+                    settings, 'TRACKING_NUMBER_GENERATOR',
+                    'packages.tracking_numbers.SequenceBlockGenerator'
+                )
+                _generator = import_string(path)()
+    return _generator
@@ -11,6 +11,8 @@ urlpatterns = [
     path('<int:pk>/', views.PackageDetailView.as_view(), name='package-detail'),
     path('<int:pk>/update-status/', views.update_package_status, name='update-package-status'),
     path('calculate-rate/', views.calculate_rate, name='calculate-rate'),
+    path('calculate-rate/batch/', views.calculate_rate_batch, name='calculate-rate-batch'),
+    path('bulk/', views.bulk_create_packages, name='package-bulk-create'),
     path('<str:tracking_number>/track/', views.track_package, name='track-package'),
     path('<str:tracking_number>/location/', views.package_location, name='package-location'),
     path('<str:tracking_number>/eta/', views.package_eta, name='package-eta'),
@@ -19,5 +21,6 @@ urlpatterns = [
     path('admin/<int:pk>/send-email/', views.admin_send_email_notification, name='admin-send-email'),
     path('admin/generate-package/', views.admin_generate_tracking_code, name='admin-generate-package'),
     path('admin/statistics/', views.admin_package_statistics, name='admin-statistics'),
+    path('admin/cache-stats/', views.admin_cache_stats, name='admin-cache-stats'),
     path('', include(router.urls)),
 ]
@@ -3,19 +3,29 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_headers
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import Package, ServiceArea
 from .serializers import (
-    PackageSerializer, PackageCreateSerializer, 
-    RateCalculationSerializer, ServiceAreaSerializer
+    PackageSerializer, PackageCreateSerializer, PackageBulkCreateSerializer,
+    RateBatchSerializer, RateCalculationSerializer, ServiceAreaSerializer
 )
-from decimal import Decimal
+from .bulk import create_packages_in_bulk, price_rows
+from .tracking_numbers import is_valid_tracking_number
+from .snapshots import tracking_snapshots
+from .list_cache import package_list_cache, package_list_scope
+from .pricing import price_shipment, quote_many
+from .service_areas import service_area_index
 from notifications.tasks import send_admin_notification_email
-from django.db import models
+from swiftcourier_backend.pagination import KeysetPagination, KeysetStreamingMixin
+from swiftcourier_backend.compression import compression_stats
+from swiftcourier_backend.db_pool.pool import pool_stats
+from swiftcourier_backend.routers import replica_monitor
+from swiftcourier_backend.ws_auth import principal_cache
+from django.db import models, transaction
 
-class PackageListCreateView(generics.ListCreateAPIView):
+class PackageListCreateView(KeysetStreamingMixin, generics.ListCreateAPIView):
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
     
     def get_serializer_class(self):
@@ -33,6 +43,23 @@ class PackageListCreateView(generics.ListCreateAPIView):
         else:
             return Package.objects.filter(sender=user)
 
+    def list(self, request, *args, **kwargs):
+        # Cached per user scope and filters; package writes bump the scope's
+        # generation so updates are visible on the next request. Streamed
+        # exports are not cached.
+        scope = package_list_scope(request.user)
+        if scope is None or self.paginator.wants_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        data, generation = package_list_cache.lookup(scope, request.query_params)
+        if data is not None:
+            return Response(data)
+
+        with package_list_cache.reads_for(generation):
+            response = super().list(request, *args, **kwargs)
+        package_list_cache.store(scope, request.query_params, generation, response.data)
+        return response
+
 class PackageDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = PackageSerializer
     permission_classes = [IsAuthenticated]
@@ -50,20 +77,25 @@ class PackageViewSet(viewsets.ModelViewSet):
     queryset = Package.objects.select_related('sender').prefetch_related('tracking_events')
     serializer_class = PackageSerializer
     
-    @method_decorator(cache_page(300))  # Cache for 5 minutes
-    @method_decorator(vary_on_headers('Authorization'))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'admin':
+            return self.queryset.all()
+        elif user.user_type == 'driver':
+            return self.queryset.filter(route_stops__route__driver=user)
+        else:
+            return self.queryset.filter(sender=user)
     
     @method_decorator(cache_page(60))  # Cache for 1 minute
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
 # Admin-specific viewsets for Django admin integration
-class AdminPackageViewSet(viewsets.ModelViewSet):
+class AdminPackageViewSet(KeysetStreamingMixin, viewsets.ModelViewSet):
     """Admin-only viewset for managing all packages"""
     queryset = Package.objects.all()
     serializer_class = PackageSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAdminUser]
     
     def get_queryset(self):
@@ -76,7 +108,7 @@ class AdminPackageViewSet(viewsets.ModelViewSet):
         if sender_filter:
             queryset = queryset.filter(sender__username__icontains=sender_filter)
             
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
 
 class AdminServiceAreaViewSet(viewsets.ModelViewSet):
     """Admin-only viewset for managing service areas"""
@@ -84,55 +116,79 @@ class AdminServiceAreaViewSet(viewsets.ModelViewSet):
     serializer_class = ServiceAreaSerializer
     permission_classes = [IsAdminUser]
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_packages(request):
+    """Create many packages in one request and one transaction"""
+    serializer = PackageBulkCreateSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    valid_rows, errors = serializer.validate_rows()
+    if not valid_rows:
+        return Response({'created': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = price_rows([data for _, data in valid_rows])
+    packages = create_packages_in_bulk(request.user, rows)
+
+    created = [
+        {
+            'index': index,
+            'id': package.id,
+            'tracking_number': package.tracking_number,
+            'shipping_cost': package.shipping_cost,
+        } for (index, _), package in zip(valid_rows, packages)
+    ]
+
+    return Response(
+        {'created': created, 'errors': errors},
+        status=status.HTTP_207_MULTI_STATUS if errors else status.HTTP_201_CREATED
+    )
+
+def invalid_tracking_number_response():
+    return Response(
+        {'error': 'Invalid tracking number'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+def package_not_found_response():
+    return Response(
+        {'error': 'Package not found'}, 
+        status=status.HTTP_404_NOT_FOUND
+    )
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def track_package(request, tracking_number):
-    try:
-        package = Package.objects.get(tracking_number=tracking_number)
-        serializer = PackageSerializer(package)
-        return Response(serializer.data)
-    except Package.DoesNotExist:
-        return Response(
-            {'error': 'Package not found'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
+    if not is_valid_tracking_number(tracking_number):
+        return invalid_tracking_number_response()
+
+    snapshot = tracking_snapshots.get(tracking_number)
+    if snapshot is None:
+        return package_not_found_response()
+    return Response(snapshot['package'])
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def package_location(request, tracking_number):
-    try:
-        package = Package.objects.get(tracking_number=tracking_number)
-        location_data = {
-            'tracking_number': package.tracking_number,
-            'current_location': package.current_location,
-            'latitude': package.current_latitude,
-            'longitude': package.current_longitude,
-            'status': package.status,
-            'last_updated': package.updated_at
-        }
-        return Response(location_data)
-    except Package.DoesNotExist:
-        return Response(
-            {'error': 'Package not found'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
+    if not is_valid_tracking_number(tracking_number):
+        return invalid_tracking_number_response()
+
+    snapshot = tracking_snapshots.get(tracking_number)
+    if snapshot is None:
+        return package_not_found_response()
+    return Response(snapshot['location'])
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def package_eta(request, tracking_number):
-    try:
-        package = Package.objects.get(tracking_number=tracking_number)
-        eta_data = {
-            'tracking_number': package.tracking_number,
-            'estimated_delivery': package.estimated_delivery,
-            'status': package.status
-        }
-        return Response(eta_data)
-    except Package.DoesNotExist:
-        return Response(
-            {'error': 'Package not found'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
+    if not is_valid_tracking_number(tracking_number):
+        return invalid_tracking_number_response()
+
+    snapshot = tracking_snapshots.get(tracking_number)
+    if snapshot is None:
+        return package_not_found_response()
+    return Response(snapshot['eta'])
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
@@ -156,17 +212,20 @@ def update_package_status(request, pk):
             package.current_latitude = latitude
         if longitude:
             package.current_longitude = longitude
-        package.save()
-        
-        # Create tracking event
+
+        # One transaction so the package and event signals share one broadcast
         from tracking.models import TrackingEvent
-        TrackingEvent.objects.create(
-            package=package,
-            status=new_status,
-            description=f"Package status updated to {new_status}",
-            location=location,
-            created_by=request.user
-        )
+        with transaction.atomic():
+            package.save()
+            
+            # Create tracking event
+            TrackingEvent.objects.create(
+                package=package,
+                status=new_status,
+                description=f"Package status updated to {new_status}",
+                location=location,
+                created_by=request.user
+            )
     
     serializer = PackageSerializer(package)
     return Response(serializer.data)
@@ -176,29 +235,36 @@ def update_package_status(request, pk):
 def calculate_rate(request):
     serializer = RateCalculationSerializer(data=request.data)
     if serializer.is_valid():
-        # Basic rate calculation - integrate with Google Maps for accurate distance
-        base_rate = Decimal('10.00')
-        weight = serializer.validated_data['weight']
-        length = serializer.validated_data['length']
-        width = serializer.validated_data['width']
-        height = serializer.validated_data['height']
-        
-        weight_cost = weight * Decimal('2.00')
-        volume = length * width * height / 1000000  # cubic meters
-        volume_cost = Decimal(str(volume)) * Decimal('5.00')
-        
-        total_cost = base_rate + weight_cost + volume_cost
-        
-        return Response({
-            'base_rate': base_rate,
-            'weight_cost': weight_cost,
-            'volume_cost': volume_cost,
-            'total_cost': total_cost,
-            'currency': 'USD'
-        })
+        data = serializer.validated_data
+        # Anonymous quotes use known coordinates only: no outbound geocoding
+        # or new address rows on behalf of unauthenticated callers
+        breakdown = price_shipment(
+            data['weight'], data['length'], data['width'], data['height'],
+            data['sender_address'], data['recipient_address'],
+            package_type=data['package_type'],
+            remote=request.user.is_authenticated
+        )
+        breakdown['currency'] = 'USD'
+        return Response(breakdown)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def calculate_rate_batch(request):
+    """Quote many parcel options in one request, priced together as arrays"""
+    serializer = RateBatchSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Anonymous batches use known coordinates only, like single quotes
+    quotes = quote_many(serializer.validated_data['items'], remote=request.user.is_authenticated)
+    return Response({
+        'count': len(quotes),
+        'currency': 'USD',
+        'quotes': quotes,
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def admin_send_email_notification(request, pk):
@@ -267,3 +333,17 @@ def admin_package_statistics(request):
     )
     
     return Response(stats)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_cache_stats(request):
+    """Admin endpoint to get hit/miss counters of the package caches"""
+    return Response({
+        'tracking_snapshots': tracking_snapshots.stats(),
+        'package_lists': package_list_cache.stats(),
+        'service_areas': service_area_index.stats(),
+        'websocket_auth': principal_cache.stats(),
+        'compression': compression_stats.stats(),
+        'database_pools': pool_stats(),
+        'database_replicas': replica_monitor.stats(),
+    })
\ No newline at end of file
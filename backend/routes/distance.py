@@ -0,0 +1,321 @@
+# backend/routes/distance.py
+"""
+Distance providers and caches for routing and pricing.
+
+Providers turn coordinate arrays into distance matrices in miles. The default
+is great-circle (haversine) distance computed with NumPy over whole arrays;
+a road-network backend can be plugged in through
+``settings.ROUTING_DISTANCE_PROVIDER`` by implementing ``matrix``.
+
+Two caches sit in front of the provider:
+
+* ``distance_cache`` - a bounded LRU/TTL cache of point-to-point distances,
+  used by pricing.
+* ``stop_tables`` - per service area, a float32 matrix over every active
+  delivery stop that grows one block of rows at a time as packages are
+  geocoded, used by the route optimizer.
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from swiftcourier_backend.cache_utils import LocalLRUCache
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Pairwise great-circle distances in miles.
+
+    ``origins`` is an (n, 2) and ``destinations`` an (m, 2) array of
+    ``(latitude, longitude)`` in degrees; the result is (n, m).
+    """
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+
+    lat1 = origins[:, 0][:, np.newaxis]
+    lng1 = origins[:, 1][:, np.newaxis]
+    lat2 = destinations[:, 0][np.newaxis, :]
+    lng2 = destinations[:, 1][np.newaxis, :]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_pairs(origins, destinations):
+    """Great-circle distance in miles between ``origins[i]`` and ``destinations[i]``"""
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+
+    lat1, lng1 = origins[:, 0], origins[:, 1]
+    lat2, lng2 = destinations[:, 0], destinations[:, 1]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class BaseDistanceProvider:
+    """Interface for distance backends"""
+
+    def matrix(self, origins, destinations):
+        """Return an (n, m) NumPy array of distances in miles"""
+        raise NotImplementedError
+
+    def square_matrix(self, points):
+        return self.matrix(points, points)
+
+    def pairwise(self, origins, destinations):
+        """Return the distance between each origin and its destination"""
+        return np.array([
+            self.matrix([origin], [destination])[0, 0]
+            for origin, destination in zip(origins, destinations)
+        ])
+
+
+class HaversineDistanceProvider(BaseDistanceProvider):
+    """Straight-line distance scaled by a detour factor for road travel"""
+
+    def __init__(self, detour_factor=None):
+        self.detour_factor = detour_factor or getattr(settings, 'ROUTING_DETOUR_FACTOR', 1.3)
+
+    def matrix(self, origins, destinations):
+        return haversine_matrix(origins, destinations) * self.detour_factor
+
+    def pairwise(self, origins, destinations):
+        return haversine_pairs(origins, destinations) * self.detour_factor
+
+
+def get_distance_provider():
+    path = getattr(
+        settings, 'ROUTING_DISTANCE_PROVIDER',
+        'routes.distance.HaversineDistanceProvider'
+    )
+    return import_string(path)()
+
+
+class DistanceMatrixCache:
+    """Bounded LRU/TTL cache of point-to-point distances"""
+
+    # Coordinates are rounded to about a metre before keying
+    PRECISION = 5
+
+    def __init__(self, provider=None):
+        self._provider = provider
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'DISTANCE_CACHE_MAX_ENTRIES', 100000),
+            timeout=getattr(settings, 'DISTANCE_CACHE_TIMEOUT', 86400)
+        )
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            self._provider = get_distance_provider()
+        return self._provider
+
+    def distance(self, origin, destination):
+        return float(self.distances([origin], [destination])[0])
+
+    def distances(self, origins, destinations):
+        """Distances for each ``(origins[i], destinations[i])``; misses are computed in one call"""
+        keys = [self._key(origin, destination) for origin, destination in zip(origins, destinations)]
+        results = np.empty(len(keys), dtype=np.float64)
+
+        missing = []
+        for index, key in enumerate(keys):
+            cached = self._local.get(key)
+            if cached is None:
+                missing.append(index)
+            else:
+                results[index] = cached
+
+        if missing:
+            computed = self.provider.pairwise(
+                [origins[index] for index in missing],
+                [destinations[index] for index in missing]
+            )
+            for index, value in zip(missing, computed):
+                results[index] = value
+                self._local.set(keys[index], float(value))
+
+        return results
+
+    def _key(self, origin, destination):
+        a = tuple(round(float(value), self.PRECISION) for value in origin)
+        b = tuple(round(float(value), self.PRECISION) for value in destination)
+        # Distances are symmetric, so both directions share an entry
+        return min(a, b), max(a, b)
+
+
+class StopDistanceTable:
+    """
+    Dense distance matrix over the active stops of one service area.
+
+    Stops are added in blocks: each block costs one provider call for its new
+    rows, and the matrix is mirrored into the new columns. Storage doubles
+    when full and is capped at ``ROUTING_TABLE_MAX_STOPS``; stops beyond the
+    cap are refused and callers fall back to the provider.
+    """
+
+    def __init__(self, provider=None, max_stops=None, initial_capacity=256):
+        self._provider = provider
+        self.max_stops = max_stops or getattr(settings, 'ROUTING_TABLE_MAX_STOPS', 5000)
+        capacity = min(initial_capacity, self.max_stops)
+        self._points = np.empty((capacity, 2), dtype=np.float64)
+        self._distances = np.empty((capacity, capacity), dtype=np.float32)
+        self._keys = []
+        self._index = {}
+        self._lock = threading.RLock()
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            self._provider = get_distance_provider()
+        return self._provider
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def add_many(self, stops):
+        """Add or move ``(key, latitude, longitude)`` stops; returns how many were stored"""
+        with self._lock:
+            new = []
+            for key, latitude, longitude in stops:
+                if key in self._index:
+                    if tuple(self._points[self._index[key]]) == (latitude, longitude):
+                        continue
+                    self.remove(key)
+                new.append((key, latitude, longitude))
+
+            new = new[:self.max_stops - len(self._keys)]
+            if not new:
+                return 0
+
+            size = len(self._keys)
+            end = size + len(new)
+            self._reserve(end)
+
+            self._points[size:end] = [(latitude, longitude) for _, latitude, longitude in new]
+            rows = self.provider.matrix(self._points[size:end], self._points[:end])
+            self._distances[size:end, :end] = rows
+            self._distances[:size, size:end] = rows[:, :size].T
+
+            for offset, (key, _, _) in enumerate(new):
+                self._index[key] = size + offset
+                self._keys.append(key)
+            return len(new)
+
+    def remove(self, key):
+        """Drop a stop by moving the last stop into its slot"""
+        with self._lock:
+            index = self._index.pop(key, None)
+            if index is None:
+                return
+            last = len(self._keys) - 1
+            last_key = self._keys.pop()
+            if index != last:
+                self._keys[index] = last_key
+                self._index[last_key] = index
+                self._points[index] = self._points[last]
+                self._distances[index, :last] = self._distances[last, :last]
+                self._distances[:last, index] = self._distances[:last, last]
+                self._distances[index, index] = 0.0
+
+    def sync(self, stops):
+        """Make the table hold exactly ``stops`` (``(key, latitude, longitude)``)"""
+        stops = list(stops)
+        with self._lock:
+            wanted = {key for key, _, _ in stops}
+            for key in [key for key in self._keys if key not in wanted]:
+                self.remove(key)
+            self.add_many(stops)
+
+    def covers(self, keys):
+        return all(key in self._index for key in keys)
+
+    def submatrix(self, keys):
+        with self._lock:
+            indices = [self._index[key] for key in keys]
+            return self._distances[np.ix_(indices, indices)].astype(np.float64)
+
+    def _reserve(self, size):
+        capacity = len(self._points)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        capacity = min(capacity, self.max_stops)
+
+        points = np.empty((capacity, 2), dtype=np.float64)
+        distances = np.empty((capacity, capacity), dtype=np.float32)
+        count = len(self._keys)
+        points[:count] = self._points[:count]
+        distances[:count, :count] = self._distances[:count, :count]
+        self._points, self._distances = points, distances
+
+
+class StopTableRegistry:
+    """
+    One ``StopDistanceTable`` per service area. The registry remembers which
+    area each stop is in, so it can stand in for a single table wherever
+    ``covers``/``submatrix`` are used.
+    """
+
+    DEFAULT_AREA = 'default'
+
+    def __init__(self):
+        self._tables = {}
+        self._areas = {}
+        self._lock = threading.Lock()
+
+    def table(self, area=None):
+        area = area or self.DEFAULT_AREA
+        with self._lock:
+            if area not in self._tables:
+                self._tables[area] = StopDistanceTable()
+            return self._tables[area]
+
+    def add_many(self, stops, area=None):
+        stops = list(stops)
+        stored = self.table(area).add_many(stops)
+        for key, _, _ in stops:
+            self._areas[key] = area or self.DEFAULT_AREA
+        return stored
+
+    def remove(self, key):
+        area = self._areas.pop(key, None)
+        if area is not None:
+            self.table(area).remove(key)
+
+    def sync(self, stops_by_area):
+        """Make the tables hold exactly ``{area: [(key, latitude, longitude), ...]}``"""
+        stops_by_area = {area or self.DEFAULT_AREA: list(stops) for area, stops in stops_by_area.items()}
+        for area in set(self._tables) | set(stops_by_area):
+            self.table(area).sync(stops_by_area.get(area, []))
+        self._areas = {
+            key: area for area, stops in stops_by_area.items() for key, _, _ in stops
+        }
+
+    def covers(self, keys):
+        areas = {self._areas.get(key) for key in keys}
+        if len(areas) != 1 or None in areas:
+            return False
+        return self.table(areas.pop()).covers(keys)
+
+    def submatrix(self, keys):
+        return self.table(self._areas[keys[0]]).submatrix(keys)
+
+
+distance_cache = DistanceMatrixCache()
+stop_tables = StopTableRegistry()
@@ -0,0 +1,43 @@
+# backend/routes/management/commands/benchmark_route_optimizer.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from routes.optimizer import RouteOptimizer, Stop, Vehicle
+
+
+class Command(BaseCommand):
+    help = 'Time the route optimizer on synthetic stops around a city centre'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000', help='Comma separated stop counts')
+        parser.add_argument('--stops-per-driver', type=int, default=40)
+        parser.add_argument('--radius', type=float, default=0.3, help='Spread in degrees around the centre')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        per_driver = options['stops_per_driver']
+
+        for size in (int(value) for value in options['sizes'].split(',')):
+            points = rng.normal((40.7128, -74.0060), options['radius'], size=(size, 2))
+            stops = [
+                Stop(key=i, latitude=lat, longitude=lng, zip_code=f'{i % 500:05d}', weight=2.0)
+                for i, (lat, lng) in enumerate(points)
+            ]
+            driver_count = -(-size // per_driver)
+            vehicles = [
+                Vehicle(key=i, max_stops=per_driver, max_weight=per_driver * 2.0, start=(40.7128, -74.0060))
+                for i in range(driver_count)
+            ]
+
+            start = time.perf_counter()
+            routes, unassigned = RouteOptimizer(seed=options['seed']).solve(stops, vehicles)
+            elapsed = time.perf_counter() - start
+
+            distance = sum(route.distance for route in routes)
+            self.stdout.write(
+                f'{size} stops / {driver_count} drivers: {elapsed:.2f}s, '
+                f'{distance:.0f} miles total, {len(unassigned)} unassigned'
+            )
@@ -23,6 +23,11 @@ class Route(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='route_created_at_idx'),
+        ]
+
     def __str__(self):
         return f"Route {self.id} - {self.driver.username} ({self.route_date})"
 
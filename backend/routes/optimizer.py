@@ -0,0 +1,393 @@
+# backend/routes/optimizer.py
+"""
+In-process vehicle routing.
+
+``RouteOptimizer.solve`` takes delivery stops and vehicles and returns one
+ordered route per vehicle:
+
+1. Stops are clustered with k-means on their coordinates (stops without
+   coordinates borrow the centroid of their ZIP code).
+2. Stops are assigned to clusters/vehicles in order of regret - the extra
+   distance a stop would travel if it missed its nearest cluster - while
+   respecting each vehicle's stop and weight capacity.
+3. Each route is seeded with nearest neighbour and improved with 2-opt and
+   Or-opt moves on the distance matrix from the distance provider.
+
+The engine is pure Python/NumPy and knows nothing about Django models;
+``routes.planning`` feeds it packages and drivers and stores the result.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .distance import get_distance_provider
+
+# Candidate clusters remembered per stop during capacitated assignment
+CANDIDATE_CLUSTERS = 8
+# Rows per block when computing stop-to-centroid distances
+ASSIGNMENT_BLOCK = 4096
+
+
+@dataclass
+class Stop:
+    key: object
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    zip_code: str = ''
+    weight: float = 0.0
+
+
+@dataclass
+class Vehicle:
+    key: object
+    max_stops: int
+    max_weight: float
+    start: Optional[Tuple[float, float]] = None
+
+
+@dataclass
+class PlannedRoute:
+    vehicle: Vehicle
+    stops: List[Stop] = field(default_factory=list)
+    # Miles driven to reach each stop from the previous one (None if unknown)
+    legs: List[Optional[float]] = field(default_factory=list)
+
+    @property
+    def distance(self):
+        return sum(leg for leg in self.legs if leg is not None)
+
+    @property
+    def weight(self):
+        return sum(stop.weight for stop in self.stops)
+
+
+class RouteOptimizer:
+
+    def __init__(self, distance_provider=None, distance_table=None, kmeans_iterations=15,
+                 improvement_passes=50, seed=0):
+        self.distance_provider = distance_provider or get_distance_provider()
+        # Optional StopDistanceTable with precomputed stop-to-stop distances
+        self.distance_table = distance_table
+        self.kmeans_iterations = kmeans_iterations
+        self.improvement_passes = improvement_passes
+        self.rng = np.random.default_rng(seed)
+
+    def solve(self, stops, vehicles):
+        """Return ``(routes, unassigned_stops)``"""
+        routes = [PlannedRoute(vehicle=vehicle) for vehicle in vehicles]
+        if not stops or not vehicles:
+            return routes, list(stops)
+
+        located, unlocated = self._locate(stops)
+        unassigned = []
+
+        if located:
+            points = np.array([(stop.latitude, stop.longitude) for stop in located], dtype=np.float64)
+            weights = np.array([stop.weight for stop in located], dtype=np.float64)
+
+            cluster_count = self._cluster_count(located, weights, vehicles)
+            centroids = self._kmeans(points, cluster_count)
+            assignment = self._assign(points, weights, centroids, vehicles[:cluster_count])
+
+            for index, cluster in enumerate(assignment):
+                if cluster < 0:
+                    unassigned.append(located[index])
+                else:
+                    routes[cluster].stops.append(located[index])
+
+            for route in routes:
+                self._order(route)
+
+        # Stops whose ZIP has no known coordinates go as whole ZIP groups to
+        # the vehicle with the most spare capacity, after its located stops
+        by_zip = defaultdict(list)
+        for stop in unlocated:
+            by_zip[stop.zip_code].append(stop)
+        for zip_stops in sorted(by_zip.values(), key=len, reverse=True):
+            for stop in zip_stops:
+                route = self._roomiest(routes, stop)
+                if route is None:
+                    unassigned.append(stop)
+                else:
+                    route.stops.append(stop)
+                    route.legs.append(None)
+
+        return routes, unassigned
+
+    # Clustering and assignment
+
+    def _locate(self, stops):
+        """Split stops into those with coordinates (own or ZIP centroid) and the rest"""
+        zip_points = defaultdict(list)
+        for stop in stops:
+            if stop.latitude is not None and stop.longitude is not None and stop.zip_code:
+                zip_points[stop.zip_code].append((stop.latitude, stop.longitude))
+        zip_centroids = {
+            zip_code: tuple(np.mean(points, axis=0)) for zip_code, points in zip_points.items()
+        }
+
+        located, unlocated = [], []
+        for stop in stops:
+            if stop.latitude is None or stop.longitude is None:
+                centroid = zip_centroids.get(stop.zip_code)
+                if centroid is None:
+                    unlocated.append(stop)
+                    continue
+                stop.latitude, stop.longitude = centroid
+            located.append(stop)
+        return located, unlocated
+
+    def _cluster_count(self, located, weights, vehicles):
+        mean_stops = np.mean([vehicle.max_stops for vehicle in vehicles])
+        mean_weight = np.mean([vehicle.max_weight for vehicle in vehicles])
+        needed = max(
+            math.ceil(len(located) / max(mean_stops, 1)),
+            math.ceil(weights.sum() / mean_weight) if mean_weight > 0 else 1,
+            1,
+        )
+        return int(min(needed, len(vehicles), len(located)))
+
+    @staticmethod
+    def _project(points):
+        """Equirectangular projection so Euclidean distance approximates miles"""
+        scale = np.cos(np.radians(points[:, 0].mean()))
+        return np.column_stack((points[:, 0] * 69.0, points[:, 1] * 69.0 * scale))
+
+    def _nearest(self, xy, centroids, count):
+        """Indices and squared distances of the ``count`` nearest centroids, block by block"""
+        count = min(count, len(centroids))
+        indices = np.empty((len(xy), count), dtype=np.int64)
+        distances = np.empty((len(xy), count), dtype=np.float64)
+        centroid_norms = (centroids ** 2).sum(axis=1)
+
+        for start in range(0, len(xy), ASSIGNMENT_BLOCK):
+            block = xy[start:start + ASSIGNMENT_BLOCK]
+            squared = (
+                (block ** 2).sum(axis=1)[:, np.newaxis]
+                - 2 * block @ centroids.T
+                + centroid_norms[np.newaxis, :]
+            )
+            if count < len(centroids):
+                nearest = np.argpartition(squared, count - 1, axis=1)[:, :count]
+            else:
+                nearest = np.tile(np.arange(len(centroids)), (len(block), 1))
+            nearest_distances = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1)
+            indices[start:start + len(block)] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + len(block)] = np.take_along_axis(nearest_distances, order, axis=1)
+
+        return indices, np.maximum(distances, 0.0)
+
+    def _kmeans(self, points, k):
+        xy = self._project(points)
+
+        # k-means++ seeding
+        centroids = [xy[self.rng.integers(len(xy))]]
+        closest = ((xy - centroids[0]) ** 2).sum(axis=1)
+        for _ in range(1, k):
+            total = closest.sum()
+            if total <= 0:
+                index = self.rng.integers(len(xy))
+            else:
+                index = self.rng.choice(len(xy), p=closest / total)
+            centroids.append(xy[index])
+            closest = np.minimum(closest, ((xy - xy[index]) ** 2).sum(axis=1))
+        centroids = np.array(centroids)
+
+        for _ in range(self.kmeans_iterations):
+            labels = self._nearest(xy, centroids, 1)[0][:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, xy)
+            counts = np.bincount(labels, minlength=k)[:, np.newaxis]
+            updated = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            if np.allclose(updated, centroids):
+                break
+            centroids = updated
+
+        return centroids
+
+    def _assign(self, points, weights, centroids, vehicles):
+        """Capacitated assignment of stops to clusters; -1 when nothing has room"""
+        xy = self._project(points)
+        candidates, distances = self._nearest(xy, centroids, CANDIDATE_CLUSTERS)
+
+        if candidates.shape[1] > 1:
+            regret = np.sqrt(distances[:, 1]) - np.sqrt(distances[:, 0])
+        else:
+            regret = np.zeros(len(xy))
+
+        stops_left = np.array([vehicle.max_stops for vehicle in vehicles], dtype=np.int64)
+        weight_left = np.array([vehicle.max_weight for vehicle in vehicles], dtype=np.float64)
+        assignment = np.full(len(xy), -1, dtype=np.int64)
+
+        # Stops that lose most by missing their nearest cluster choose first
+        for index in np.argsort(-regret, kind='stable'):
+            weight = weights[index]
+            for cluster in candidates[index]:
+                if stops_left[cluster] > 0 and weight_left[cluster] >= weight:
+                    break
+            else:
+                # All nearby clusters are full: fall back to the nearest one with room
+                room = np.flatnonzero((stops_left > 0) & (weight_left >= weight))
+                if not len(room):
+                    continue
+                cluster = room[np.argmin(((centroids[room] - xy[index]) ** 2).sum(axis=1))]
+
+            assignment[index] = cluster
+            stops_left[cluster] -= 1
+            weight_left[cluster] -= weight
+
+        return assignment
+
+    @staticmethod
+    def _roomiest(routes, stop):
+        best, best_room = None, -1
+        for route in routes:
+            room = route.vehicle.max_stops - len(route.stops)
+            if room > best_room and route.weight + stop.weight <= route.vehicle.max_weight:
+                best, best_room = route, room
+        return best if best_room > 0 else None
+
+    # Sequencing
+
+    def _order(self, route):
+        if not route.stops:
+            return
+
+        has_start = route.vehicle.start is not None
+        matrix = self._matrix(route)
+
+        if has_start:
+            path = self._nearest_neighbour(matrix, 0)
+        else:
+            # Open route starting from the stop furthest from the others
+            path = self._nearest_neighbour(matrix, int(np.argmax(matrix.sum(axis=1))))
+
+        path = self._improve(matrix, path)
+
+        stop_nodes = path[1:] if has_start else path
+        offset = 1 if has_start else 0
+        route.stops = [route.stops[node - offset] for node in stop_nodes]
+        route.legs = [0.0 if not has_start else float(matrix[path[0], path[1]])]
+        route.legs += [float(matrix[a, b]) for a, b in zip(stop_nodes, stop_nodes[1:])]
+
+    def _matrix(self, route):
+        """Distance matrix over the route's stops, preceded by its start point if any"""
+        points = np.array([(stop.latitude, stop.longitude) for stop in route.stops], dtype=np.float64)
+        keys = [stop.key for stop in route.stops]
+        start = route.vehicle.start
+
+        if self.distance_table is None or not self.distance_table.covers(keys):
+            if start is not None:
+                points = np.vstack(([start], points))
+            return self.distance_provider.square_matrix(points)
+
+        stop_matrix = self.distance_table.submatrix(keys)
+        if start is None:
+            return stop_matrix
+
+        from_start = self.distance_provider.matrix([start], points)[0]
+        matrix = np.empty((len(keys) + 1, len(keys) + 1), dtype=np.float64)
+        matrix[0, 0] = 0.0
+        matrix[0, 1:] = matrix[1:, 0] = from_start
+        matrix[1:, 1:] = stop_matrix
+        return matrix
+
+    @staticmethod
+    def _nearest_neighbour(matrix, start):
+        visited = np.zeros(len(matrix), dtype=bool)
+        path = [start]
+        visited[start] = True
+        for _ in range(len(matrix) - 1):
+            distances = np.where(visited, np.inf, matrix[path[-1]])
+            node = int(np.argmin(distances))
+            path.append(node)
+            visited[node] = True
+        return path
+
+    def _improve(self, matrix, path):
+        """2-opt and Or-opt on an open path whose first node stays fixed"""
+        path = list(path)
+        for _ in range(self.improvement_passes):
+            improved = self._two_opt(matrix, path)
+            improved = self._or_opt(matrix, path) or improved
+            if not improved:
+                break
+        return path
+
+    @staticmethod
+    def _two_opt(matrix, path):
+        """Reverse path[i:j+1] when that shortens the path (first improvement, vectorized over j)"""
+        n = len(path)
+        if n < 3:
+            return False
+
+        improved = False
+        nodes = np.array(path)
+        for i in range(1, n - 1):
+            a = nodes[i - 1]
+            b = nodes[i]
+            js = np.arange(i + 1, n)
+            c = nodes[js]
+            # Successor of j; the last node has none in an open path
+            has_next = js + 1 < n
+            d = nodes[np.minimum(js + 1, n - 1)]
+
+            removed = matrix[a, b] + np.where(has_next, matrix[c, d], 0.0)
+            added = matrix[a, c] + np.where(has_next, matrix[b, d], 0.0)
+            delta = added - removed
+
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = int(js[best])
+                nodes[i:j + 1] = nodes[i:j + 1][::-1]
+                improved = True
+
+        path[:] = nodes.tolist()
+        return improved
+
+    @staticmethod
+    def _or_opt(matrix, path):
+        """Move segments of one to three stops to a cheaper position, possibly reversed"""
+        improved = False
+        for length in (1, 2, 3):
+            i = 1
+            while i + length <= len(path):
+                first, last = path[i], path[i + length - 1]
+                before = path[i - 1]
+                after = path[i + length] if i + length < len(path) else None
+
+                # Saving from cutting the segment out and closing the gap
+                if after is None:
+                    saving = matrix[before, first]
+                else:
+                    saving = matrix[before, first] + matrix[last, after] - matrix[before, after]
+
+                rest = np.array(path[:i] + path[i + length:])
+                # Insert between rest[k - 1] and rest[k]; k == len(rest) appends
+                u = rest
+                v = np.append(rest[1:], -1)
+                has_v = v >= 0
+                v = np.where(has_v, v, 0)
+                base = np.where(has_v, matrix[u, v], 0.0)
+
+                forward = matrix[u, first] + np.where(has_v, matrix[last, v], 0.0) - base
+                backward = matrix[u, last] + np.where(has_v, matrix[first, v], 0.0) - base
+                # Reinserting where it was cut is a no-op
+                forward[i - 1] = np.inf
+
+                k_forward, k_backward = int(np.argmin(forward)), int(np.argmin(backward))
+                if forward[k_forward] <= backward[k_backward]:
+                    cost, k, segment = forward[k_forward], k_forward, path[i:i + length]
+                else:
+                    cost, k, segment = backward[k_backward], k_backward, path[i:i + length][::-1]
+
+                if cost < saving - 1e-9:
+                    rest = rest.tolist()
+                    path[:] = rest[:k + 1] + segment + rest[k + 1:]
+                    improved = True
+                i += 1
+        return improved
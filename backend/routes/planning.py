@@ -0,0 +1,177 @@
+# backend/routes/planning.py
+"""
+Plan delivery routes for the day from pending packages and active drivers.
+
+``plan_routes`` loads the packages awaiting delivery that are not already on
+a planned or running route, solves them with ``RouteOptimizer`` and, when
+asked to, stores the result as ``Route``/``RouteStop`` rows. Packages whose
+coordinates fall outside every service area are left unassigned.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from packages.models import Package
+from packages.service_areas import service_area_index
+from .models import Route, RouteStop
+from .distance import stop_tables
+from .optimizer import RouteOptimizer, Stop, Vehicle
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DELIVERABLE_STATUSES = ('picked_up', 'in_transit')
+ACTIVE_ROUTE_STATUSES = ('planned', 'in_progress')
+
+
+def depot_coordinates():
+    value = getattr(settings, 'ROUTE_DEPOT_COORDINATES', '')
+    if not value:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        logger.warning(f"Ignoring invalid ROUTE_DEPOT_COORDINATES: {value}")
+        return None
+    return latitude, longitude
+
+
+def route_start(route_date):
+    hour, minute = (int(part) for part in getattr(settings, 'ROUTE_START_TIME', '08:00').split(':'))
+    return timezone.make_aware(datetime.datetime.combine(route_date, datetime.time(hour, minute)))
+
+
+def stop_arrivals(route, route_date):
+    """Estimated arrival per stop from leg distances, average speed and service time"""
+    speed = getattr(settings, 'ROUTE_AVERAGE_SPEED_MPH', 25)
+    service = datetime.timedelta(minutes=getattr(settings, 'ROUTE_SERVICE_MINUTES', 5))
+
+    current = route_start(route_date)
+    arrivals = []
+    for leg in route.legs:
+        if leg:
+            current += datetime.timedelta(hours=leg / speed)
+        arrivals.append(current)
+        current += service
+    return arrivals
+
+
+def pending_packages():
+    return (
+        Package.objects
+        .filter(status__in=DELIVERABLE_STATUSES)
+        .exclude(route_stops__route__status__in=ACTIVE_ROUTE_STATUSES)
+        .only(
+            'id', 'tracking_number', 'recipient_name', 'recipient_address',
+            'recipient_city', 'recipient_state', 'recipient_zip',
+            'recipient_latitude', 'recipient_longitude', 'weight',
+        )
+        .order_by('id')
+    )
+
+
+def plan_routes(route_date=None, persist=False, optimizer=None):
+    """
+    Return ``(planned routes, unassigned packages)``; each planned route is
+    ``(driver, [(package, stop, estimated_arrival), ...], distance_miles)``.
+    """
+    route_date = route_date or timezone.localdate()
+    packages = {package.id: package for package in pending_packages()}
+    drivers = list(User.objects.filter(user_type='driver', is_active_driver=True).order_by('id'))
+
+    start = depot_coordinates()
+    vehicles = [
+        Vehicle(
+            key=driver.id,
+            max_stops=getattr(settings, 'ROUTE_MAX_STOPS_PER_DRIVER', 40),
+            max_weight=getattr(settings, 'ROUTE_MAX_WEIGHT_PER_DRIVER', 500.0),
+            start=start,
+        )
+        for driver in drivers
+    ]
+    stops = [
+        Stop(
+            key=package.id,
+            latitude=float(package.recipient_latitude) if package.recipient_latitude is not None else None,
+            longitude=float(package.recipient_longitude) if package.recipient_longitude is not None else None,
+            zip_code=package.recipient_zip,
+            weight=float(package.weight),
+        )
+        for package in packages.values()
+    ]
+
+    # Keep the precomputed stop distances in step with the pending packages,
+    # one table per service area; packages outside every area are not routed
+    enforce_coverage = service_area_index.has_coverage
+    by_area, routable, out_of_coverage = defaultdict(list), [], []
+    for stop in stops:
+        if stop.latitude is None or stop.longitude is None:
+            routable.append(stop)
+            continue
+        area = service_area_index.locate(stop.latitude, stop.longitude)
+        if area is None and enforce_coverage:
+            out_of_coverage.append(stop)
+            continue
+        by_area[area.name if area is not None else None].append((stop.key, stop.latitude, stop.longitude))
+        routable.append(stop)
+    stop_tables.sync(by_area)
+
+    optimizer = optimizer or RouteOptimizer(distance_table=stop_tables)
+    solved, unassigned = optimizer.solve(routable, vehicles)
+    unassigned += out_of_coverage
+
+    drivers_by_id = {driver.id: driver for driver in drivers}
+    planned = []
+    for route in solved:
+        if not route.stops:
+            continue
+        arrivals = stop_arrivals(route, route_date)
+        planned.append((
+            drivers_by_id[route.vehicle.key],
+            [(packages[stop.key], stop, arrival) for stop, arrival in zip(route.stops, arrivals)],
+            route.distance,
+        ))
+
+    if persist:
+        save_routes(planned, route_date)
+
+    return planned, [packages[stop.key] for stop in unassigned]
+
+
+def save_routes(planned, route_date):
+    with transaction.atomic():
+        routes = Route.objects.bulk_create([
+            Route(
+                driver=driver,
+                route_date=route_date,
+                total_packages=len(stops),
+                estimated_duration=stops[-1][2] - route_start(route_date),
+            )
+            for driver, stops, _ in planned
+        ])
+        RouteStop.objects.bulk_create([
+            RouteStop(
+                route=route,
+                package=package,
+                stop_order=order,
+                address=package.recipient_address,
+                latitude=_coordinate(stop.latitude),
+                longitude=_coordinate(stop.longitude),
+                estimated_arrival=arrival,
+            )
+            for route, (_, stops, _) in zip(routes, planned)
+            for order, (package, stop, arrival) in enumerate(stops, start=1)
+        ], batch_size=getattr(settings, 'PACKAGE_BULK_BATCH_SIZE', 500))
+    logger.info(f"Saved {len(routes)} optimized routes for {route_date}")
+    return routes
+
+
+def _coordinate(value):
+    return None if value is None else Decimal(str(round(value, 7)))
@@ -1,15 +1,16 @@
 from rest_framework import serializers
+from swiftcourier_backend.instrumentation import TimedSerializerMixin
 from .models import Route, RouteStop
-from packages.serializers import PackageSerializer
+from packages.serializers import PackageSummarySerializer
 
-class RouteStopSerializer(serializers.ModelSerializer):
-    package = PackageSerializer(read_only=True)
+class RouteStopSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    package = PackageSummarySerializer(read_only=True)
 
     class Meta:
         model = RouteStop
         fields = '__all__'
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     stops = RouteStopSerializer(many=True, read_only=True)
     driver_name = serializers.CharField(source='driver.get_full_name', read_only=True)
 
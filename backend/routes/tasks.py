@@ -0,0 +1,73 @@
+import logging
+import uuid
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from .planning import plan_routes
+
+logger = logging.getLogger(__name__)
+
+
+def _job_key(job_id):
+    return f'route-optimization:{job_id}'
+
+
+def _set_job(job_id, state):
+    cache.set(_job_key(job_id), state, getattr(settings, 'ROUTE_OPTIMIZATION_RESULT_TIMEOUT', 3600))
+
+
+def get_optimization_job(job_id):
+    """State of an optimization job, or None if unknown or expired"""
+    return cache.get(_job_key(job_id))
+
+
+def start_optimization_job(persist=False):
+    """Queue a route optimization and return its job id"""
+    job_id = uuid.uuid4().hex
+    _set_job(job_id, {'status': 'queued', 'persist': persist})
+    optimize_routes_task.delay(job_id, persist)
+    return job_id
+
+
+def serialize_plan(planned, unassigned):
+    optimized_routes = []
+    for driver, stops, distance in planned:
+        optimized_routes.append({
+            'driver_id': driver.id,
+            'driver_name': driver.get_full_name(),
+            'total_distance_miles': round(distance, 2),
+            'packages': [
+                {
+                    'tracking_number': package.tracking_number,
+                    'recipient_name': package.recipient_name,
+                    'address': package.recipient_address,
+                    'city': package.recipient_city,
+                    'stop_order': order,
+                    'estimated_arrival': arrival.isoformat(),
+                }
+                for order, (package, _, arrival) in enumerate(stops, start=1)
+            ],
+        })
+    return {
+        'optimized_routes': optimized_routes,
+        'unassigned': [package.tracking_number for package in unassigned],
+    }
+
+
+@shared_task()
+def optimize_routes_task(job_id, persist=False):
+    """Plan today's routes and store the result under ``job_id``"""
+    _set_job(job_id, {'status': 'running', 'persist': persist})
+    try:
+        planned, unassigned = plan_routes(persist=persist)
+    except Exception as e:
+        logger.exception(f"Route optimization {job_id} failed: {e}")
+        _set_job(job_id, {'status': 'failed', 'persist': persist, 'error': 'Route optimization failed'})
+        raise
+
+    result = serialize_plan(planned, unassigned)
+    _set_job(job_id, {'status': 'completed', 'persist': persist, **result})
+    logger.info(f"Route optimization {job_id} planned {len(planned)} routes")
+    return job_id
@@ -0,0 +1,149 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from packages.models import Package
+from routes.models import Route, RouteStop
+from routes.optimizer import RouteOptimizer, Stop, Vehicle
+from routes.tasks import optimize_routes_task
+
+User = get_user_model()
+
+
+class RouteOptimizerTests(TestCase):
+
+    def stops(self, count, latitude=40.0):
+        return [Stop(key=n, latitude=latitude, longitude=-75.0 + n * 0.01, weight=1.0) for n in range(count)]
+
+    def test_every_stop_is_routed_once_within_capacity(self):
+        stops = self.stops(12)
+        vehicles = [Vehicle(key=n, max_stops=5, max_weight=100.0) for n in range(3)]
+
+        routes, unassigned = RouteOptimizer().solve(stops, vehicles)
+
+        self.assertEqual(unassigned, [])
+        routed = [stop.key for route in routes for stop in route.stops]
+        self.assertCountEqual(routed, range(12))
+        self.assertTrue(all(len(route.stops) <= 5 for route in routes))
+
+    def test_stops_beyond_capacity_are_unassigned(self):
+        stops = self.stops(6)
+        vehicles = [Vehicle(key=0, max_stops=10, max_weight=4.0)]
+
+        routes, unassigned = RouteOptimizer().solve(stops, vehicles)
+
+        self.assertEqual(len(routes[0].stops), 4)
+        self.assertEqual(len(unassigned), 2)
+
+    def test_stops_on_a_line_are_visited_in_order(self):
+        stops = self.stops(8)
+        shuffled = [stops[n] for n in (3, 7, 0, 5, 1, 6, 2, 4)]
+
+        routes, _ = RouteOptimizer().solve(shuffled, [Vehicle(key=0, max_stops=10, max_weight=100.0)])
+
+        keys = [stop.key for stop in routes[0].stops]
+        self.assertIn(keys, (list(range(8)), list(reversed(range(8)))))
+
+    def test_stops_without_coordinates_follow_located_stops(self):
+        stops = self.stops(3) + [Stop(key='unknown', zip_code='00000', weight=1.0)]
+
+        routes, unassigned = RouteOptimizer().solve(stops, [Vehicle(key=0, max_stops=10, max_weight=100.0)])
+
+        self.assertEqual(unassigned, [])
+        self.assertEqual(routes[0].stops[-1].key, 'unknown')
+        self.assertIsNone(routes[0].legs[-1])
+
+    def test_no_vehicles_leaves_every_stop_unassigned(self):
+        stops = self.stops(3)
+        routes, unassigned = RouteOptimizer().solve(stops, [])
+        self.assertEqual((routes, unassigned), ([], stops))
+
+
+class OptimizeRoutesViewTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='dispatcher', password='pw-12345678', user_type='admin')
+        User.objects.create_user(username='driver', password='pw-12345678', user_type='driver',
+                                 is_active_driver=True, first_name='Dee', last_name='Driver')
+        sender = User.objects.create_user(username='merchant', password='pw-12345678')
+        for n in range(3):
+            Package.objects.create(
+                sender=sender, recipient_name=f'Recipient {n}', recipient_address=f'{n} Main Street',
+                recipient_latitude=Decimal('40.0'), recipient_longitude=Decimal(f'-75.0{n}'),
+                weight=Decimal('1.00'), status='in_transit',
+            )
+        # Run the job in the request instead of on a worker
+        patcher = mock.patch.object(optimize_routes_task, 'delay', side_effect=optimize_routes_task)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_customers_cannot_optimize(self):
+        customer = User.objects.get(username='merchant')
+        self.client.force_login(customer)
+
+        response = self.client.post('/api/routes/optimize/', secure=True)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get('/api/routes/optimize/abc/', secure=True).status_code, 403)
+
+    def test_get_does_not_run_the_optimizer(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/api/routes/optimize/', secure=True).status_code, 405)
+
+    def test_job_result_is_available_by_id(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.post('/api/routes/optimize/', secure=True)
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(f"/api/routes/optimize/{response.json()['job_id']}/", secure=True).json()
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(len(job['optimized_routes']), 1)
+        self.assertEqual(len(job['optimized_routes'][0]['packages']), 3)
+        self.assertFalse(Route.objects.exists())
+
+    def test_save_stores_planned_routes(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.post('/api/routes/optimize/', {'save': True}, content_type='application/json', secure=True)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Route.objects.get().total_packages, 3)
+
+    def test_unknown_job_is_404(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/api/routes/optimize/missing/', secure=True).status_code, 404)
+
+
+# Sessions and throttling off the database, so only the view's own queries count
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RouteQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='dispatcher', password='pw-12345678', user_type='admin')
+        self.client.force_login(self.admin)
+
+    def create_routes(self, stops_per_route, routes=3):
+        for n in range(routes):
+            driver = User.objects.create_user(username=f'driver{n}', password='pw-12345678', user_type='driver')
+            route = Route.objects.create(driver=driver, route_date=timezone.localdate())
+            for order in range(1, stops_per_route + 1):
+                package = Package.objects.create(sender=self.admin, weight=Decimal('1.00'))
+                RouteStop.objects.create(route=route, package=package, stop_order=order, address=f'{order} Main Street')
+
+    def assert_route_list_queries(self, stops_per_route):
+        self.create_routes(stops_per_route)
+        # The user, the routes with their drivers, and the stops with their packages
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/routes/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(route['stops']) for route in response.json()['results']], [stops_per_route] * 3)
+
+    def test_one_stop_per_route(self):
+        self.assert_route_list_queries(1)
+
+    def test_ten_stops_per_route(self):
+        self.assert_route_list_queries(10)
@@ -9,5 +9,6 @@ urlpatterns = [
     path('', views.RouteListView.as_view(), name='route-list'),
     path('<int:pk>/', views.RouteDetailView.as_view(), name='route-detail'),
     path('optimize/', views.optimize_routes, name='optimize-routes'),
+    path('optimize/<str:job_id>/', views.optimize_routes_result, name='optimize-routes-result'),
     path('', include(router.urls)),
 ]
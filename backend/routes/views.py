@@ -4,9 +4,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import Route, RouteStop
 from .serializers import RouteSerializer, RouteStopSerializer
+from .tasks import get_optimization_job, start_optimization_job
+from swiftcourier_backend.pagination import KeysetPagination, KeysetStreamingMixin
+from swiftcourier_backend.query_planning import SerializerQueryPlanMixin
 
-class RouteListView(generics.ListAPIView):
+class RouteListView(SerializerQueryPlanMixin, KeysetStreamingMixin, generics.ListAPIView):
     serializer_class = RouteSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -18,7 +22,7 @@ class RouteListView(generics.ListAPIView):
         else:
             return Route.objects.none()
 
-class RouteDetailView(generics.RetrieveUpdateAPIView):
+class RouteDetailView(SerializerQueryPlanMixin, generics.RetrieveUpdateAPIView):
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated]
 
@@ -31,9 +35,10 @@ class RouteDetailView(generics.RetrieveUpdateAPIView):
         else:
             return Route.objects.none()
 
-class AdminRouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.all().select_related('driver')
+class AdminRouteViewSet(SerializerQueryPlanMixin, KeysetStreamingMixin, viewsets.ModelViewSet):
+    queryset = Route.objects.all()
     serializer_class = RouteSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -55,44 +60,36 @@ class AdminRouteViewSet(viewsets.ModelViewSet):
             'completed_routes': completed_routes,
         })
 
-@api_view(['GET'])
+def _is_dispatcher(user):
+    return user.user_type == 'admin' or user.is_staff
+
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def optimize_routes(request):
-    # Basic route optimization - in production, integrate with Google Maps
-    # This is a simplified version
-    from packages.models import Package
-    from django.contrib.auth import get_user_model
-    
-    User = get_user_model()
-    
-    # Get packages that need delivery
-    pending_packages = Package.objects.filter(
-        status__in=['picked_up', 'in_transit']
-    )
-    
-    # Get available drivers
-    drivers = User.objects.filter(user_type='driver', is_active_driver=True)
-    
-    optimized_routes = []
-    for driver in drivers:
-        route_data = {
-            'driver_id': driver.id,
-            'driver_name': driver.get_full_name(),
-            'packages': []
-        }
-        
-        # Simple assignment - assign packages to drivers
-        # In production, use Google Maps API for route optimization
-        driver_packages = pending_packages[:5]  # Limit to 5 packages per driver
-        
-        for package in driver_packages:
-            route_data['packages'].append({
-                'tracking_number': package.tracking_number,
-                'recipient_name': package.recipient_name,
-                'address': package.recipient_address,
-                'city': package.recipient_city,
-            })
-        
-        optimized_routes.append(route_data)
-    
-    return Response({'optimized_routes': optimized_routes})
+    """
+    Queue optimization of today's pending packages and return its job id;
+    with ``save`` the routes are also stored as planned routes.
+    """
+    if not _is_dispatcher(request.user):
+        return Response(
+            {'error': 'Only admins can optimize routes'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    job_id = start_optimization_job(persist=bool(request.data.get('save', False)))
+    return Response({'job_id': job_id, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def optimize_routes_result(request, job_id):
+    """Status of an optimization job, with the routes once it has completed"""
+    if not _is_dispatcher(request.user):
+        return Response(
+            {'error': 'Only admins can optimize routes'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    job = get_optimization_job(job_id)
+    if job is None:
+        return Response({'error': 'Unknown optimization job'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'job_id': job_id, **job})
@@ -17,9 +17,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'swiftcourier_backend.settings')
 django.setup()
 
 # Import after setup
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
+from swiftcourier_backend.ws_auth import JWTAuthMiddleware
 
 # Import routing
 try:
@@ -28,7 +28,8 @@ try:
     
     application = ProtocolTypeRouter({
         "http": get_asgi_application(),
-        "websocket": AuthMiddlewareStack(
+        # Consumers read the JWT principal from scope['user']
+        "websocket": JWTAuthMiddleware(
             URLRouter(
                 websocket_urlpatterns
             )
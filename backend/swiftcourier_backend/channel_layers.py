@@ -0,0 +1,26 @@
+"""
+Channel layer selection by group name.
+
+Two layers are configured in ``CHANNEL_LAYERS``: ``default`` for per-user
+groups (notifications, drivers) and ``tracking`` for the public
+``tracking_<number>`` groups. With Redis, ``default`` is the list-based
+``RedisChannelLayer`` and ``tracking`` the pub/sub variant, which fans one
+publish out to any number of subscribers without per-member queues. Both
+shard across every host in ``CHANNEL_REDIS_URLS`` by a consistent hash of the
+channel or group name, so the same group always lives on the same shard.
+"""
+from channels.layers import get_channel_layer
+
+DEFAULT_LAYER_ALIAS = 'default'
+TRACKING_LAYER_ALIAS = 'tracking'
+TRACKING_GROUP_PREFIX = 'tracking_'
+
+
+def layer_alias_for_group(group):
+    if group.startswith(TRACKING_GROUP_PREFIX):
+        return TRACKING_LAYER_ALIAS
+    return DEFAULT_LAYER_ALIAS
+
+
+def channel_layer_for_group(group):
+    return get_channel_layer(layer_alias_for_group(group))
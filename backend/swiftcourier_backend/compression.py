@@ -0,0 +1,256 @@
+# backend/swiftcourier_backend/compression.py
+"""
+Response compression used by ``CompressionMiddleware``.
+
+The encoding is negotiated from ``Accept-Encoding``, preferring brotli, then
+zstd, then gzip. Brotli and zstd are used only when their packages are
+installed. The level depends on the body size, with ``COMPRESSION_LEVELS``
+holding (small body, large body) levels, because compression CPU grows with
+size. Streaming responses are compressed chunk by chunk and flushed every
+``COMPRESSION_STREAM_FLUSH_BYTES`` of input, so clients can start decoding
+before the export ends.
+
+Bodies of anonymous or ``Cache-Control: public`` GET responses, such as public
+tracking snapshots, are cached compressed. The cache key is a hash of the
+body, so a popular snapshot is compressed once. Per-endpoint counters record
+bytes in and out and the CPU spent.
+"""
+import hashlib
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+
+from .cache_utils import LocalLRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# (small body, large or streaming body) level per encoding
+DEFAULT_LEVELS = {'br': (5, 4), 'zstd': (6, 3), 'gzip': (6, 4)}
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/geo+json',
+    'image/svg+xml',
+)
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+COMPRESSORS = {'gzip': _Gzip}
+if brotli is not None:
+    COMPRESSORS['br'] = _Brotli
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _Zstd
+
+
+def available_encodings():
+    """Configured encodings in server preference order, limited to installed codecs"""
+    return [name for name in getattr(settings, 'COMPRESSION_ENCODINGS', ('br', 'zstd', 'gzip')) if name in COMPRESSORS]
+
+
+def negotiate(accept_encoding):
+    """The preferred encoding the client accepts, or None"""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    for name in available_encodings():
+        if weights.get(name, weights.get('*', 0)) > 0:
+            return name
+    return None
+
+
+def level_for(encoding, size=None):
+    """Compression level for a body of ``size`` bytes; None means streaming"""
+    levels = getattr(settings, 'COMPRESSION_LEVELS', DEFAULT_LEVELS).get(encoding, DEFAULT_LEVELS[encoding])
+    large = size is None or size >= getattr(settings, 'COMPRESSION_LARGE_BODY', 65536)
+    return levels[1] if large else levels[0]
+
+
+def is_compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(encoding, data, level):
+    compressor = COMPRESSORS[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+
+class _StreamCompressor:
+    """Incremental compression with a sync flush every ``COMPRESSION_STREAM_FLUSH_BYTES`` of input"""
+
+    def __init__(self, encoding):
+        self._compressor = COMPRESSORS[encoding](level_for(encoding))
+        self._flush_bytes = getattr(settings, 'COMPRESSION_STREAM_FLUSH_BYTES', 16384)
+        self._pending = 0
+        self.size_in = self.size_out = 0
+        self.cpu = 0.0
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        started = time.thread_time()
+        data = self._compressor.compress(chunk)
+        self.size_in += len(chunk)
+        self._pending += len(chunk)
+        if self._pending >= self._flush_bytes:
+            data += self._compressor.flush()
+            self._pending = 0
+        self.cpu += time.thread_time() - started
+        self.size_out += len(data)
+        return data
+
+    def finish(self):
+        started = time.thread_time()
+        data = self._compressor.finish()
+        self.cpu += time.thread_time() - started
+        self.size_out += len(data)
+        return data
+
+
+def compress_stream(encoding, chunks, record):
+    """Compress an iterable of chunks; ``record(bytes_in, bytes_out, cpu)`` is called at the end"""
+    stream = _StreamCompressor(encoding)
+    try:
+        for chunk in chunks:
+            data = stream.feed(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        record(stream.size_in, stream.size_out, stream.cpu)
+
+
+async def compress_async_stream(encoding, chunks, record):
+    """``compress_stream`` for async streaming responses"""
+    stream = _StreamCompressor(encoding)
+    try:
+        async for chunk in chunks:
+            data = stream.feed(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        record(stream.size_in, stream.size_out, stream.cpu)
+
+
+class CompressedBodyCache:
+    """Compressed bodies keyed by encoding, level and a hash of the body"""
+
+    def __init__(self):
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'COMPRESSION_CACHE_MAX_ENTRIES', 1000),
+            timeout=getattr(settings, 'COMPRESSION_CACHE_TIMEOUT', 300)
+        )
+
+    def compress(self, encoding, data, level):
+        """Return ``(compressed, hit)``"""
+        key = (encoding, level, hashlib.blake2b(data, digest_size=16).digest())
+        compressed = self._local.get(key)
+        if compressed is not None:
+            return compressed, True
+        compressed = compress(encoding, data, level)
+        self._local.set(key, compressed)
+        return compressed, False
+
+
+class CompressionStats:
+    """Per-endpoint bytes and CPU counters"""
+
+    def __init__(self):
+        self._endpoints = defaultdict(lambda: {
+            'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0, 'cache_hits': 0,
+        })
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, encoding, bytes_in, bytes_out, cpu, cache_hit=False):
+        with self._lock:
+            entry = self._endpoints[(endpoint, encoding)]
+            entry['responses'] += 1
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+            entry['cpu_ms'] += cpu * 1000
+            entry['cache_hits'] += int(cache_hit)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {key: dict(entry) for key, entry in self._endpoints.items()}
+        report = {}
+        for (endpoint, encoding), entry in sorted(endpoints.items()):
+            entry['bytes_saved'] = entry['bytes_in'] - entry['bytes_out']
+            entry['ratio'] = round(entry['bytes_out'] / entry['bytes_in'], 3) if entry['bytes_in'] else None
+            entry['cpu_ms'] = round(entry['cpu_ms'], 2)
+            report.setdefault(endpoint, {})[encoding] = entry
+        return {'encodings': available_encodings(), 'endpoints': report}
+
+
+compressed_bodies = CompressedBodyCache()
+compression_stats = CompressionStats()
@@ -0,0 +1,54 @@
+# backend/swiftcourier_backend/db_pool/base.py
+"""
+PostgreSQL backend that takes its connections from a process-level pool.
+
+Use it as ``ENGINE = 'swiftcourier_backend.db_pool'`` with ``CONN_MAX_AGE = 0``.
+Django then "closes" the connection at the end of each request, which returns
+it to the pool. The ``POOL`` entry of the database settings holds the options
+of ``ConnectionPool``.
+
+Django 5.1+ has its own psycopg 3 pool behind ``DatabaseWrapper.pool`` and
+``OPTIONS['pool']``. This backend leaves that property alone (it stays None),
+so Django opens raw connections and configures each one as without a pool;
+the two pools cannot be combined.
+"""
+import functools
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        if settings_dict.get('OPTIONS', {}).get('pool'):
+            raise ImproperlyConfigured(
+                "swiftcourier_backend.db_pool pools connections itself; remove OPTIONS['pool']."
+            )
+        super().__init__(settings_dict, *args, **kwargs)
+
+    @property
+    def process_pool(self):
+        pool = getattr(self, '_process_pool', None)
+        if pool is None:
+            # The parent's get_new_connection opens a plain connection, since
+            # Django's own pool is not configured
+            pool = self._process_pool = get_pool(
+                self.alias,
+                functools.partial(super().get_new_connection, self.get_connection_params()),
+                **self.settings_dict.get('POOL', {})
+            )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        return self.process_pool.checkout()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                if self.errors_occurred and not self.is_usable():
+                    self.process_pool.discard(self.connection)
+                else:
+                    self.process_pool.checkin(self.connection)
@@ -0,0 +1,207 @@
+# backend/swiftcourier_backend/db_pool/pool.py
+"""
+Process-level PostgreSQL connection pool.
+
+Django opens one connection per thread and, with the pooled backend, closes
+it at the end of every request. Closing returns the connection here instead
+of ending the session. The next request on any thread checks it out again,
+with no TCP or TLS handshake.
+
+On checkout, a connection idle longer than ``check_idle`` seconds is probed
+with ``SELECT 1``. A connection older than ``max_lifetime`` seconds is
+recycled. When all ``max_size`` connections are in use, a checkout waits up
+to ``timeout`` seconds. Wait times and checkout counts are kept per alias.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Pooled:
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.returned_at = time.monotonic()
+
+
+class ConnectionPool:
+
+    def __init__(self, alias, connect, max_size=10, timeout=10.0,
+                 max_lifetime=1800.0, max_idle=600.0, check_idle=30.0):
+        self.alias = alias
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+
+        self._idle = deque()
+        self._in_use = {}
+        self._opened = 0
+        self._lock = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.health_failures = 0
+
+    def checkout(self):
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None and self._opened < self.max_size:
+                    self._opened += 1
+                    pooled = False  # reserved a slot; open it outside the lock
+                elif pooled is None:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No connection available for '{self.alias}' within {self.timeout}s")
+                    waited = True
+                    self._lock.wait(remaining)
+                    continue
+
+            if pooled is False:
+                try:
+                    pooled = _Pooled(self._connect())
+                except Exception:
+                    self._release_slot()
+                    raise
+                self.created += 1
+            elif not self._usable(pooled):
+                self._discard(pooled)
+                continue
+
+            waited_for = time.monotonic() - started
+            with self._lock:
+                self._in_use[id(pooled.connection)] = pooled
+                self.checkouts += 1
+                if waited:
+                    self.waits += 1
+                    self.wait_time += waited_for
+                    self.max_wait = max(self.max_wait, waited_for)
+            return pooled.connection
+
+    def checkin(self, connection):
+        with self._lock:
+            pooled = self._in_use.pop(id(connection), None)
+        if pooled is None:
+            # Not ours (or already discarded)
+            self._close(connection)
+            return
+
+        if connection.closed or time.monotonic() - pooled.created_at > self.max_lifetime:
+            self._discard(pooled)
+            return
+        try:
+            # Never hand out a connection with an open transaction
+            if connection.info.transaction_status != 0:  # TRANSACTION_STATUS_IDLE
+                connection.rollback()
+        except Exception:
+            self._discard(pooled)
+            return
+
+        pooled.returned_at = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+            self._lock.notify()
+
+    def discard(self, connection):
+        """Drop a connection that errored instead of returning it"""
+        with self._lock:
+            pooled = self._in_use.pop(id(connection), None)
+        if pooled is not None:
+            self._discard(pooled)
+        else:
+            self._close(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open': self._opened,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 2),
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'health_failures': self.health_failures,
+            }
+
+    def _usable(self, pooled):
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_lifetime or now - pooled.returned_at > self.max_idle:
+            return False
+        if pooled.connection.closed:
+            return False
+        if now - pooled.returned_at > self.check_idle:
+            try:
+                with pooled.connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                pooled.connection.rollback()
+            except Exception as e:
+                self.health_failures += 1
+                logger.warning(f"Discarding unhealthy connection for '{self.alias}': {e}")
+                return False
+        return True
+
+    def _discard(self, pooled):
+        self.recycled += 1
+        self._close(pooled.connection)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._lock:
+            self._opened -= 1
+            self._lock.notify()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, **options):
+    """The pool for ``alias``, created on first use"""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(alias, connect, **options)
+    return pool
+
+
+def pool_stats():
+    return {alias: pool.stats() for alias, pool in _pools.items()}
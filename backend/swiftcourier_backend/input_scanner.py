@@ -0,0 +1,180 @@
+# backend/swiftcourier_backend/input_scanner.py
+"""
+Suspicious-input scanner used by ``InputValidationMiddleware``.
+
+The patterns are compiled once into a single case-insensitive alternation,
+so each value is scanned in one pass instead of once per pattern. Fields are
+scanned according to their name:
+- Credentials (``INPUT_SCAN_UNSCANNED_FIELDS``) are not scanned, since any
+  character is legitimate in a password.
+- Free-text fields (``INPUT_SCAN_FREE_TEXT_FIELDS``) are checked for markup
+  only, since dashes and slashes are ordinary prose there.
+- Every other field is checked against all patterns.
+
+JSON bodies have their nesting depth measured by a regex pass over brackets
+and strings before they are decoded, because ``json.loads`` recurses once per
+level. A body nested deeper than ``INPUT_SCAN_MAX_DEPTH`` counts as
+suspicious and is never decoded. Decoded keys and string values are then
+walked iteratively. The walk stops at the first match, and more than
+``INPUT_SCAN_MAX_VALUES`` strings also count as suspicious. Verdicts are
+cached per body hash, so a client retrying the same payload is not walked
+again.
+"""
+import hashlib
+import json
+import re
+
+from django.conf import settings
+
+from .cache_utils import LocalLRUCache
+
+MARKUP_PATTERNS = (
+    r'<script[^>]*>.*?</script>',  # XSS
+    r'javascript:',  # JavaScript injection
+    r'<[^>]*\bon\w+\s*=',  # Event handlers inside a tag
+)
+
+SQL_PATTERNS = (
+    r'union\s+select',  # SQL injection
+    r';\s*drop\s+table',  # SQL injection
+    r';\s*delete\s+from',  # SQL injection
+    r"'\s*(?:--|/\*)",  # SQL comment closing a quoted literal (admin'--)
+)
+
+UNSCANNED_FIELDS = frozenset({
+    'password', 'password_confirm', 'old_password', 'new_password', 'refresh', 'access', 'token',
+})
+
+FREE_TEXT_FIELDS = frozenset({
+    'description', 'notes', 'message', 'address', 'sender_address', 'recipient_address', 'vehicle_info',
+})
+
+
+def _compile(patterns):
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+# Strings (skipped whole, so brackets inside them do not count) and brackets
+JSON_STRUCTURE_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+
+
+class InputScanner:
+
+    def __init__(self, markup_patterns=MARKUP_PATTERNS, sql_patterns=SQL_PATTERNS):
+        self.pattern = _compile(markup_patterns + sql_patterns)
+        self.markup_pattern = _compile(markup_patterns)
+        self.unscanned_fields = getattr(settings, 'INPUT_SCAN_UNSCANNED_FIELDS', UNSCANNED_FIELDS)
+        self.free_text_fields = getattr(settings, 'INPUT_SCAN_FREE_TEXT_FIELDS', FREE_TEXT_FIELDS)
+        self.max_depth = getattr(settings, 'INPUT_SCAN_MAX_DEPTH', 32)
+        self.max_values = getattr(settings, 'INPUT_SCAN_MAX_VALUES', 500000)
+        self._verdicts = LocalLRUCache(
+            max_entries=getattr(settings, 'INPUT_SCAN_CACHE_MAX_ENTRIES', 10000),
+            timeout=getattr(settings, 'INPUT_SCAN_CACHE_TIMEOUT', 600)
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def matches(self, value):
+        return self.pattern.search(value) is not None
+
+    def _search_for(self, field):
+        """The search function for values of ``field``, or None when it is not scanned"""
+        if field in self.unscanned_fields:
+            return None
+        if field in self.free_text_fields:
+            return self.markup_pattern.search
+        return self.pattern.search
+
+    def scan_values(self, values, field=None):
+        """True when any string in ``values`` of ``field`` matches"""
+        search = self._search_for(field)
+        if search is None:
+            return False
+        return any(isinstance(value, str) and search(value) for value in values)
+
+    def scan_json(self, body):
+        """True when the JSON ``body`` (bytes) holds a suspicious key or string"""
+        if not body:
+            return False
+
+        key = hashlib.blake2b(body, digest_size=16).digest()
+        verdict = self._verdicts.get(key)
+        if verdict is not None:
+            self.hits += 1
+            return verdict
+        self.misses += 1
+
+        if self._too_deep(body):
+            verdict = True
+        else:
+            try:
+                data = json.loads(body)
+            except RecursionError:
+                verdict = True
+            except ValueError:
+                # Not JSON after all; scan it as text
+                verdict = self.matches(body.decode('utf-8', 'replace'))
+            else:
+                verdict = self._walk(data)
+
+        self._verdicts.set(key, verdict)
+        return verdict
+
+    def _too_deep(self, body):
+        """Whether ``body`` nests arrays and objects deeper than ``max_depth``"""
+        if body.count(b'[') + body.count(b'{') <= self.max_depth:
+            return False
+        depth = 0
+        for token in JSON_STRUCTURE_RE.finditer(body):
+            char = token.group()
+            if char == b'[' or char == b'{':
+                depth += 1
+                if depth > self.max_depth:
+                    return True
+            elif char == b']' or char == b'}':
+                depth -= 1
+        return False
+
+    def _walk(self, data):
+        search_key = self.pattern.search
+        # Strings are scanned by the field (nearest enclosing key) they belong to
+        stack = [(data, 0, None)]
+        seen = 0
+        while stack:
+            value, depth, field = stack.pop()
+            if isinstance(value, str):
+                seen += 1
+                search = self._search_for(field)
+                if search is not None and search(value):
+                    return True
+            elif isinstance(value, dict):
+                if depth >= self.max_depth:
+                    return True
+                for key, child in value.items():
+                    seen += 1
+                    if search_key(key):
+                        return True
+                    if isinstance(child, (str, dict, list)):
+                        stack.append((child, depth + 1, key))
+            elif isinstance(value, list):
+                if depth >= self.max_depth:
+                    return True
+                stack.extend(
+                    (child, depth + 1, field) for child in value if isinstance(child, (str, dict, list))
+                )
+            if seen > self.max_values:
+                return True
+        return False
+
+    def clear(self):
+        self._verdicts.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._verdicts),
+        }
+
+
+input_scanner = InputScanner()
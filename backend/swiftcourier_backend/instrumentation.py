@@ -0,0 +1,237 @@
+# backend/swiftcourier_backend/instrumentation.py
+"""
+Per-request instrumentation used by ``PerformanceMonitoringMiddleware``.
+
+For each request, the middleware installs an ``execute_wrapper`` on every
+database alias. The wrapper counts queries and SQL time and groups
+statements by their SQL text. A statement run
+``INSTRUMENTATION_N_PLUS_ONE_THRESHOLD`` times or more in one request, with
+whatever parameters, is reported as a likely N+1.
+
+Other phases are timed with ``timed(phase)``:
+- ``serialize``: ``to_representation`` of serializers using ``TimedSerializerMixin``.
+- ``render``: ``TimedJSONRenderer``.
+- ``channels``: channel layer sends.
+
+Each process keeps latency histograms and counters per route in memory.
+``render_metrics`` returns them in the Prometheus text format, together with
+the connection pool counters. A ``Server-Timing`` header is added to an
+``INSTRUMENTATION_SAMPLE_RATE`` fraction of responses.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+# Upper bounds in seconds; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    """Queries and phase timings of one request"""
+
+    __slots__ = ('queries', 'sql_time', 'statements', 'phases', '_active')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.phases = {}
+        self._active = set()
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        """Statements run at least ``threshold`` times, most repeated first"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self, total):
+        parts = [f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"']
+        parts.extend(f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in self.phases.items())
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request"""
+    metrics = _current.get()
+    # Nested blocks of the same phase (a serializer serializing another) count once
+    if metrics is None or phase in metrics._active:
+        yield
+        return
+
+    metrics._active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._active.discard(phase)
+        metrics.phases[phase] = metrics.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.record_query(sql, time.perf_counter() - started)
+
+
+@contextlib.contextmanager
+def recording_queries():
+    """Record the queries of this thread, on every database alias, in the current request"""
+    with contextlib.ExitStack() as stack:
+        for alias in settings.DATABASES:
+            stack.enter_context(connections[alias].execute_wrapper(_record_query))
+        yield
+
+
+class TimedJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedSerializerMixin:
+    """
+    Time ``to_representation`` as the ``serialize`` phase. Put it before the
+    DRF base class. With ``many=True`` each item is timed, so the phase leaves
+    out the query the list runs, and nested serializers count once.
+    """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class RouteMetrics:
+    """Latency histograms and query counters per route and method"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._routes = defaultdict(lambda: {
+            'buckets': [0] * len(self.buckets),
+            'count': 0,
+            'sum': 0.0,
+            'queries': 0,
+            'sql_seconds': 0.0,
+            'n_plus_one': 0,
+            'phases': defaultdict(float),
+        })
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, duration, metrics, n_plus_one=False):
+        with self._lock:
+            entry = self._routes[(route, method)]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    entry['buckets'][index] += 1
+                    break
+            entry['count'] += 1
+            entry['sum'] += duration
+            entry['queries'] += metrics.queries
+            entry['sql_seconds'] += metrics.sql_time
+            entry['n_plus_one'] += int(n_plus_one)
+            for phase, seconds in metrics.phases.items():
+                entry['phases'][phase] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: dict(entry, buckets=list(entry['buckets']), phases=dict(entry['phases']))
+                for key, entry in self._routes.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _family(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def render_metrics():
+    """Request and connection pool metrics of this process in the Prometheus text format"""
+    from .db_pool.pool import pool_stats
+
+    routes = sorted(route_metrics.snapshot().items())
+    lines = []
+
+    _family(lines, 'http_request_duration_seconds', 'histogram', 'Request latency by route')
+    for (route, method), entry in routes:
+        cumulative = 0
+        for bound, count in zip(route_metrics.buckets, entry['buckets']):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{_labels(route=route, method=method, le="+Inf")} {entry["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(route=route, method=method)} {entry["sum"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{_labels(route=route, method=method)} {entry["count"]}')
+
+    _family(lines, 'http_request_db_queries_total', 'counter', 'SQL queries run by requests')
+    for (route, method), entry in routes:
+        lines.append(f'http_request_db_queries_total{_labels(route=route, method=method)} {entry["queries"]}')
+
+    _family(lines, 'http_request_db_seconds_total', 'counter', 'Time requests spent in SQL')
+    for (route, method), entry in routes:
+        lines.append(f'http_request_db_seconds_total{_labels(route=route, method=method)} {entry["sql_seconds"]:.6f}')
+
+    _family(lines, 'http_request_phase_seconds_total', 'counter', 'Time requests spent serializing, rendering and sending to the channel layer')
+    for (route, method), entry in routes:
+        for phase, seconds in sorted(entry['phases'].items()):
+            lines.append(f'http_request_phase_seconds_total{_labels(route=route, method=method, phase=phase)} {seconds:.6f}')
+
+    _family(lines, 'http_request_n_plus_one_total', 'counter', 'Requests that repeated one SQL statement past the N+1 threshold')
+    for (route, method), entry in routes:
+        lines.append(f'http_request_n_plus_one_total{_labels(route=route, method=method)} {entry["n_plus_one"]}')
+
+    pools = sorted(pool_stats().items())
+    for name, key, kind, help_text, scale in (
+        ('db_pool_connections_in_use', 'in_use', 'gauge', 'Pooled connections checked out', 1),
+        ('db_pool_connections_idle', 'idle', 'gauge', 'Pooled connections waiting for a checkout', 1),
+        ('db_pool_checkouts_total', 'checkouts', 'counter', 'Connection checkouts', 1),
+        ('db_pool_waits_total', 'waits', 'counter', 'Checkouts that waited for a free connection', 1),
+        ('db_pool_wait_seconds_total', 'wait_time_ms', 'counter', 'Time checkouts spent waiting', 0.001),
+        ('db_pool_timeouts_total', 'timeouts', 'counter', 'Checkouts that gave up waiting', 1),
+    ):
+        _family(lines, name, kind, help_text)
+        for alias, stats in pools:
+            lines.append(f'{name}{_labels(alias=alias)} {stats[key] * scale:g}')
+
+    return '\n'.join(lines) + '\n'
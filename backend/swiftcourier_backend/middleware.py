@@ -1,11 +1,15 @@
 import logging
-import re
 from django.conf import settings
-from django.core.cache import cache
 from django.http import HttpResponseForbidden, HttpResponseBadRequest, HttpResponse
+from django.core.exceptions import RequestDataTooBig
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+import random
 import time
 import hashlib
+from . import compression, instrumentation, routers
+from .input_scanner import input_scanner
+from .rate_limiting import RateLimitRule, rate_limiter
 
 logger = logging.getLogger('django.security')
 
@@ -67,8 +71,13 @@ class RateLimitMiddleware(MiddlewareMixin):
     """
     Rate limiting middleware for API endpoints - ASGI compatible
     """
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.limiter = rate_limiter
         
     def __call__(self, request):
         # Skip rate limiting for admin and static files
@@ -85,14 +94,22 @@ class RateLimitMiddleware(MiddlewareMixin):
             '/api/packages/': {'requests': 100, 'window': 3600},  # 100 requests per hour
         }
         
+        decision = None
         for path, limits in rate_limits.items():
             if request.path.startswith(path):
-                if not self.check_rate_limit(client_ip, path, limits['requests'], limits['window']):
+                decision = self.check_rate_limit(client_ip, path, limits['requests'], limits['window'])
+                if not decision.allowed:
                     logger.warning(f'Rate limit exceeded for {client_ip} on {request.path}')
-                    return HttpResponseForbidden('Rate limit exceeded. Please try again later.')
+                    response = HttpResponseForbidden('Rate limit exceeded. Please try again later.')
+                    for header, value in decision.headers().items():
+                        response[header] = value
+                    return response
                 break
                 
         response = self.get_response(request)
+        if decision is not None:
+            for header, value in decision.headers().items():
+                response[header] = value
         return response
     
     def get_client_ip(self, request):
@@ -105,29 +122,20 @@ class RateLimitMiddleware(MiddlewareMixin):
         return ip
     
     def check_rate_limit(self, client_ip, path, max_requests, window):
-        """Check if request is within rate limits"""
-        cache_key = f"ratelimit:{client_ip}:{path}"
-        requests = cache.get(cache_key, [])
-        
-        # Remove old requests outside the window
-        current_time = int(__import__('time').time())
-        requests = [req_time for req_time in requests if current_time - req_time < window]
-        
-        if len(requests) >= max_requests:
-            return False
-            
-        # Add current request
-        requests.append(current_time)
-        cache.set(cache_key, requests, window)
-        
-        return True
+        """Count the request against the path's limit; returns a RateLimitDecision"""
+        return self.limiter.check(client_ip, [RateLimitRule(f'path{path}', max_requests, window)])
 
 class InputValidationMiddleware(MiddlewareMixin):
     """
     Middleware to validate and sanitize input - ASGI compatible
     """
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.scanner = input_scanner
         
     def __call__(self, request):
         # Validate request method
@@ -153,31 +161,25 @@ class InputValidationMiddleware(MiddlewareMixin):
     
     def contains_suspicious_patterns(self, request):
         """Check for SQL injection, XSS, and other attack patterns"""
-        suspicious_patterns = [
-            r'<script[^>]*>.*?</script>',  # XSS
-            r'javascript:',  # JavaScript injection
-            r'on\w+\s*=',  # Event handlers
-            r'union\s+select',  # SQL injection
-            r';\s*drop\s+table',  # SQL injection
-            r';\s*delete\s+from',  # SQL injection
-            r'--',  # SQL comment
-            r'/\*.*\*/',  # SQL comment
-        ]
-        
         # Check POST data
         if request.method in ['POST', 'PUT', 'PATCH']:
-            for key, value in request.POST.items():
-                if isinstance(value, str):
-                    for pattern in suspicious_patterns:
-                        if re.search(pattern, value, re.IGNORECASE):
-                            return True
+            if request.content_type == 'application/json':
+                try:
+                    body = request.body
+                except RequestDataTooBig:
+                    # Rejected by the view when it reads the body
+                    body = b''
+                if self.scanner.scan_json(body):
+                    return True
+            else:
+                for key, values in request.POST.lists():
+                    if self.scanner.scan_values(values, key):
+                        return True
                             
         # Check GET parameters
-        for key, value in request.GET.items():
-            if isinstance(value, str):
-                for pattern in suspicious_patterns:
-                    if re.search(pattern, value, re.IGNORECASE):
-                        return True
+        for key, values in request.GET.lists():
+            if self.scanner.scan_values(values, key):
+                return True
                         
         return False
 
@@ -185,8 +187,13 @@ class EnhancedRateLimitMiddleware(MiddlewareMixin):
     """
     Enhanced rate limiting with multiple strategies
     """
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.limiter = rate_limiter
         
     def __call__(self, request):
         # Skip rate limiting for certain paths
@@ -197,15 +204,19 @@ class EnhancedRateLimitMiddleware(MiddlewareMixin):
         # Get client identifier
         client_id = self._get_client_id(request)
         
-        # Check various rate limits
-        if not self._check_rate_limits(request, client_id):
-            return HttpResponse(
+        # Check every applicable rule at once
+        decision = self._check_rate_limits(request, client_id)
+        if not decision.allowed:
+            response = HttpResponse(
                 '{"error": "Rate limit exceeded. Please try again later."}',
                 content_type='application/json',
                 status=429
             )
-            
-        response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        for header, value in decision.headers().items():
+            response[header] = value
         return response
     
     def _get_client_id(self, request):
@@ -229,92 +240,89 @@ class EnhancedRateLimitMiddleware(MiddlewareMixin):
         return ip
     
     def _check_rate_limits(self, request, client_id):
-        """Check multiple rate limiting rules"""
-        rules = self._get_rate_limit_rules(request)
-        
-        for rule_name, limits in rules.items():
-            cache_key = f"ratelimit:{rule_name}:{client_id}"
-            current_time = int(time.time())
-            
-            # Get existing requests
-            cached_data = cache.get(cache_key, {'requests': [], 'last_reset': current_time})
-            requests = cached_data['requests']
-            last_reset = cached_data['last_reset']
-            
-            # Reset if window has passed
-            window_seconds = limits['window']
-            if current_time - last_reset >= window_seconds:
-                requests = []
-                last_reset = current_time
-            
-            # Clean old requests
-            requests = [req_time for req_time in requests if current_time - req_time < window_seconds]
-            
-            # Check limit
-            if len(requests) >= limits['requests']:
-                return False
-                
-            # Add current request
-            requests.append(current_time)
-            
-            # Update cache
-            cache.set(cache_key, {
-                'requests': requests,
-                'last_reset': last_reset
-            }, window_seconds * 2)  # Keep longer than window
-            
-        return True
+        """Count the request against every applicable rule in one limiter call"""
+        return self.limiter.check(client_id, self._get_rate_limit_rules(request))
     
     def _get_rate_limit_rules(self, request):
         """Define rate limiting rules based on endpoint and method"""
-        base_rules = {
-            'global': {'requests': 100, 'window': 60},  # 100 req/minute globally
-        }
+        base_rules = [
+            RateLimitRule('global', 100, 60),  # 100 req/minute globally
+        ]
         
         # API-specific rules
         if request.path.startswith('/api/'):
             if request.path.startswith('/api/auth/'):
-                base_rules['auth'] = {'requests': 5, 'window': 300}  # 5 req/5min for auth
+                base_rules.append(RateLimitRule('auth', 5, 300))  # 5 req/5min for auth
             elif request.path.startswith('/api/packages/') and request.method == 'POST':
-                base_rules['package_creation'] = {'requests': 10, 'window': 3600}  # 10 packages/hour
+                base_rules.append(RateLimitRule('package_creation', 10, 3600))  # 10 packages/hour
             elif request.path.startswith('/api/tracking/'):
-                base_rules['tracking'] = {'requests': 30, 'window': 60}  # 30 tracking req/minute
+                base_rules.append(RateLimitRule('tracking', 30, 60))  # 30 tracking req/minute
         
         # User-specific rules
         if hasattr(request, 'user') and request.user.is_authenticated:
-            base_rules['authenticated'] = {'requests': 500, 'window': 60}  # Higher limit for authenticated users
+            base_rules.append(RateLimitRule('authenticated', 500, 60))  # Higher limit for authenticated users
         
         return base_rules
 
 class PerformanceMonitoringMiddleware(MiddlewareMixin):
     """
-    Monitor request performance and log slow requests
+    Monitor request performance: SQL, serializer, render and channel layer
+    time per request, N+1 warnings, per-route histograms for /metrics and a
+    sampled Server-Timing header
     """
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __init__(self, get_response):
         self.get_response = get_response
         self.logger = logging.getLogger('swiftcourier.performance')
+        self.route_metrics = instrumentation.route_metrics
         
     def __call__(self, request):
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        response = self.get_response(request)
+        metrics, token = instrumentation.start_request()
+        try:
+            with instrumentation.recording_queries():
+                response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
         
         # Calculate request duration
-        duration = time.time() - start_time
+        duration = time.perf_counter() - start_time
+        route = self._route(request)
         
-        # Log slow requests (over 1 second)
-        if duration > 1.0:
+        repeated = metrics.repeated(getattr(settings, 'INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5))
+        if repeated:
+            sql, count = repeated[0]
+            self.logger.warning(
+                f'Possible N+1 in {request.method} {route}: {count} runs of {sql[:200]}'
+            )
+        self.route_metrics.observe(route, request.method, duration, metrics, n_plus_one=bool(repeated))
+        
+        # Log slow requests
+        if duration > getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST', 1.0):
             self.logger.warning(
                 f'Slow request: {request.method} {request.path} took {duration:.2f}s '
+                f'({metrics.queries} queries, {metrics.sql_time:.2f}s SQL) '
                 f'from {self._get_client_ip(request)}'
             )
         
-        # Add performance header
+        # Add performance headers
         if hasattr(response, '__setitem__'):
             response['X-Response-Time'] = f'{duration:.3f}s'
+            sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+            if sample_rate and random.random() < sample_rate:
+                response['Server-Timing'] = metrics.server_timing(duration)
         
         return response
     
+    def _route(self, request):
+        """URL pattern rather than path, so histograms stay one per endpoint"""
+        match = getattr(request, 'resolver_match', None)
+        return match.route if match is not None else 'unresolved'
+    
     def _get_client_ip(self, request):
         """Get client IP for logging"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -325,72 +333,104 @@ class PerformanceMonitoringMiddleware(MiddlewareMixin):
         return ip
 
 class CompressionMiddleware(MiddlewareMixin):
-    """Compress responses to reduce bandwidth"""
+    """Compress responses with the best encoding the client accepts"""
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         response = self.get_response(request)
-        
-        # Compress JSON responses
-        if hasattr(response, 'content') and response.get('Content-Type', '').startswith('application/json'):
-            import gzip
-            import io
-            
+
+        if not compression.is_compressible(response):
+            return response
+
+        # The body now depends on Accept-Encoding, compressed or not
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        endpoint = self._endpoint(request)
+
+        if response.streaming:
+            def record(bytes_in, bytes_out, cpu):
+                compression.compression_stats.record(endpoint, encoding, bytes_in, bytes_out, cpu)
+
+            if getattr(response, 'is_async', False):
+                response.streaming_content = compression.compress_async_stream(encoding, response.streaming_content, record)
+            else:
+                response.streaming_content = compression.compress_stream(encoding, response.streaming_content, record)
+            del response['Content-Length']
+        else:
             content = response.content
-            if len(content) > 1024:  # Only compress larger responses
-                buffer = io.BytesIO()
-                with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
-                    f.write(content)
-                
-                response.content = buffer.getvalue()
-                response['Content-Encoding'] = 'gzip'
-                response['Content-Length'] = len(response.content)
-        
-        return response
+            if len(content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+                return response
 
-class DatabaseConnectionMiddleware(MiddlewareMixin):
-    """Optimize database connections for high concurrency"""
-    
-    def __call__(self, request):
-        from django.db import connections
-        
-        # Force connection cleanup for better performance
-        if hasattr(connections, '_databases'):
-            for alias in connections._databases:
-                connection = connections[alias]
-                # Only close if connection exists and is not in use
-                if hasattr(connection, 'close') and connection.connection:
-                    try:
-                        # Check if connection is stale (older than 5 minutes)
-                        if hasattr(connection, 'connection') and connection.connection:
-                            connection.close()
-                    except:
-                        pass
-        
-        response = self.get_response(request)
+            level = compression.level_for(encoding, len(content))
+            started = time.thread_time()
+            if self._cacheable(request, response, content):
+                compressed, hit = compression.compressed_bodies.compress(encoding, content, level)
+            else:
+                compressed, hit = compression.compress(encoding, content, level), False
+            compression.compression_stats.record(
+                endpoint, encoding, len(content), len(compressed), time.thread_time() - started, hit
+            )
+            if len(compressed) >= len(content):
+                return response
+
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is no longer byte-for-byte the tagged one
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
         return response
 
-class ConnectionPoolMiddleware(MiddlewareMixin):
-    """Monitor and optimize database connection pool"""
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
-        self.request_count = 0
-        
+    def _cacheable(self, request, response, content):
+        """Responses anyone could receive; cached by body hash so entries are never private"""
+        if request.method != 'GET' or response.status_code != 200:
+            return False
+        if len(content) > getattr(settings, 'COMPRESSION_CACHE_MAX_BODY', 262144):
+            return False
+        cache_control = response.get('Cache-Control', '')
+        return 'public' in cache_control or 'HTTP_AUTHORIZATION' not in request.META
+
+    def _endpoint(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else 'unresolved'
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    Read-your-writes across requests: a client that wrote gets a short-lived
+    cookie, and its requests read from the primary while the cookie lasts
+    """
+
+    # Synchronous __call__: under ASGI, Django runs it in a worker thread
+    sync_capable = True
+    async_capable = False
+
     def __call__(self, request):
-        self.request_count += 1
-        
-        # Every 100 requests, force connection cleanup
-        if self.request_count % 100 == 0:
-            from django.db import connections
-            for alias in connections._databases:
-                connection = connections[alias]
-                if hasattr(connection, 'close'):
-                    try:
-                        connection.close()
-                    except:
-                        pass
-        
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        if not getattr(settings, 'DATABASE_REPLICAS', None):
+            return self.get_response(request)
+
+        cookie = getattr(settings, 'DATABASE_PIN_COOKIE', 'db_primary')
+        pin, token = routers.start_pin(pinned=cookie in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_pin(token)
+
+        if pin.wrote:
+            response.set_cookie(
+                cookie, '1',
+                max_age=getattr(settings, 'DATABASE_READ_YOUR_WRITES_WINDOW', 5),
+                httponly=True,
+                secure=not settings.DEBUG,
+                samesite='Lax',
+            )
+        return response
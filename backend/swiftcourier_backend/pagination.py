@@ -0,0 +1,228 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a composite, unique sort key such as
+    ``(created_at, id)``.
+
+    Pages are fetched with ``WHERE (created_at, id) < (cursor)`` instead of
+    ``OFFSET``, so the index serves every page at the same cost as the first
+    one. ``?stream=true`` returns the whole result set as one streamed JSON
+    array, fetched in keyset chunks, for exports.
+
+    A ``?ordering=`` accepted by the view's ``OrderingFilter`` replaces
+    ``ordering`` when it names non-null, non-relation fields; ``id`` is added
+    to keep the key unique.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    stream_query_param = 'stream'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        page = list(self._page(queryset, position, reverse, page_size + 1))
+        has_more = len(page) > page_size
+        page = page[:page_size]
+
+        if reverse:
+            page.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        self.next_position = self._position(page[-1]) if page and has_next else None
+        self.previous_position = self._position(page[0]) if page and has_previous else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        """The requested ordering if it can serve as a keyset, else the default one"""
+        for backend in getattr(view, 'filter_backends', ()):
+            if not hasattr(backend, 'get_ordering'):
+                continue
+            backend = backend()
+            if not request.query_params.get(getattr(backend, 'ordering_param', 'ordering')):
+                break
+            requested = backend.get_ordering(request, queryset, view)
+            if requested and all(self._keyable(queryset.model, field) for field in requested):
+                requested = tuple(requested)
+                if not any(field.lstrip('-') in ('id', 'pk') for field in requested):
+                    requested += ('-id' if requested[-1].startswith('-') else 'id',)
+                return requested
+            break
+        return type(self).ordering
+
+    @staticmethod
+    def _keyable(model, field):
+        # Row comparisons skip NULLs, and relations would compare objects
+        try:
+            field = model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            return False
+        return field.concrete and not field.is_relation and not field.null
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position, False))
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_position, True))
+
+    # Streaming exports
+
+    def wants_stream(self, request):
+        return request.query_params.get(self.stream_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_streaming_response(self, queryset, request, view, serialize):
+        """Stream every row as a JSON array; ``serialize`` turns a list of objects into data"""
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        def chunks():
+            yield '['
+            position, first = None, True
+            while True:
+                page = list(self._page(queryset, position, False, self.max_page_size))
+                if not page:
+                    break
+                for item in serialize(page):
+                    yield ('' if first else ',') + json.dumps(item, cls=JSONEncoder)
+                    first = False
+                if len(page) < self.max_page_size:
+                    break
+                position = self._position(page[-1])
+            yield ']'
+
+        return StreamingHttpResponse(chunks(), content_type='application/json')
+
+    # Cursor handling
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, cls=JSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            raw = payload['p']
+            if len(raw) != len(self.ordering):
+                raise ValueError
+            position = [
+                self._parse_value(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, raw)
+            ]
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _parse_value(self, model, field_name, value):
+        field = model._meta.get_field(field_name)
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+            return parsed
+        return field.to_python(value)
+
+    def _position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _page(self, queryset, position, reverse, limit):
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+        return queryset[:limit]
+
+    @staticmethod
+    def _after(ordering, position):
+        """Row-value comparison ``(a, b, ...) > (x, y, ...)`` in ``ordering`` direction"""
+        condition = models.Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= models.Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        # The OR above cannot bound an index scan; a range on the leading key can
+        first = ordering[0]
+        bound = models.Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+
+class TimestampKeysetPagination(KeysetPagination):
+    """Keyset pagination for tracking events, newest first"""
+    ordering = ('-timestamp', '-id')
+
+
+class KeysetStreamingMixin:
+    """Let list views answer ``?stream=true`` with a streamed export"""
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if isinstance(paginator, KeysetPagination) and paginator.wants_stream(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            return paginator.get_streaming_response(
+                queryset, request, self,
+                lambda objects: self.get_serializer(objects, many=True).data
+            )
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,87 @@
+"""
+Derive ``select_related``/``prefetch_related`` from a serializer tree.
+
+Walking the serializer's fields finds every relation it will touch: nested
+serializers and dotted sources such as ``sender.username`` on forward
+foreign keys become ``select_related`` joins, and ``many=True`` nested
+serializers become ``Prefetch`` objects whose querysets are planned from the
+child serializer in turn. A listing therefore costs one query per level of
+the tree no matter how many rows it returns.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def plan_queryset(queryset, serializer):
+    """Return ``queryset`` with the joins and prefetches ``serializer`` needs"""
+    select_related, prefetches = collect_relations(queryset.model, serializer)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def collect_relations(model, serializer, prefix=''):
+    """Return ``(select_related paths, Prefetch objects)`` for ``serializer`` on ``model``"""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    select_related, prefetches = [], []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        current_model, path = model, []
+        for attr in field.source_attrs:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # Property or method: nothing more to join
+                break
+            if not model_field.is_relation:
+                break
+
+            path.append(attr)
+            related_model = model_field.related_model
+            is_leaf = len(path) == len(field.source_attrs)
+
+            if model_field.many_to_many or model_field.one_to_many:
+                child = field.child if isinstance(field, serializers.ListSerializer) else None
+                if isinstance(child, serializers.BaseSerializer) and is_leaf:
+                    child_queryset = plan_queryset(related_model._default_manager.all(), child)
+                    prefetches.append(Prefetch(prefix + '__'.join(path), queryset=child_queryset))
+                elif isinstance(field, serializers.ManyRelatedField) and is_leaf:
+                    # List of primary keys
+                    prefetches.append(prefix + '__'.join(path))
+                break
+
+            if is_leaf and isinstance(field, serializers.PrimaryKeyRelatedField):
+                # The foreign key column already holds the primary key
+                break
+
+            select_related.append(prefix + '__'.join(path))
+
+            if isinstance(field, serializers.BaseSerializer) and is_leaf:
+                nested_select, nested_prefetch = collect_relations(
+                    related_model, field, prefix + '__'.join(path) + '__'
+                )
+                select_related.extend(nested_select)
+                prefetches.extend(nested_prefetch)
+                break
+
+            current_model = related_model
+
+    return sorted(set(select_related)), prefetches
+
+
+class SerializerQueryPlanMixin:
+    """Apply ``plan_queryset`` for the view's serializer to every queryset it reads"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return plan_queryset(queryset, self.get_serializer_class())
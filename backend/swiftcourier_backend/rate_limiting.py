@@ -0,0 +1,234 @@
+# backend/swiftcourier_backend/rate_limiting.py
+"""
+Rate limiter engine used by the rate limiting middlewares.
+
+With Redis (``RATE_LIMIT_REDIS_URL``) every rule that applies to a request is
+checked and counted by one Lua script, in a single round trip. Each rule is
+a sliding-window counter: two fixed-window counters, with the previous window
+weighted by how much of it still overlaps the sliding window. A request is
+counted only when every rule allows it, so concurrent workers cannot
+overshoot a limit and the stored state is two integers per rule and client,
+however high the limit.
+
+When Redis is unset or unreachable, limits are enforced per process by token
+buckets. Redis is retried every ``RATE_LIMIT_REDIS_RETRY_INTERVAL`` seconds.
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .cache_utils import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# KEYS: current and previous window counter per rule.
+# ARGV: now in ms, then limit and window (ms) per rule.
+# Returns {allowed, prev_1, curr_1, prev_2, curr_2, ...} counted before this request.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local counts = {}
+for i = 1, #KEYS / 2 do
+    local limit = tonumber(ARGV[i * 2])
+    local window = tonumber(ARGV[i * 2 + 1])
+    local curr = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local prev = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    local elapsed = now % window
+    if prev * (window - elapsed) / window + curr + 1 > limit then
+        allowed = 0
+    end
+    counts[#counts + 1] = prev
+    counts[#counts + 1] = curr
+end
+if allowed == 1 then
+    for i = 1, #KEYS / 2 do
+        redis.call('INCR', KEYS[i * 2 - 1])
+        redis.call('PEXPIRE', KEYS[i * 2 - 1], tonumber(ARGV[i * 2 + 1]) * 2)
+    end
+end
+table.insert(counts, 1, allowed)
+return counts
+"""
+
+
+@dataclass
+class RateLimitRule:
+    name: str
+    limit: int
+    window: int  # seconds
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    rule: RateLimitRule = None
+    remaining: int = 0
+    reset: int = 0
+    retry_after: int = 0
+
+    def headers(self):
+        """``RateLimit-*`` headers for the most restrictive rule, plus ``Retry-After`` when denied"""
+        if self.rule is None:
+            return {}
+        headers = {
+            'RateLimit-Limit': str(self.rule.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+            'RateLimit-Policy': f'{self.rule.limit};w={self.rule.window}',
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+
+def _tightest(decisions, allowed):
+    """Combine per-rule decisions into the one reported to the client"""
+    if not decisions:
+        return RateLimitDecision(allowed=True)
+    if allowed:
+        decision = min(decisions, key=lambda d: (d.remaining, -d.reset))
+    else:
+        decision = max([d for d in decisions if not d.allowed] or decisions, key=lambda d: d.retry_after)
+    decision.allowed = allowed
+    return decision
+
+
+class RedisSlidingWindowLimiter:
+
+    def __init__(self, url, prefix='ratelimit'):
+        import redis
+
+        self.prefix = prefix
+        timeout = getattr(settings, 'RATE_LIMIT_REDIS_TIMEOUT', 0.1)
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def check(self, client_id, rules):
+        now = int(time.time() * 1000)
+        keys, args = [], [now]
+        for rule in rules:
+            window = rule.window * 1000
+            bucket = now // window
+            keys.append(f'{self.prefix}:{rule.name}:{client_id}:{bucket}')
+            keys.append(f'{self.prefix}:{rule.name}:{client_id}:{bucket - 1}')
+            args.extend((rule.limit, window))
+
+        result = self.script(keys=keys, args=args)
+        allowed = bool(int(result[0]))
+
+        decisions = []
+        for index, rule in enumerate(rules):
+            prev, curr = int(result[1 + index * 2]), int(result[2 + index * 2])
+            decisions.append(self._decision(rule, prev, curr, now, allowed))
+        return _tightest(decisions, allowed)
+
+    @staticmethod
+    def _decision(rule, prev, curr, now, counted):
+        window = rule.window * 1000
+        elapsed = now % window
+        weight = (window - elapsed) / window
+        if counted:
+            curr += 1
+        estimate = prev * weight + curr
+        remaining = max(0, math.floor(rule.limit - estimate))
+        reset = math.ceil((window - elapsed) / 1000)
+
+        if estimate + (0 if counted else 1) <= rule.limit:
+            return RateLimitDecision(allowed=True, rule=rule, remaining=remaining, reset=reset)
+
+        # Time until the weighted estimate leaves room for one more request
+        if curr + 1 <= rule.limit and prev:
+            wait = window - elapsed - (rule.limit - 1 - curr) * window / prev
+        else:
+            # Only possible once this window becomes the previous one
+            wait = (window - elapsed) + (window * (1 - (rule.limit - 1) / curr) if curr else 0)
+        return RateLimitDecision(
+            allowed=False, rule=rule, remaining=0, reset=reset,
+            retry_after=max(1, math.ceil(wait / 1000))
+        )
+
+
+class LocalTokenBucketLimiter:
+    """Per-process token buckets: ``limit`` tokens, refilled over ``window`` seconds"""
+
+    def __init__(self):
+        self._buckets = LocalLRUCache(
+            max_entries=getattr(settings, 'RATE_LIMIT_LOCAL_MAX_ENTRIES', 100000),
+            timeout=3600
+        )
+        self._lock = threading.Lock()
+
+    def check(self, client_id, rules):
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for rule in rules:
+                key = f'{rule.name}:{client_id}'
+                tokens, updated = self._buckets.get(key) or (float(rule.limit), now)
+                rate = rule.limit / rule.window
+                tokens = min(float(rule.limit), tokens + (now - updated) * rate)
+                buckets.append((rule, key, tokens, rate))
+
+            allowed = all(tokens >= 1 for _, _, tokens, _ in buckets)
+            decisions = []
+            for rule, key, tokens, rate in buckets:
+                passes = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                self._buckets.set(key, (tokens, now), rule.window * 2)
+                decisions.append(RateLimitDecision(
+                    allowed=passes,
+                    rule=rule,
+                    remaining=max(0, math.floor(tokens)),
+                    reset=math.ceil((rule.limit - tokens) / rate),
+                    retry_after=0 if passes else max(1, math.ceil((1 - tokens) / rate)),
+                ))
+        return _tightest(decisions, allowed)
+
+
+class RateLimiter:
+    """Redis limiter when configured and reachable, local token buckets otherwise"""
+
+    def __init__(self):
+        self._redis = None
+        self._redis_failed_at = None
+        self.local = LocalTokenBucketLimiter()
+
+    def _redis_limiter(self):
+        url = getattr(settings, 'RATE_LIMIT_REDIS_URL', None)
+        if not url:
+            return None
+        retry = getattr(settings, 'RATE_LIMIT_REDIS_RETRY_INTERVAL', 30)
+        if self._redis_failed_at is not None and time.monotonic() - self._redis_failed_at < retry:
+            return None
+        if self._redis is None:
+            try:
+                self._redis = RedisSlidingWindowLimiter(url)
+            except Exception as e:
+                self._redis_failed_at = time.monotonic()
+                logger.warning(f"Redis rate limiter unavailable, using local buckets: {e}")
+                return None
+        return self._redis
+
+    def check(self, client_id, rules):
+        """Count one request of ``client_id`` against ``rules``; returns a ``RateLimitDecision``"""
+        if not rules:
+            return RateLimitDecision(allowed=True)
+
+        limiter = self._redis_limiter()
+        if limiter is not None:
+            try:
+                decision = limiter.check(client_id, rules)
+                self._redis_failed_at = None
+                return decision
+            except Exception as e:
+                self._redis_failed_at = time.monotonic()
+                logger.warning(f"Redis rate limiter failed, using local buckets: {e}")
+        return self.local.check(client_id, rules)
+
+
+rate_limiter = RateLimiter()
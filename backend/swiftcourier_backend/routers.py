@@ -1,20 +1,213 @@
+# backend/swiftcourier_backend/routers.py
+"""
+Read/write splitting across the primary and ``DATABASE_REPLICAS``.
+
+Writes always go to ``default``. Reads are spread over the replicas that are
+healthy and no more than ``DATABASE_REPLICA_MAX_LAG`` seconds behind. Health
+and lag are re-checked at most every ``DATABASE_REPLICA_CHECK_INTERVAL``
+seconds per process, by whichever request reads first after the interval.
+With no usable replica, reads fall back to the primary.
+
+A write pins the current request to the primary for the rest of the request,
+and for ``DATABASE_READ_YOUR_WRITES_WINDOW`` seconds after it.
+``ReplicaPinningMiddleware`` carries the pin to the client's next requests in
+a short-lived cookie, so a client reads its own writes. Reads inside a
+transaction on the primary also stay on the primary.
+"""
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# Always on the primary, and their writes do not pin: the database cache
+# backend (sessions and cached values when Redis is unavailable)
+PRIMARY_ONLY_APPS = {'django_cache'}
+
+
+class PrimaryPin:
+    """
+    Until when reads must use the primary. A request pin (``sticky``) also
+    holds from its first write to the end of the request.
+    """
+
+    __slots__ = ('until', 'sticky', 'wrote')
+
+    def __init__(self, until=0.0, sticky=False):
+        self.until = until
+        self.sticky = sticky
+        self.wrote = False
+
+    def active(self):
+        return (self.sticky and self.wrote) or self.until > time.monotonic()
+
+    def mark_write(self):
+        self.wrote = True
+        self.until = time.monotonic() + getattr(settings, 'DATABASE_READ_YOUR_WRITES_WINDOW', 5)
+
+
+# Held as a mutable object so writes in a copied context (sync_to_async)
+# are still seen by the code that started the request
+_pin = contextvars.ContextVar('database_primary_pin', default=None)
+_primary_only = contextvars.ContextVar('database_primary_only', default=False)
+
+
+def start_pin(pinned=False):
+    """Begin a request's pin state; ``pinned`` when the client wrote recently"""
+    until = time.monotonic() + getattr(settings, 'DATABASE_READ_YOUR_WRITES_WINDOW', 5) if pinned else 0.0
+    pin = PrimaryPin(until, sticky=True)
+    return pin, _pin.set(pin)
+
+
+def end_pin(token):
+    _pin.reset(token)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send every read inside the block to the primary"""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+def current_pin():
+    pin = _pin.get()
+    if pin is None:
+        # Outside a request, e.g. a Celery task: a time-limited pin for this context
+        pin = PrimaryPin()
+        _pin.set(pin)
+    return pin
+
+
+class ReplicaMonitor:
+    """Health and replication lag of each replica, refreshed lazily"""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+        self.reads = {}
+        self.pinned_reads = 0
+        self.fallback_reads = 0
+
+    @property
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def usable(self):
+        """Replicas that answered their last check and are within the lag bound"""
+        self._refresh()
+        max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10)
+        return [
+            alias for alias in self.replicas
+            if self._state.get(alias, {}).get('healthy') and self._state[alias]['lag'] <= max_lag
+        ]
+
+    def set_state(self, alias, healthy, lag=0.0):
+        self._state[alias] = {'healthy': healthy, 'lag': lag, 'checked_at': time.monotonic()}
+
+    def check(self, alias):
+        try:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_QUERY if connection.vendor == 'postgresql' else 'SELECT 0')
+                lag = float(cursor.fetchone()[0] or 0)
+        except Exception as e:
+            if self._state.get(alias, {}).get('healthy', True):
+                logger.warning(f"Replica {alias} is unavailable, reading from the primary: {e}")
+            self.set_state(alias, False)
+            return
+        if lag > getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10):
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind; skipping it")
+        self.set_state(alias, True, lag)
+
+    def _refresh(self):
+        interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        stale = [
+            alias for alias in self.replicas
+            if now - self._state.get(alias, {}).get('checked_at', float('-inf')) >= interval
+        ]
+        # One thread refreshes; the others keep using the last known state
+        if stale and self._lock.acquire(blocking=False):
+            try:
+                for alias in stale:
+                    self.check(alias)
+            finally:
+                self._lock.release()
+
+    def count(self, alias):
+        self.reads[alias] = self.reads.get(alias, 0) + 1
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'replicas': {
+                alias: {
+                    'healthy': state['healthy'],
+                    'lag_seconds': round(state['lag'], 3),
+                    'checked_seconds_ago': round(now - state['checked_at'], 1),
+                }
+                for alias, state in self._state.items()
+            },
+            'reads': dict(self.reads),
+            'pinned_reads': self.pinned_reads,
+            'fallback_reads': self.fallback_reads,
+        }
+
+
+replica_monitor = ReplicaMonitor()
+
+
 class ReadWriteRouter:
     """
     Database router for read/write splitting and optimization
     """
-    
+
     def db_for_read(self, model, **hints):
-        """Route read operations to read replica if available"""
-        return 'default'
-    
+        """Route reads to a usable replica unless the primary is required"""
+        if not replica_monitor.replicas or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+
+        if _primary_only.get() or current_pin().active() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            replica_monitor.pinned_reads += 1
+            return DEFAULT_DB_ALIAS
+
+        replicas = replica_monitor.usable()
+        if not replicas:
+            replica_monitor.fallback_reads += 1
+            return DEFAULT_DB_ALIAS
+
+        alias = random.choice(replicas)
+        replica_monitor.count(alias)
+        return alias
+
     def db_for_write(self, model, **hints):
         """Route write operations to primary database"""
-        return 'default'
-    
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            current_pin().mark_write()
+        return DEFAULT_DB_ALIAS
+
     def allow_relation(self, obj1, obj2, **hints):
         """Allow relations between objects in the same database"""
         return True
-    
+
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         """Allow migrations on all databases"""
-        return True
\ No newline at end of file
+        return True
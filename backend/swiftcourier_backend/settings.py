@@ -65,8 +65,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'swiftcourier_backend.middleware.PerformanceMonitoringMiddleware',
     'swiftcourier_backend.middleware.CompressionMiddleware',
-    'swiftcourier_backend.middleware.DatabaseConnectionMiddleware',
-    'swiftcourier_backend.middleware.ConnectionPoolMiddleware',
+    'swiftcourier_backend.middleware.ReplicaPinningMiddleware',
     
     # Security middleware (ASGI compatible)
     'swiftcourier_backend.middleware.SecurityHeadersMiddleware',
@@ -113,11 +112,59 @@ if not DATABASES['default'].get('ENGINE') or not os.getenv('DATABASE_URL'):
         }
     }
 
+# Read replicas: comma-separated URLs, added as replica_1, replica_2, ...
+# Reads go to healthy replicas unless the request wrote recently
+# (swiftcourier_backend/routers.py). Tests use the primary for all of them.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=300, conn_health_checks=True)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+# Seconds a writer keeps reading from the primary, and the lag above which a
+# replica is skipped; lag is checked at most every CHECK_INTERVAL seconds
+DATABASE_READ_YOUR_WRITES_WINDOW = float(os.getenv('DATABASE_READ_YOUR_WRITES_WINDOW', '5'))
+DATABASE_REPLICA_MAX_LAG = float(os.getenv('DATABASE_REPLICA_MAX_LAG', '10'))
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.getenv('DATABASE_REPLICA_CHECK_INTERVAL', '5'))
+DATABASE_PIN_COOKIE = 'db_primary'
+
 # PostgreSQL security settings for production
-if not DEBUG and DATABASES['default'].get('ENGINE', '').endswith('postgresql'):
-    DATABASES['default']['OPTIONS'] = {
-        'sslmode': 'require',
-    }
+for database in DATABASES.values():
+    if not DEBUG and database.get('ENGINE', '').endswith('postgresql'):
+        database['OPTIONS'] = {
+            'sslmode': 'require',
+        }
+
+# Connection pooling: 'process' keeps a pool per worker process and database
+# alias (swiftcourier_backend/db_pool), 'external' is for PgBouncer in
+# transaction mode, 'none' keeps Django's persistent per-thread connections.
+# Each pool is sized for the request threads of one worker (Daphne's
+# ASGI_THREADS or Gunicorn --threads) plus headroom for Channels executors.
+DATABASE_POOLER = os.getenv('DATABASE_POOLER', 'process')
+DATABASE_POOL_THREADS = int(os.getenv('DATABASE_POOL_THREADS', os.getenv('ASGI_THREADS', '4')))
+
+for database in DATABASES.values():
+    if not database.get('ENGINE', '').endswith('postgresql'):
+        continue
+    if DATABASE_POOLER == 'process':
+        database.update({
+            'ENGINE': 'swiftcourier_backend.db_pool',
+            'CONN_MAX_AGE': 0,  # Closing returns the connection to the pool
+            'CONN_HEALTH_CHECKS': False,  # The pool checks idle connections
+            'POOL': {
+                'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', DATABASE_POOL_THREADS + 4)),
+                'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+                'max_lifetime': float(os.getenv('DATABASE_POOL_MAX_LIFETIME', '1800')),
+                'max_idle': float(os.getenv('DATABASE_POOL_MAX_IDLE', '600')),
+                'check_idle': float(os.getenv('DATABASE_POOL_CHECK_IDLE', '30')),
+            },
+        })
+    elif DATABASE_POOLER == 'external':
+        # Server-side cursors do not survive PgBouncer's transaction pooling
+        database['CONN_MAX_AGE'] = 0
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 # Database query optimization
 DATABASE_ROUTERS = [
     'swiftcourier_backend.routers.ReadWriteRouter',
@@ -174,6 +221,46 @@ else:
         }
     }
 
+# Public tracking snapshot cache (packages.snapshots). The shared tier needs
+# Redis; without it snapshots are cached per process only.
+TRACKING_CACHE_ALIAS = 'default' if REDIS_AVAILABLE else None
+TRACKING_CACHE_TIMEOUT = 300
+TRACKING_CACHE_LOCAL_MAX_ENTRIES = 10000
+
+# Package list results (packages.list_cache), keyed by user scope and a
+# generation counter bumped on every package write
+PACKAGE_LIST_CACHE_ALIAS = 'api' if REDIS_AVAILABLE else None
+PACKAGE_LIST_CACHE_TIMEOUT = 300
+PACKAGE_LIST_CACHE_MAX_ENTRIES = 2000
+
+# Service area polygon index (packages.service_areas). Other processes pick up
+# area changes through a version key in the shared cache.
+SERVICE_AREA_CACHE_ALIAS = 'default' if REDIS_AVAILABLE else None
+SERVICE_AREA_INDEX_CHECK_INTERVAL = 5
+SERVICE_AREA_INDEX_CELL_DEGREES = 0.25
+
+# Rate limiting (swiftcourier_backend/rate_limiting.py): one Lua round trip
+# per request on Redis, per-process token buckets when Redis is unavailable
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', REDIS_URL) if REDIS_AVAILABLE else None
+RATE_LIMIT_REDIS_TIMEOUT = 0.1
+RATE_LIMIT_REDIS_RETRY_INTERVAL = 30
+
+# Input scanning (swiftcourier_backend/input_scanner.py): JSON bodies deeper or
+# larger than this are rejected; verdicts are cached per body hash
+INPUT_SCAN_MAX_DEPTH = 32
+INPUT_SCAN_MAX_VALUES = 500000
+INPUT_SCAN_CACHE_MAX_ENTRIES = 10000
+
+# Response compression (swiftcourier_backend/compression.py). brotli and zstd
+# are used when their packages are installed; levels are (small, large body)
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')
+COMPRESSION_LEVELS = {'br': (5, 4), 'zstd': (6, 3), 'gzip': (6, 4)}
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LARGE_BODY = 65536
+COMPRESSION_STREAM_FLUSH_BYTES = 16384
+COMPRESSION_CACHE_MAX_ENTRIES = 1000
+COMPRESSION_CACHE_MAX_BODY = 262144
+
 # Cache settings
 CACHE_MIDDLEWARE_ALIAS = 'default'
 CACHE_MIDDLEWARE_SECONDS = 600  # 10 minutes
@@ -244,9 +331,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 ASGI_THREADS = 4
 ASGI_APPLICATION_TIMEOUT = 30
 
-# WebSocket settings
+# WebSocket settings: sockets idle for PING_INTERVAL seconds get a heartbeat
+# and are closed when nothing arrives within PING_TIMEOUT (tracking/connections.py)
 WEBSOCKET_PING_INTERVAL = 20
 WEBSOCKET_PING_TIMEOUT = 10
+# Per-process bounds on sockets and on local subscribers of one group; 0 = unlimited
+WEBSOCKET_MAX_CONNECTIONS = int(os.getenv('WEBSOCKET_MAX_CONNECTIONS', '0'))
+WEBSOCKET_MAX_GROUP_SUBSCRIBERS = int(os.getenv('WEBSOCKET_MAX_GROUP_SUBSCRIBERS', '0'))
+# Verified WebSocket tokens, keyed by jti, so reconnects skip verification
+# and the user query; entries never outlive their token
+WS_AUTH_CACHE_TIMEOUT = 300
+WS_AUTH_CACHE_MAX_ENTRIES = 10000
 
 # Session settings - Enhanced Security
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
@@ -326,7 +421,7 @@ REST_FRAMEWORK = {
         'track': '60/minute',
     },
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'swiftcourier_backend.instrumentation.TimedJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -366,18 +461,52 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
-# CHANNEL_LAYERS configuration for both environments
-# Force InMemoryChannelLayer to avoid Redis version compatibility issues
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-        'CONFIG': {
-            "capacity": 1000,
-            "expiry": 30,
-            "group_expiry": 86400,
+# CHANNEL_LAYERS: Redis when available so broadcasts reach every Daphne
+# process and Celery worker, sharded across CHANNEL_REDIS_URLS (comma
+# separated, defaults to REDIS_URL). Public tracking groups use the pub/sub
+# layer; see swiftcourier_backend.channel_layers.
+CHANNEL_REDIS_URLS = [url for url in os.getenv('CHANNEL_REDIS_URLS', '').split(',') if url] or [REDIS_URL]
+
+if REDIS_AVAILABLE:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_URLS,
+                'prefix': 'swiftcourier',
+                'capacity': 1500,
+                'expiry': 30,
+                'group_expiry': 86400,
+            },
         },
-    },
-}
+        'tracking': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_URLS,
+                'prefix': 'swiftcourier-tracking',
+            },
+        },
+    }
+else:
+    # Single-process fallback for development without Redis
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                "capacity": 1000,
+                "expiry": 30,
+                "group_expiry": 86400,
+            },
+        },
+        'tracking': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                "capacity": 1000,
+                "expiry": 30,
+                "group_expiry": 86400,
+            },
+        },
+    }
 
 # Google Maps API
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
@@ -417,6 +546,58 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# QR codes are rendered by a Celery worker in batches of this size
+QR_CODE_BATCH_SIZE = int(os.getenv('QR_CODE_BATCH_SIZE', '200'))
+
+# Tracking numbers are reserved from the database in blocks of this size
+TRACKING_NUMBER_GENERATOR = 'packages.tracking_numbers.SequenceBlockGenerator'
+TRACKING_NUMBER_BLOCK_SIZE = int(os.getenv('TRACKING_NUMBER_BLOCK_SIZE', '100'))
+
+# Bulk package intake (/api/packages/bulk/)
+PACKAGE_BULK_MAX_ITEMS = int(os.getenv('PACKAGE_BULK_MAX_ITEMS', '10000'))
+PACKAGE_BULK_BATCH_SIZE = 500
+
+# Route optimization (routes/optimizer.py)
+ROUTING_DISTANCE_PROVIDER = 'routes.distance.HaversineDistanceProvider'
+ROUTING_DETOUR_FACTOR = 1.3
+ROUTE_MAX_STOPS_PER_DRIVER = int(os.getenv('ROUTE_MAX_STOPS_PER_DRIVER', '40'))
+ROUTE_MAX_WEIGHT_PER_DRIVER = float(os.getenv('ROUTE_MAX_WEIGHT_PER_DRIVER', '500'))
+# "lat,lng" of the depot routes start from; open routes when unset
+ROUTE_DEPOT_COORDINATES = os.getenv('ROUTE_DEPOT_COORDINATES', '')
+ROUTE_START_TIME = os.getenv('ROUTE_START_TIME', '08:00')
+ROUTE_AVERAGE_SPEED_MPH = 25
+ROUTE_SERVICE_MINUTES = 5
+# Seconds an optimization job's status and result stay readable
+ROUTE_OPTIMIZATION_RESULT_TIMEOUT = 3600
+# Precomputed stop-to-stop distances per service area (float32, n x n)
+ROUTING_TABLE_MAX_STOPS = int(os.getenv('ROUTING_TABLE_MAX_STOPS', '5000'))
+DISTANCE_CACHE_MAX_ENTRIES = 100000
+
+# Geocoding (Google Maps when GOOGLE_MAPS_API_KEY is set)
+GEOCODING_TIMEOUT = 3
+GEOCODING_BATCH_SIZE = 200
+GEOCODING_CACHE_MAX_ENTRIES = 50000
+
+# Driver GPS ingestion (tracking/driver_locations.py): pings are buffered per
+# driver and flushed in batches; tracking sockets get at most one position
+# per package per broadcast interval
+DRIVER_LOCATION_BUFFER_SIZE = 30
+DRIVER_LOCATION_FLUSH_INTERVAL = float(os.getenv('DRIVER_LOCATION_FLUSH_INTERVAL', '5'))
+DRIVER_LOCATION_SAMPLE_INTERVAL = 30
+DRIVER_LOCATION_FLUSH_CHUNK_SIZE = 1000
+DRIVER_LOCATION_BROADCAST_INTERVAL = 5
+# Compact position stream on tracking sockets (tracking/position_stream.py)
+TRACKING_STREAM_DEFAULT_RATE = 1
+TRACKING_STREAM_MAX_RATE = 5
+TRACKING_STREAM_COORDINATE_PRECISION = 5
+
+# Pricing
+PRICING_PER_MILE_RATE = os.getenv('PRICING_PER_MILE_RATE', '0.50')
+# Per package type overrides, e.g. {'fragile': {'weight_rate': '3.00', 'volume_rate': '8.00'}}
+PRICING_PACKAGE_TYPE_RATES = {}
+PRICING_BATCH_MAX_ITEMS = int(os.getenv('PRICING_BATCH_MAX_ITEMS', '1000'))
+PRICING_BATCH_MAX_ITEMS_ANONYMOUS = int(os.getenv('PRICING_BATCH_MAX_ITEMS_ANONYMOUS', '50'))
+
 # Logging configuration - Enhanced Security
 LOGGING = {
     'version': 1,
@@ -496,7 +677,8 @@ if not DEBUG:
     # Django Debug Toolbar (only in development)
     INSTALLED_APPS = [app for app in INSTALLED_APPS if not app.startswith('debug_toolbar')]
     
-    # Performance monitoring
+    # Performance monitoring first, so it times the whole middleware stack
+    MIDDLEWARE.remove('swiftcourier_backend.middleware.PerformanceMonitoringMiddleware')
     MIDDLEWARE.insert(0, 'swiftcourier_backend.middleware.PerformanceMonitoringMiddleware')
     
     # Enhanced logging for production
@@ -511,6 +693,16 @@ if not DEBUG:
         'propagate': False,
     }
 
+# Request instrumentation (swiftcourier_backend/instrumentation.py): per-route
+# latency histograms at /metrics, an N+1 warning once one statement runs
+# N_PLUS_ONE_THRESHOLD times in a request, and a Server-Timing header on a
+# SAMPLE_RATE fraction of responses
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '1' if DEBUG else '0'))
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = int(os.getenv('INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', '5'))
+INSTRUMENTATION_SLOW_REQUEST = 1.0  # seconds
+# Bearer token for Prometheus scrapes of /metrics; without one only staff can read it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 # Performance optimizations
 if not DEBUG:
     # Disable debug toolbar in production
@@ -0,0 +1,392 @@
+import gzip
+import json
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import compression
+from .db_pool import pool as db_pool
+from .db_pool.base import DatabaseWrapper as PooledDatabaseWrapper
+from .input_scanner import InputScanner
+from .middleware import CompressionMiddleware, EnhancedRateLimitMiddleware, InputValidationMiddleware
+from packages.list_cache import package_list_cache
+from packages.models import Package
+
+from .rate_limiting import RateLimitRule
+from .routers import PrimaryPin, ReadWriteRouter, replica_monitor
+from .ws_auth import JWTAuthMiddleware, WebSocketPrincipal, authenticate_token, principal_cache
+
+
+@override_settings(RATE_LIMIT_REDIS_URL=None)
+class AsgiMiddlewareTests(TestCase):
+    """The project middleware must work when Django runs under ASGI (Daphne)"""
+
+    async def test_async_request_passes_through_middleware(self):
+        response = await AsyncClient().get('/api/health/', secure=True, REMOTE_ADDR='10.20.0.1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('RateLimit-Limit', response)
+        self.assertIn('X-Response-Time', response)
+
+    async def test_async_request_over_the_limit_is_rejected(self):
+        client = AsyncClient()
+        rules = [RateLimitRule('asgi-test', 1, 60)]
+        with mock.patch.object(EnhancedRateLimitMiddleware, '_get_rate_limit_rules', return_value=rules):
+            first = await client.get('/api/health/', secure=True, REMOTE_ADDR='10.20.0.2')
+            second = await client.get('/api/health/', secure=True, REMOTE_ADDR='10.20.0.2')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+
+
+class InputScannerTests(TestCase):
+
+    def test_deeply_nested_body_is_suspicious_without_decoding(self):
+        scanner = InputScanner()
+        self.assertTrue(scanner.scan_json(b'[' * 100000))
+        self.assertTrue(scanner.scan_json(b'{"a":' * 50 + b'1' + b'}' * 50))
+
+    def test_brackets_inside_strings_do_not_count_as_nesting(self):
+        body = b'{"note": "' + b'[' * 100 + b'\\"{{{"}'
+        self.assertFalse(InputScanner().scan_json(body))
+
+    def test_ordinary_body_passes(self):
+        self.assertFalse(InputScanner().scan_json(b'{"packages": [{"weight": "1.50", "tags": [["a"]]}]}'))
+
+    def test_credentials_and_free_text_are_not_rejected(self):
+        scanner = InputScanner()
+        self.assertFalse(scanner.scan_json(b'{"username": "ann", "password": "Tr0ub4dor--x"}'))
+        self.assertFalse(scanner.scan_json(b'{"description": "Books -- fragile", "notes": "/* top */ side up"}'))
+        self.assertFalse(scanner.scan_values(['one = 1', 'mention=yes'], 'q'))
+
+    def test_injection_is_still_rejected(self):
+        scanner = InputScanner()
+        self.assertTrue(scanner.scan_json(b'{"username": "admin\'--"}'))
+        self.assertTrue(scanner.scan_json(b'{"description": "<img src=x onerror=alert(1)>"}'))
+        self.assertTrue(scanner.scan_json(b'{"items": [{"recipient_name": "x union select password"}]}'))
+        self.assertTrue(scanner.scan_values(['<script>alert(1)</script>'], 'q'))
+
+
+class InputValidationMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.middleware = InputValidationMiddleware(lambda request: HttpResponse('ok'))
+        self.factory = RequestFactory()
+
+    def test_login_with_dashes_in_password_passes(self):
+        request = self.factory.post(
+            '/api/auth/token/', '{"username": "ann", "password": "Tr0ub4dor--x"}', content_type='application/json'
+        )
+        self.assertEqual(self.middleware(request).status_code, 200)
+
+    def test_quoted_sql_comment_in_query_string_is_blocked(self):
+        request = self.factory.get('/api/packages/', {'search': "x' -- "})
+        self.assertEqual(self.middleware(request).status_code, 403)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReadWriteRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(replica_monitor, 'usable', return_value=['replica']),
+            # Writes by earlier tests pin this thread to the primary
+            mock.patch('swiftcourier_backend.routers.current_pin', return_value=PrimaryPin()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = ReadWriteRouter()
+
+    def model(self, app_label):
+        return mock.Mock(_meta=mock.Mock(app_label=app_label))
+
+    def test_reads_go_to_a_replica(self):
+        self.assertEqual(self.router.db_for_read(self.model('packages')), 'replica')
+
+    def test_database_cache_reads_stay_on_the_primary(self):
+        self.assertEqual(self.router.db_for_read(self.model('django_cache')), DEFAULT_DB_ALIAS)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        package_list_cache._local.clear()
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', password='pw-12345678',
+                                              user_type='admin', is_staff=True)
+        for weight in ('3.00', '1.00', '2.00', '1.00', '5.00'):
+            Package.objects.create(sender=self.admin, tracking_number=f'T{Package.objects.count()}',
+                                   weight=weight)
+        for n in range(3):
+            User.objects.create_user(username=f'user{n}', password='pw-12345678')
+        self.client.force_login(self.admin)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            body = self.client.get(url, secure=True).json()
+            ids += [package['id'] for package in body['results']]
+            url, pages = body['next'], pages + 1
+        return ids, pages
+
+    def test_pages_cover_every_row_once(self):
+        ids, pages = self.walk('/api/packages/?page_size=2')
+
+        expected = list(Package.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_requested_ordering_is_kept_across_pages(self):
+        ids, _ = self.walk('/api/packages/?page_size=2&ordering=weight')
+
+        expected = list(Package.objects.order_by('weight', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_views_without_keyset_pagination_return_every_row(self):
+        response = self.client.get('/api/accounts/admin/users/', secure=True)
+        self.assertIsInstance(response.json(), list)
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.staff = User.objects.create_user(username='ops', password='pw-12345678',
+                                              user_type='admin', is_staff=True)
+        self.customer = User.objects.create_user(username='shopper', password='pw-12345678')
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token_are_staff_only(self):
+        self.assertEqual(self.client.get('/metrics', secure=True).status_code, 403)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get('/metrics', secure=True).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds', response.content)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_metrics_with_token_require_it(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics', secure=True).status_code, 403)
+        response = self.client.get('/metrics', secure=True, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_serialization_is_timed(self):
+        package_list_cache._local.clear()
+        Package.objects.create(sender=self.staff, weight='1.00')
+        self.client.force_login(self.staff)
+
+        response = self.client.get('/api/packages/', secure=True)
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+
+class PooledBackendTests(SimpleTestCase):
+    """Connects through the pooled backend with psycopg2.connect stubbed out"""
+
+    settings_dict = {
+        'ENGINE': 'swiftcourier_backend.db_pool', 'NAME': 'courier', 'USER': 'courier', 'PASSWORD': 'secret',
+        'HOST': 'db', 'PORT': '5432', 'OPTIONS': {}, 'TIME_ZONE': None, 'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'TEST': {},
+        'POOL': {'max_size': 2},
+    }
+
+    def setUp(self):
+        self.raw = mock.MagicMock(closed=False)
+        self.raw.info.transaction_status = 0
+        self.raw.info.server_version = 150000
+        self.raw.info.parameter_status.return_value = 'Europe/Paris'
+        connect = mock.patch('psycopg2.connect', return_value=self.raw)
+        jsonb = mock.patch('psycopg2.extras.register_default_jsonb')
+        self.connect = connect.start()
+        jsonb.start()
+        self.addCleanup(connect.stop)
+        self.addCleanup(jsonb.stop)
+        self.addCleanup(db_pool._pools.pop, 'pool-test', None)
+
+    def wrapper(self):
+        return PooledDatabaseWrapper(dict(self.settings_dict), alias='pool-test')
+
+    def test_connections_are_configured_and_reused(self):
+        first = self.wrapper()
+        first.connect()
+        self.assertIs(first.connection, self.raw)
+        # Django's own pool stays off, so each checkout is configured
+        self.assertIsNone(getattr(first, 'pool', None))
+        cursor = self.raw.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_any_call("SELECT set_config('TimeZone', %s, false)", ['UTC'])
+        first.close()
+
+        second = self.wrapper()
+        second.connect()
+        self.assertIs(second.connection, self.raw)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual(db_pool.pool_stats()['pool-test']['checkouts'], 2)
+        second.close()
+
+    def test_django_pool_option_is_rejected(self):
+        settings_dict = dict(self.settings_dict, OPTIONS={'pool': True})
+        with self.assertRaises(ImproperlyConfigured):
+            PooledDatabaseWrapper(settings_dict, alias='pool-test')
+
+
+class WebSocketAuthTests(TestCase):
+
+    def setUp(self):
+        principal_cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='courier', email='courier@example.com',
+                                             password='pw-12345678', user_type='driver')
+        self.other = User.objects.create_user(username='other', password='pw-12345678')
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def test_valid_token_gives_principal_and_is_cached(self):
+        first = await authenticate_token(self.token)
+        second = await authenticate_token(self.token)
+
+        self.assertIsInstance(first, WebSocketPrincipal)
+        self.assertEqual((first.id, first.user_type), (self.user.id, 'driver'))
+        self.assertEqual(second, first)
+        self.assertEqual(principal_cache.hits, 1)
+
+    async def test_missing_or_garbage_token_is_anonymous(self):
+        self.assertIsInstance(await authenticate_token(None), AnonymousUser)
+        self.assertIsInstance(await authenticate_token('not-a-jwt'), AnonymousUser)
+
+    async def test_expired_token_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=-1))
+
+        self.assertIsInstance(await authenticate_token(str(token)), AnonymousUser)
+
+    async def test_inactive_user_is_rejected(self):
+        await get_user_model().objects.filter(id=self.user.id).aupdate(is_active=False)
+
+        self.assertIsInstance(await authenticate_token(self.token), AnonymousUser)
+
+    async def test_forged_token_reusing_a_cached_jti_is_verified(self):
+        await authenticate_token(self.token)
+        payload = jwt.decode(self.token, options={'verify_signature': False})
+        payload['user_id'] = str(self.other.id)
+        forged = jwt.encode(payload, 'not-the-signing-key-of-this-deployment', algorithm='HS256')
+
+        self.assertIsInstance(await authenticate_token(forged), AnonymousUser)
+
+    async def test_middleware_sets_scope_user(self):
+        seen = {}
+
+        async def inner(scope, receive, send):
+            seen.update(scope)
+
+        middleware = JWTAuthMiddleware(inner)
+        await middleware({'type': 'websocket', 'query_string': f'token={self.token}'.encode()}, None, None)
+        self.assertEqual(seen['user'].id, self.user.id)
+
+        await middleware({'type': 'websocket', 'query_string': b''}, None, None)
+        self.assertIsInstance(seen['user'], AnonymousUser)
+
+
+class CompressionTests(SimpleTestCase):
+
+    body = json.dumps([{'tracking_number': f'SC{n:012d}', 'status': 'in_transit'} for n in range(100)]).encode()
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(compression, 'compressed_bodies', compression.CompressedBodyCache()))
+        self.enterContext(mock.patch.object(compression, 'compression_stats', compression.CompressionStats()))
+
+    def respond(self, response, accept_encoding='gzip', **extra):
+        request = RequestFactory().get('/api/packages/', HTTP_ACCEPT_ENCODING=accept_encoding, **extra)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None, **headers):
+        response = HttpResponse(self.body if body is None else body, content_type='application/json')
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    @unittest.skipUnless({'br', 'zstd'} <= set(compression.COMPRESSORS), 'brotli and zstandard are not installed')
+    def test_negotiation_prefers_br_then_zstd_then_gzip(self):
+        for accept_encoding, expected in (
+            ('gzip, zstd, br', 'br'),
+            ('gzip;q=1.0, br;q=0.1', 'br'),
+            ('gzip, zstd, br;q=0', 'zstd'),
+            ('gzip, br;q=0, zstd;q=0', 'gzip'),
+            ('*', 'br'),
+            ('*;q=0, gzip', 'gzip'),
+            ('br;q=fast, gzip', 'gzip'),
+            ('identity', None),
+            ('', None),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(compression.negotiate(accept_encoding), expected)
+
+    def test_body_is_compressed_and_varies_on_accept_encoding(self):
+        response = self.respond(self.json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_uncompressed_responses_still_vary_on_accept_encoding(self):
+        for response in (self.respond(self.json_response(), accept_encoding=''),
+                         self.respond(self.json_response(b'{}'))):
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_encoded_and_binary_responses_are_left_alone(self):
+        encoded = self.respond(self.json_response(**{'Content-Encoding': 'br'}))
+        image = self.respond(HttpResponse(self.body, content_type='image/png'))
+
+        self.assertEqual(encoded['Content-Encoding'], 'br')
+        self.assertEqual(encoded.content, self.body)
+        self.assertFalse(image.has_header('Content-Encoding'))
+        self.assertFalse(image.has_header('Vary'))
+
+    def test_streaming_response_is_compressed_in_chunks(self):
+        chunks = [self.body[start:start + 500] for start in range(0, len(self.body), 500)]
+        response = StreamingHttpResponse(iter(chunks), content_type='application/json')
+        response['Content-Length'] = str(len(self.body))
+
+        response = self.respond(response)
+        compressed = b''.join(response.streaming_content)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(compressed), self.body)
+        stats = compression.compression_stats.stats()['endpoints']['unresolved']['gzip']
+        self.assertEqual((stats['bytes_in'], stats['bytes_out']), (len(self.body), len(compressed)))
+
+    def test_anonymous_bodies_are_compressed_once(self):
+        first = self.respond(self.json_response())
+        second = self.respond(self.json_response())
+        private = self.respond(self.json_response(), HTTP_AUTHORIZATION='Bearer token')
+        shared = self.respond(self.json_response(**{'Cache-Control': 'public, max-age=30'}),
+                              HTTP_AUTHORIZATION='Bearer token')
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(private.content, first.content)
+        stats = compression.compression_stats.stats()['endpoints']['unresolved']['gzip']
+        self.assertEqual((stats['responses'], stats['cache_hits']), (4, 2))
+        self.assertEqual(gzip.decompress(shared.content), self.body)
+
+    def test_strong_etag_is_weakened(self):
+        strong = self.respond(self.json_response(ETag='"v1"'))
+        weak = self.respond(self.json_response(ETag='W/"v1"'))
+
+        self.assertEqual(strong['ETag'], 'W/"v1"')
+        self.assertEqual(weak['ETag'], 'W/"v1"')
@@ -1,9 +1,11 @@
 """
 URL configuration for swiftcourier_backend project.
 """
+import hmac
+
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
@@ -33,6 +35,19 @@ def health_check(request):
         'version': '1.0.0'
     })
 
+def metrics(request):
+    """Prometheus metrics of this process"""
+    from .instrumentation import render_metrics
+
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        authorized = hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    else:
+        authorized = request.user.is_staff
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -46,6 +61,7 @@ urlpatterns = [
         path('health/', health_check, name='health_check'),
     ])),
     path('health/', health_check, name='health_check'),  # Load balancer health check
+    path('metrics', metrics, name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
@@ -0,0 +1,159 @@
+# backend/swiftcourier_backend/ws_auth.py
+"""
+JWT authentication for WebSocket connections.
+
+``JWTAuthMiddleware`` sits in front of the WebSocket ``URLRouter`` and sets
+``scope['user']`` from the ``token`` query parameter. It sets either a
+``WebSocketPrincipal`` or ``AnonymousUser``.
+
+Verified tokens are remembered by their ``jti`` claim in a bounded
+in-process cache, until the token expires or for ``WS_AUTH_CACHE_TIMEOUT``
+seconds, whichever comes first. A client that reconnects with the same token
+skips both the signature check and the user query. Each entry also stores a
+digest of the full token, so a forged token that reuses a known ``jti`` is
+still verified.
+"""
+import hashlib
+import hmac
+import logging
+import time
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+import jwt
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache_utils import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_FIELDS = ('id', 'username', 'email', 'user_type', 'is_staff')
+
+
+@dataclass(frozen=True)
+class WebSocketPrincipal:
+    """The user fields WebSocket consumers need, without a model instance"""
+    id: int
+    username: str
+    email: str
+    user_type: str
+    is_staff: bool = False
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.email or self.username
+
+
+def token_from_scope(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    values = query.get('token')
+    return values[0] if values else None
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenPrincipalCache:
+
+    def __init__(self):
+        self._local = LocalLRUCache(
+            max_entries=getattr(settings, 'WS_AUTH_CACHE_MAX_ENTRIES', 10000),
+            timeout=getattr(settings, 'WS_AUTH_CACHE_TIMEOUT', 300)
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        """Return the cached principal for ``token``, or None"""
+        jti = self._unverified_jti(token)
+        entry = self._local.get(jti) if jti else None
+        if entry is None or not hmac.compare_digest(entry[0], _digest(token)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, access_token, token, principal):
+        jti = access_token.get(settings.SIMPLE_JWT.get('JTI_CLAIM', 'jti'))
+        if not jti:
+            return
+        timeout = min(
+            getattr(settings, 'WS_AUTH_CACHE_TIMEOUT', 300),
+            access_token.get('exp', 0) - time.time()
+        )
+        if timeout > 0:
+            self._local.set(jti, (_digest(token), principal), timeout)
+
+    def clear(self):
+        self._local.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._local),
+            'evictions': self._local.evictions,
+        }
+
+    @staticmethod
+    def _unverified_jti(token):
+        # The payload is only read to find the cache key; the cached digest
+        # of the whole token is what proves it was verified before
+        try:
+            payload = jwt.decode(token, options={'verify_signature': False})
+        except jwt.PyJWTError:
+            return None
+        return payload.get(settings.SIMPLE_JWT.get('JTI_CLAIM', 'jti'))
+
+
+principal_cache = TokenPrincipalCache()
+
+
+def load_principal(token):
+    """Verify ``token`` and load its user; raises TokenError or DoesNotExist"""
+    access_token = AccessToken(token)
+    user_id = access_token[settings.SIMPLE_JWT.get('USER_ID_CLAIM', 'user_id')]
+    values = get_user_model().objects.filter(id=user_id, is_active=True).values(*PRINCIPAL_FIELDS).get()
+    principal = WebSocketPrincipal(**values)
+    principal_cache.set(access_token, token, principal)
+    return principal
+
+
+async def authenticate_token(token):
+    """The principal for ``token``, or AnonymousUser when it is missing or invalid"""
+    if not token:
+        return AnonymousUser()
+
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    try:
+        return await database_sync_to_async(load_principal)(token)
+    except (TokenError, KeyError, get_user_model().DoesNotExist) as e:
+        logger.info(f"[WS] Token validation failed: {e}")
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware:
+    """Populate ``scope['user']`` from the ``token`` query parameter"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await authenticate_token(token_from_scope(scope)))
+        return await self.inner(scope, receive, send)
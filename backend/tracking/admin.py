@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TrackingEvent
+from .models import DriverLocation, TrackingEvent
 
 @admin.register(TrackingEvent)
 class TrackingEventAdmin(admin.ModelAdmin):
@@ -7,3 +7,10 @@ class TrackingEventAdmin(admin.ModelAdmin):
     list_filter = ('status', 'timestamp')
     search_fields = ('package__tracking_number', 'description')
     readonly_fields = ('timestamp',)
+
+
+@admin.register(DriverLocation)
+class DriverLocationAdmin(admin.ModelAdmin):
+    list_display = ('driver', 'latitude', 'longitude', 'recorded_at')
+    search_fields = ('driver__username', 'driver__email')
+    readonly_fields = ('recorded_at',)
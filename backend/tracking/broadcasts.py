@@ -0,0 +1,184 @@
+# backend/tracking/broadcasts.py
+"""
+Per-transaction buffer for package broadcasts.
+
+A status update saves the package and then creates a tracking event, and both
+post_save signals used to broadcast the same payload to the same two groups
+and queue the same email. The signals now only record which packages changed;
+the buffer dedupes them by package and, once the transaction commits,
+retires cached lists, rebuilds tracking snapshots, sends every WebSocket
+message in one async batch and queues one email per package.
+
+Outside a transaction (autocommit) each change is flushed immediately, so
+writes that should be coalesced belong in ``transaction.atomic``.
+"""
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from django.db import transaction
+
+from swiftcourier_backend.channel_layers import channel_layer_for_group
+from swiftcourier_backend.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+async def _send_all(messages):
+    results = await asyncio.gather(
+        *(channel_layer_for_group(group).group_send(group, message) for group, message in messages),
+        return_exceptions=True
+    )
+    for (group, _), result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Broadcast to {group} failed: {result}")
+
+
+def send_group_messages(messages):
+    """
+    Send ``[(group, message), ...]`` through one sync-to-async bridge, each on
+    the channel layer that serves its group
+    """
+    if not messages:
+        return
+    with timed('channels'):
+        async_to_sync(_send_all)(messages)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def package_update_payload(package, last_updated):
+    return {
+        'package_id': package.id,
+        'tracking_number': package.tracking_number,
+        'status': package.status,
+        'current_location': package.current_location,
+        'latitude': float(package.current_latitude) if package.current_latitude else None,
+        'longitude': float(package.current_longitude) if package.current_longitude else None,
+        'estimated_delivery': _isoformat(package.estimated_delivery),
+        'last_updated': _isoformat(last_updated),
+        'sender_id': package.sender_id,
+    }
+
+
+def new_package_payload(package):
+    return {
+        'package_id': package.id,
+        'tracking_number': package.tracking_number,
+        'status': package.status,
+        'recipient_name': package.recipient_name,
+        'recipient_address': package.recipient_address,
+        'created_at': _isoformat(package.created_at),
+        'sender_id': package.sender_id,
+    }
+
+
+class BroadcastBatch:
+    """Changes recorded during one transaction, keyed by package id"""
+
+    def __init__(self):
+        self.packages = {}
+        self.created = set()
+        self.last_updated = {}
+        # Kept so the registered on_commit callback can be recognised later
+        self.callback = self.flush
+
+    def add(self, package, created=False, timestamp=None):
+        self.packages[package.pk] = package
+        if created:
+            self.created.add(package.pk)
+        timestamp = timestamp or package.updated_at
+        current = self.last_updated.get(package.pk)
+        if timestamp and (current is None or timestamp > current):
+            self.last_updated[package.pk] = timestamp
+
+    def flush(self):
+        if getattr(_local, 'batch', None) is self:
+            _local.batch = None
+
+        from packages.list_cache import package_list_cache
+        from packages.snapshots import tracking_snapshots
+
+        messages = []
+        for package_id, package in self.packages.items():
+            tracking_snapshots.invalidate(package.tracking_number)
+
+            if package_id in self.created:
+                # Handled by NotificationsConsumer.new_package_created
+                messages.append((f'notifications_{package.sender_id}', {
+                    'type': 'new_package_created',
+                    'data': new_package_payload(package),
+                }))
+            else:
+                payload = package_update_payload(package, self.last_updated.get(package_id))
+                messages.append((f'tracking_{package.tracking_number}', {
+                    'type': 'package_update',
+                    'data': payload,
+                }))
+                messages.append((f'notifications_{package.sender_id}', {
+                    'type': 'package_update',
+                    'data': payload,
+                }))
+
+        for sender_id in {package.sender_id for package in self.packages.values()}:
+            package_list_cache.bump(sender_id)
+
+        # Rebuild snapshots of updated packages now, once, so the sockets
+        # that refresh on this broadcast all hit the cache
+        for package_id, package in self.packages.items():
+            if package_id not in self.created:
+                try:
+                    tracking_snapshots.get(package.tracking_number)
+                except Exception as e:
+                    logger.warning(f"Could not refresh tracking snapshot for {package.tracking_number}: {e}")
+
+        try:
+            send_group_messages(messages)
+        except Exception as e:
+            logger.warning(f"Package broadcasts failed: {e}")
+
+        self._queue_emails()
+
+    def _queue_emails(self):
+        from notifications.tasks import send_tracking_notification_email
+
+        for package_id in self.packages:
+            try:
+                if hasattr(send_tracking_notification_email, 'delay'):
+                    send_tracking_notification_email.delay(package_id)
+                else:
+                    # Fallback to synchronous call
+                    send_tracking_notification_email(package_id)
+            except Exception as e:
+                logger.warning(f"Could not queue tracking email for package {package_id}: {e}")
+
+
+def _current_batch():
+    """The batch of the running transaction, or None in autocommit mode"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+
+    batch = getattr(_local, 'batch', None)
+    # A rolled back transaction drops its on_commit callbacks; start afresh
+    # instead of adding to a batch that will never be flushed
+    if batch is None or not any(entry[1] is batch.callback for entry in connection.run_on_commit):
+        batch = _local.batch = BroadcastBatch()
+        transaction.on_commit(batch.callback)
+    return batch
+
+
+def record_package_change(package, created=False, timestamp=None):
+    """Broadcast ``package`` once the surrounding transaction commits"""
+    batch = _current_batch()
+    if batch is None:
+        batch = BroadcastBatch()
+        batch.add(package, created, timestamp)
+        batch.flush()
+    else:
+        batch.add(package, created, timestamp)
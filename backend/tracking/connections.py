@@ -0,0 +1,159 @@
+# backend/tracking/connections.py
+"""
+Server-driven WebSocket liveness and a per-process connection registry.
+
+Each accepted socket runs a heartbeat task. A socket that sends nothing for
+``WEBSOCKET_PING_INTERVAL`` seconds gets a ``heartbeat`` message. If it still
+sends nothing, not even ``heartbeat_ack``, within ``WEBSOCKET_PING_TIMEOUT``
+seconds, it leaves its groups and is closed. Dead mobile sockets therefore
+stop receiving broadcasts within about half a minute, rather than at the
+channel layer's ``group_expiry``.
+
+The registry counts live sockets and local subscribers per group, so the
+fan-out cost of a broadcast is visible. ``WEBSOCKET_MAX_CONNECTIONS`` and
+``WEBSOCKET_MAX_GROUP_SUBSCRIBERS`` (0 = unlimited) bound it per process.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Close codes in the application range (4000-4999)
+CLOSE_HEARTBEAT_TIMEOUT = 4408
+CLOSE_TOO_MANY_CONNECTIONS = 4429
+
+
+class ConnectionRegistry:
+    """Live sockets of this process, by channel name, and their groups"""
+
+    def __init__(self):
+        self._connections = {}
+        self._groups = Counter()
+        self.accepted = 0
+        self.rejected = 0
+        self.reaped = 0
+
+    def can_join(self, channel_name, group):
+        max_connections = getattr(settings, 'WEBSOCKET_MAX_CONNECTIONS', 0)
+        if max_connections and channel_name not in self._connections and len(self._connections) >= max_connections:
+            return False
+        max_subscribers = getattr(settings, 'WEBSOCKET_MAX_GROUP_SUBSCRIBERS', 0)
+        return not (max_subscribers and self._groups[group] >= max_subscribers)
+
+    def add(self, channel_name, kind, group):
+        entry = self._connections.get(channel_name)
+        if entry is None:
+            entry = self._connections[channel_name] = {'kind': kind, 'groups': set(), 'since': time.time()}
+            self.accepted += 1
+        if group not in entry['groups']:
+            entry['groups'].add(group)
+            self._groups[group] += 1
+
+    def remove(self, channel_name):
+        """Forget a socket; returns the groups it had joined"""
+        entry = self._connections.pop(channel_name, None)
+        if entry is None:
+            return set()
+        for group in entry['groups']:
+            self._groups[group] -= 1
+            if self._groups[group] <= 0:
+                del self._groups[group]
+        return entry['groups']
+
+    def subscribers(self, group):
+        return self._groups.get(group, 0)
+
+    def stats(self, top=20):
+        kinds = Counter(entry['kind'] for entry in self._connections.values())
+        return {
+            'connections': len(self._connections),
+            'by_consumer': dict(kinds),
+            'groups': len(self._groups),
+            'largest_groups': dict(self._groups.most_common(top)),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'reaped': self.reaped,
+        }
+
+
+connection_registry = ConnectionRegistry()
+
+
+class HeartbeatMixin:
+    """
+    For ``AsyncWebsocketConsumer`` subclasses: join groups through
+    ``join_group`` and the socket is registered and kept alive by the server.
+    """
+
+    async def join_group(self, group):
+        """Join ``group`` unless a per-process bound is reached; closes the socket then"""
+        if not connection_registry.can_join(self.channel_name, group):
+            connection_registry.rejected += 1
+            logger.warning(f"[WS] Rejected {type(self).__name__} socket for {group}: connection limit reached")
+            await self.close(code=CLOSE_TOO_MANY_CONNECTIONS)
+            return False
+
+        await self.channel_layer.group_add(group, self.channel_name)
+        connection_registry.add(self.channel_name, type(self).__name__, group)
+        return True
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        self._last_seen = time.monotonic()
+        self._heartbeat = asyncio.ensure_future(self._heartbeat_loop())
+
+    async def websocket_receive(self, message):
+        self._last_seen = time.monotonic()
+        text = message.get('text')
+        # Acks only prove liveness; they never reach receive()
+        if text and '"heartbeat_ack"' in text:
+            try:
+                if json.loads(text).get('type') == 'heartbeat_ack':
+                    return
+            except (ValueError, AttributeError):
+                pass
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        heartbeat = getattr(self, '_heartbeat', None)
+        if heartbeat is not None:
+            heartbeat.cancel()
+        connection_registry.remove(self.channel_name)
+        await super().websocket_disconnect(message)
+
+    async def _heartbeat_loop(self):
+        interval = getattr(settings, 'WEBSOCKET_PING_INTERVAL', 20)
+        timeout = getattr(settings, 'WEBSOCKET_PING_TIMEOUT', 10)
+        try:
+            while True:
+                idle = time.monotonic() - self._last_seen
+                if idle < interval:
+                    await asyncio.sleep(interval - idle)
+                    continue
+
+                sent_at = time.monotonic()
+                await self.send(text_data=json.dumps({'type': 'heartbeat', 'timestamp': time.time()}))
+                await asyncio.sleep(timeout)
+                if self._last_seen < sent_at:
+                    await self._reap()
+                    return
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"[WS] Heartbeat stopped for {self.channel_name}: {e}")
+
+    async def _reap(self):
+        """Stop broadcasts to an unresponsive socket now, then close it"""
+        connection_registry.reaped += 1
+        for group in connection_registry.remove(self.channel_name):
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except Exception as e:
+                logger.warning(f"[WS] Could not discard {self.channel_name} from {group}: {e}")
+        logger.info(f"[WS] Closing unresponsive {type(self).__name__} socket {self.channel_name}")
+        await self.close(code=CLOSE_HEARTBEAT_TIMEOUT)
@@ -3,34 +3,65 @@ import json
 import asyncio
 import os
 import logging
+import weakref
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import AccessToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from .models import TrackingEvent
+from .models import attach_latest_events, with_latest_event
+from .connections import HeartbeatMixin
+from .driver_locations import driver_locations
+from .position_stream import PACKAGE_LOCATION_FIELDS, PACKAGE_UPDATE_FIELDS, PositionStream, stream_fields
 from packages.models import Package
-
-User = get_user_model()
+from packages.snapshots import tracking_snapshots
+from swiftcourier_backend.channel_layers import TRACKING_LAYER_ALIAS
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-class TrackingConsumer(AsyncWebsocketConsumer):
+# In-flight snapshot loads per event loop and tracking number, so a connect
+# storm on one package waits on a single load instead of one thread hop per
+# socket. Futures belong to the loop that created them.
+_snapshot_loads = weakref.WeakKeyDictionary()
+
+
+async def shared_package_snapshot(tracking_number):
+    """The live tracking payload for ``tracking_number``, or None"""
+    loads = _snapshot_loads.setdefault(asyncio.get_running_loop(), {})
+    load = loads.get(tracking_number)
+    if load is None:
+        # The sync_to_async thread is shared by every consumer: no waiting
+        # there for another builder, build directly on a miss
+        load = asyncio.ensure_future(
+            database_sync_to_async(tracking_snapshots.get)(tracking_number, wait=False)
+        )
+        loads[tracking_number] = load
+        load.add_done_callback(lambda _: loads.pop(tracking_number, None))
+
+    try:
+        snapshot = await asyncio.shield(load)
+    except Exception as e:
+        logger.error(f"Error getting package data for {tracking_number}: {e}")
+        return None
+    return snapshot['live'] if snapshot else None
+
+
+class TrackingConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
+    # Public tracking groups live on the pub/sub layer
+    channel_layer_alias = TRACKING_LAYER_ALIAS
+
     async def connect(self):
         self.tracking_number = self.scope['url_route']['kwargs']['tracking_number']
         self.room_group_name = f'tracking_{self.tracking_number}'
+        # Set when the client asks for the compact position stream
+        self.position_stream = None
         
-        # Authenticate user from token
-        self.user = await self.get_user_from_token()
+        # Set by JWTAuthMiddleware
+        self.user = self.scope['user']
         
         # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        if not await self.join_group(self.room_group_name):
+            return
 
         await self.accept()
 
@@ -50,36 +81,15 @@ class TrackingConsumer(AsyncWebsocketConsumer):
             }))
 
     async def disconnect(self, close_code):
+        if self.position_stream is not None:
+            self.position_stream.close()
+
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
-    @database_sync_to_async
-    def get_user_from_token(self):
-        try:
-            # Get token from query string
-            query_string = self.scope.get('query_string', b'').decode()
-            token = None
-            
-            if query_string:
-                for param in query_string.split('&'):
-                    if param.startswith('token='):
-                        token = param.split('=', 1)[1]
-                        break
-            
-            if token:
-                # Validate and decode JWT token
-                access_token = AccessToken(token)
-                user_id = access_token['user_id']
-                user = User.objects.get(id=user_id)
-                return user
-                
-            return AnonymousUser()
-        except (InvalidToken, TokenError, User.DoesNotExist, KeyError):
-            return AnonymousUser()
-
     async def receive(self, text_data):
         """Handle incoming WebSocket messages"""
         try:
@@ -114,6 +124,21 @@ class TrackingConsumer(AsyncWebsocketConsumer):
                         'type': 'package_status',
                         'data': package_data
                     }))
+                    if self.position_stream is not None:
+                        self.position_stream.reset()
+            elif message_type == 'stream_positions':
+                # {"type": "stream_positions", "rate": 2} switches to delta
+                # frames, at most `rate` per second; "enabled": false stops them
+                if self.position_stream is not None:
+                    self.position_stream.close()
+                    self.position_stream = None
+                if data.get('enabled', True):
+                    self.position_stream = PositionStream(self.send, data.get('rate'))
+                await self.send(text_data=json.dumps({
+                    'type': 'position_stream',
+                    'enabled': self.position_stream is not None,
+                    'rate': 1 / self.position_stream.interval if self.position_stream else None
+                }))
                     
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -123,11 +148,24 @@ class TrackingConsumer(AsyncWebsocketConsumer):
 
     async def package_update(self, event):
         """Handle package update events from Django signals"""
+        if self.position_stream is not None:
+            self.position_stream.push(stream_fields(event['data'], PACKAGE_UPDATE_FIELDS))
+            return
         await self.send(text_data=json.dumps({
             'type': 'package_update',
             'data': event['data']
         }))
 
+    async def package_location(self, event):
+        """Handle positions copied from the driver carrying the package"""
+        if self.position_stream is not None:
+            self.position_stream.push(stream_fields(event['data'], PACKAGE_LOCATION_FIELDS))
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'package_location',
+            'data': event['data']
+        }))
+
     async def tracking_event_created(self, event):
         """Handle new tracking events"""
         await self.send(text_data=json.dumps({
@@ -135,59 +173,18 @@ class TrackingConsumer(AsyncWebsocketConsumer):
             'data': event['data']
         }))
 
-    @database_sync_to_async
-    def get_package_data(self):
-        """Get current package data from database"""
-        try:
-            # Use select_related for better performance
-            package = Package.objects.select_related('sender').get(
-                tracking_number=self.tracking_number
-            )
-            
-            # Get recent tracking events (last 10)
-            recent_events = TrackingEvent.objects.filter(
-                package=package
-            ).select_related('created_by').order_by('-timestamp')[:10]
-            
-            return {
-                'tracking_number': package.tracking_number,
-                'status': package.status,
-                'current_location': package.current_location,
-                'latitude': float(package.current_latitude) if package.current_latitude else None,
-                'longitude': float(package.current_longitude) if package.current_longitude else None,
-                'estimated_delivery': package.estimated_delivery.isoformat() if package.estimated_delivery else None,
-                'last_updated': package.updated_at.isoformat(),
-                'recipient_name': package.recipient_name,
-                'recipient_address': package.recipient_address,
-                'sender_name': package.sender_name,
-                'weight': str(package.weight),
-                'package_type': package.package_type,
-                'tracking_events': [
-                    {
-                        'id': event.id,
-                        'status': event.status,
-                        'description': event.description,
-                        'location': event.location,
-                        'timestamp': event.timestamp.isoformat(),
-                        'created_by': event.created_by.username if event.created_by else 'System'
-                    } for event in recent_events
-                ]
-            }
-        except Package.DoesNotExist:
-            return None
-        except Exception as e:
-            # Log error but don't crash
-            print(f"Error getting package data: {e}")
-            return None
+    async def get_package_data(self):
+        """Get current package data from the shared tracking snapshot"""
+        return await shared_package_snapshot(self.tracking_number)
 
 
-class NotificationsConsumer(AsyncWebsocketConsumer):
+class NotificationsConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for real-time notifications"""
 
     async def connect(self):
         try:
-            # Authenticate user from token
-            self.user = await self.get_user_from_token()
+            # Set by JWTAuthMiddleware
+            self.user = self.scope['user']
 
             if isinstance(self.user, AnonymousUser):
                 # For development, allow anonymous connections
@@ -195,10 +192,8 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
                     # Create anonymous group for development
                     self.room_group_name = f'anonymous_{id(self)}'
                     
-                    await self.channel_layer.group_add(
-                        self.room_group_name,
-                        self.channel_name
-                    )
+                    if not await self.join_group(self.room_group_name):
+                        return
                     
                     await self.accept()
                     
@@ -219,10 +214,8 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
             # Authenticated user connection
             self.room_group_name = f'notifications_{self.user.id}'
 
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
+            if not await self.join_group(self.room_group_name):
+                return
 
             await self.accept()
 
@@ -250,32 +243,6 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             print(f"[WS] Disconnect error: {e}")
 
-    @database_sync_to_async
-    def get_user_from_token(self):
-        try:
-            query_string = self.scope.get('query_string', b'').decode()
-            token = None
-
-            if query_string:
-                for param in query_string.split('&'):
-                    if param.startswith('token='):
-                        token = param.split('=', 1)[1]  # Use split with maxsplit
-                        break
-
-            if token:
-                # URL decode the token
-                from urllib.parse import unquote
-                token = unquote(token)
-                
-                access_token = AccessToken(token)
-                user_id = access_token['user_id']
-                user = User.objects.get(id=user_id)
-                return user
-
-            return AnonymousUser()
-        except Exception as e:
-            print(f"[WS] Token validation error: {e}")
-            return AnonymousUser()
 
     async def receive(self, text_data):
         """Handle incoming WebSocket messages"""
@@ -333,15 +300,15 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
     def get_user_packages(self):
         """Get user's packages with recent status"""
         try:
-            # Get user's packages (sent packages)
-            packages = Package.objects.filter(sender=self.user).order_by('-created_at')[:10]
+            # Get user's packages (sent packages) with their latest event
+            packages = attach_latest_events(with_latest_event(
+                Package.objects.filter(sender_id=self.user.id)
+            ).order_by('-created_at')[:10])
 
             package_data = []
             for package in packages:
-                # Get latest tracking event
-                latest_event = TrackingEvent.objects.filter(
-                    package=package
-                ).order_by('-timestamp').first()
+                event = package.latest_event
+                has_event = event is not None
 
                 package_data.append({
                     'id': package.id,
@@ -356,11 +323,11 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
                     'longitude': float(package.current_longitude) if package.current_longitude else None,
                     'estimated_delivery': package.estimated_delivery.isoformat() if package.estimated_delivery else None,
                     'latest_event': {
-                        'status': latest_event.status if latest_event else package.status,
-                        'description': latest_event.description if latest_event else f'Package {package.status}',
-                        'location': latest_event.location if latest_event else package.current_location,
-                        'timestamp': latest_event.timestamp.isoformat() if latest_event else package.created_at.isoformat(),
-                    } if latest_event or package.status != 'pending' else None
+                        'status': event.status if has_event else package.status,
+                        'description': event.description if has_event else f'Package {package.status}',
+                        'location': event.location if has_event else package.current_location,
+                        'timestamp': event.timestamp.isoformat() if has_event else package.created_at.isoformat(),
+                    } if has_event or package.status != 'pending' else None
                 })
 
             return package_data
@@ -393,6 +360,14 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
                 'data': event['data']
             }))
 
+    async def new_packages(self, event):
+        """Handle a batch of packages created through bulk intake"""
+        if event['data'].get('sender_id') == self.user.id:
+            await self.send(text_data=json.dumps({
+                'type': 'new_packages',
+                'data': event['data']
+            }))
+
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
         """Mark notification as read (placeholder for future implementation)"""
@@ -400,13 +375,13 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
         pass
 
 
-class DriverConsumer(AsyncWebsocketConsumer):
+class DriverConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for driver real-time updates"""
 
     async def connect(self):
         try:
-            # Authenticate driver from token
-            self.user = await self.get_user_from_token()
+            # Set by JWTAuthMiddleware
+            self.user = self.scope['user']
 
             # Debug logging (only in development)
             if os.getenv('DJANGO_ENV') == 'development':
@@ -427,12 +402,11 @@ class DriverConsumer(AsyncWebsocketConsumer):
             # Create driver-specific group
             self.room_group_name = f'driver_{self.user.id}'
 
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
+            if not await self.join_group(self.room_group_name):
+                return
 
             await self.accept()
+            driver_locations.ensure_flusher()
 
             await self.send(text_data=json.dumps({
                 'type': 'connection_established',
@@ -456,37 +430,11 @@ class DriverConsumer(AsyncWebsocketConsumer):
                     self.room_group_name,
                     self.channel_name
                 )
+                driver_locations.forget(self.user.id)
                 logger.info(f"[WS] Driver disconnected - User: {getattr(self.user, 'email', 'unknown')}")
         except Exception as e:
             logger.error(f"[WS] Driver disconnect error: {e}")
 
-    @database_sync_to_async
-    def get_user_from_token(self):
-        try:
-            query_string = self.scope.get('query_string', b'').decode()
-            token = None
-
-            if query_string:
-                for param in query_string.split('&'):
-                    if param.startswith('token='):
-                        token = param.split('=', 1)[1]
-                        break
-
-            if token:
-                # URL decode the token
-                from urllib.parse import unquote
-                token = unquote(token)
-
-                access_token = AccessToken(token)
-                user_id = access_token['user_id']
-                user = User.objects.get(id=user_id)
-                return user
-
-            return AnonymousUser()
-        except Exception as e:
-            print(f"[WS] Driver token validation error: {e}")
-            return AnonymousUser()
-
     async def receive(self, text_data):
         try:
             text_data_json = json.loads(text_data)
@@ -516,8 +464,14 @@ class DriverConsumer(AsyncWebsocketConsumer):
             longitude = data.get('longitude')
 
             if latitude is not None and longitude is not None:
-                # Update driver's location in database/cache
-                # You can implement this based on your driver model
+                # Buffered in memory; persisted and broadcast by the flusher
+                if not driver_locations.record(self.user.id, latitude, longitude):
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'Invalid coordinates'
+                    }))
+                    return
+
                 await self.send(text_data=json.dumps({
                     'type': 'location_updated',
                     'latitude': latitude,
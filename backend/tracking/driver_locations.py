@@ -0,0 +1,240 @@
+# backend/tracking/driver_locations.py
+"""
+Driver GPS ingestion.
+
+``DriverConsumer`` records every ping in a bounded per-driver ring buffer in
+process memory. Recording happens on the event loop and costs one deque
+append. A driver's socket stays on one process, so its pings never need to
+be shared.
+
+Every ``DRIVER_LOCATION_FLUSH_INTERVAL`` seconds a single flusher task per
+process drains the buffers and persists them in a worker thread:
+
+* the latest position of every driver, as one upsert into ``DriverLocation``;
+* a downsampled history (at most one ping per
+  ``DRIVER_LOCATION_SAMPLE_INTERVAL`` seconds per driver), as one bulk insert
+  into ``DriverLocationSample``;
+* the position of every package still to be delivered on the driver's
+  in-progress route, as one bulk UPDATE per chunk of drivers.
+
+Tracking subscribers then get a ``package_location`` message, at most once
+per package every ``DRIVER_LOCATION_BROADCAST_INTERVAL`` seconds.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from swiftcourier_backend.cache_utils import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Package statuses that travel with the driver
+ON_BOARD_STATUSES = ('picked_up', 'in_transit', 'out_for_delivery')
+
+
+def parse_position(latitude, longitude):
+    """Return ``(latitude, longitude)`` as floats, or None when out of range"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+class DriverLocationPipeline:
+
+    def __init__(self):
+        self.buffer_size = getattr(settings, 'DRIVER_LOCATION_BUFFER_SIZE', 30)
+        self.flush_interval = getattr(settings, 'DRIVER_LOCATION_FLUSH_INTERVAL', 5)
+        self.sample_interval = getattr(settings, 'DRIVER_LOCATION_SAMPLE_INTERVAL', 30)
+        self.chunk_size = getattr(settings, 'DRIVER_LOCATION_FLUSH_CHUNK_SIZE', 1000)
+        # Pings since the last flush, per driver id: (latitude, longitude, epoch seconds)
+        self._buffers = {}
+        # Epoch seconds of the last stored sample, per driver id
+        self._sampled_at = {}
+        # Tracking numbers broadcast recently; entries expire after the throttle interval
+        self._broadcast = LocalLRUCache(
+            max_entries=getattr(settings, 'DRIVER_LOCATION_BROADCAST_MAX_ENTRIES', 500000),
+            timeout=getattr(settings, 'DRIVER_LOCATION_BROADCAST_INTERVAL', 5)
+        )
+        self._flusher = None
+        self.pings = 0
+        self.flushes = 0
+
+    def record(self, driver_id, latitude, longitude, recorded_at=None):
+        """Buffer one ping; returns False when the position is invalid"""
+        position = parse_position(latitude, longitude)
+        if position is None:
+            return False
+        pings = self._buffers.get(driver_id)
+        if pings is None:
+            pings = self._buffers[driver_id] = deque(maxlen=self.buffer_size)
+        pings.append((position[0], position[1], recorded_at or time.time()))
+        self.pings += 1
+        return True
+
+    def forget(self, driver_id):
+        """Drop per-driver state once a driver disconnects; buffered pings still flush"""
+        self._sampled_at.pop(driver_id, None)
+
+    def drain(self):
+        """
+        Take the buffered pings. Returns ``(latest, samples)``: the newest ping
+        per driver and the downsampled pings to keep as history.
+        """
+        buffers, self._buffers = self._buffers, {}
+        latest, samples = {}, []
+        for driver_id, pings in buffers.items():
+            if not pings:
+                continue
+            latest[driver_id] = pings[-1]
+            sampled_at = self._sampled_at.get(driver_id, 0)
+            for ping in pings:
+                if ping[2] - sampled_at >= self.sample_interval:
+                    samples.append((driver_id, ping))
+                    sampled_at = ping[2]
+            self._sampled_at[driver_id] = sampled_at
+        return latest, samples
+
+    def persist(self, latest, samples):
+        """Write one drained batch; returns the number of packages moved"""
+        from .models import DriverLocation, DriverLocationSample
+
+        if not latest:
+            return 0
+
+        def at(epoch):
+            return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+        with transaction.atomic():
+            DriverLocation.objects.bulk_create(
+                [
+                    DriverLocation(
+                        driver_id=driver_id, latitude=round(ping[0], 7),
+                        longitude=round(ping[1], 7), recorded_at=at(ping[2])
+                    ) for driver_id, ping in latest.items()
+                ],
+                batch_size=self.chunk_size,
+                update_conflicts=True,
+                unique_fields=['driver'],
+                update_fields=['latitude', 'longitude', 'recorded_at'],
+            )
+            DriverLocationSample.objects.bulk_create(
+                [
+                    DriverLocationSample(
+                        driver_id=driver_id, latitude=round(ping[0], 7),
+                        longitude=round(ping[1], 7), recorded_at=at(ping[2])
+                    ) for driver_id, ping in samples
+                ],
+                batch_size=self.chunk_size,
+            )
+
+            moved = []
+            driver_ids = list(latest)
+            for start in range(0, len(driver_ids), self.chunk_size):
+                moved.extend(self._move_packages(driver_ids[start:start + self.chunk_size]))
+
+        self.flushes += 1
+        self._broadcast_positions(moved, latest)
+        return len(moved)
+
+    def _move_packages(self, driver_ids):
+        """Copy driver positions onto their on-board packages in one UPDATE"""
+        from packages.models import Package
+        from routes.models import RouteStop
+
+        stops = RouteStop.objects.filter(
+            route__driver_id__in=driver_ids,
+            route__status='in_progress',
+            status='pending',
+            package__status__in=ON_BOARD_STATUSES,
+        )
+        moved = list(stops.values_list(
+            'package_id', 'package__tracking_number', 'route__driver_id', 'package__sender_id'
+        ))
+        if not moved:
+            return moved
+
+        position = stops.filter(package=OuterRef('pk'))
+        Package.objects.filter(id__in=[row[0] for row in moved]).update(
+            current_latitude=Subquery(position.values('route__driver__driver_location__latitude')[:1]),
+            current_longitude=Subquery(position.values('route__driver__driver_location__longitude')[:1]),
+            # .update() skips auto_now; snapshots report this as last_updated
+            updated_at=timezone.now(),
+        )
+        return moved
+
+    def _broadcast_positions(self, moved, latest):
+        from packages.list_cache import package_list_cache
+        from packages.snapshots import tracking_snapshots
+        from .broadcasts import send_group_messages
+
+        # Cached package lists carry the old positions too
+        for sender_id in {row[3] for row in moved}:
+            package_list_cache.bump(sender_id)
+
+        messages = []
+        for package_id, tracking_number, driver_id, _ in moved:
+            # Every moved package, broadcast or not: the cached snapshot
+            # carries the old position
+            tracking_snapshots.invalidate(tracking_number)
+            if self._broadcast.get(tracking_number) is not None:
+                continue
+            self._broadcast.set(tracking_number, True)
+            latitude, longitude, recorded_at = latest[driver_id]
+            messages.append((f'tracking_{tracking_number}', {
+                'type': 'package_location',
+                'data': {
+                    'package_id': package_id,
+                    'tracking_number': tracking_number,
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'recorded_at': datetime.fromtimestamp(recorded_at, tz=dt_timezone.utc).isoformat(),
+                },
+            }))
+
+        try:
+            send_group_messages(messages)
+        except Exception as e:
+            logger.warning(f"Driver location broadcasts failed: {e}")
+
+    async def flush(self):
+        latest, samples = self.drain()
+        if latest:
+            # Off the shared sync thread, so consumers' queries do not queue behind it
+            await database_sync_to_async(self.persist, thread_sensitive=False)(latest, samples)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # The positions are superseded by the next pings, so a failed
+                # batch is dropped rather than retried
+                logger.error(f"Driver location flush failed: {e}")
+
+    def ensure_flusher(self):
+        """Start the flusher task on the running event loop unless it is running"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._run())
+
+    def stats(self):
+        return {
+            'drivers_buffered': len(self._buffers),
+            'pings': self.pings,
+            'flushes': self.flushes,
+        }
+
+
+driver_locations = DriverLocationPipeline()
@@ -0,0 +1,79 @@
+# backend/tracking/management/commands/benchmark_driver_locations.py
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tracking.driver_locations import DriverLocationPipeline
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Replay driver GPS pings through the ingestion pipeline and time each stage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=10000)
+        parser.add_argument('--period', type=float, default=2.0, help='Seconds between pings of one driver')
+        parser.add_argument('--flushes', type=int, default=6, help='Flush intervals to replay')
+        parser.add_argument('--persist', action='store_true', help='Also write each batch (rolled back afterwards)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not options['persist']:
+            self._run(options, driver_ids=list(range(1, options['drivers'] + 1)))
+            return
+        try:
+            with transaction.atomic():
+                User = get_user_model()
+                users = User.objects.bulk_create([
+                    User(username=f'benchmark-driver-{i}', user_type='driver')
+                    for i in range(options['drivers'])
+                ], batch_size=1000)
+                self._run(options, driver_ids=[user.pk for user in users])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, options, driver_ids):
+        rng = random.Random(options['seed'])
+        pipeline = DriverLocationPipeline()
+        period = options['period']
+        pings_per_flush = max(1, round(pipeline.flush_interval / period))
+        positions = {driver_id: (40.7128 + rng.uniform(-0.3, 0.3), -74.0060 + rng.uniform(-0.3, 0.3)) for driver_id in driver_ids}
+
+        clock = time.time()
+        record_time = drain_time = persist_time = 0.0
+        pings = 0
+        for _ in range(options['flushes']):
+            start = time.perf_counter()
+            for _ in range(pings_per_flush):
+                clock += period
+                for driver_id, (lat, lng) in positions.items():
+                    pipeline.record(driver_id, lat + rng.uniform(-1e-4, 1e-4), lng + rng.uniform(-1e-4, 1e-4), clock)
+                    pings += 1
+            record_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            latest, samples = pipeline.drain()
+            drain_time += time.perf_counter() - start
+
+            if options['persist']:
+                start = time.perf_counter()
+                pipeline.persist(latest, samples)
+                persist_time += time.perf_counter() - start
+
+        required = len(driver_ids) / period
+        self.stdout.write(
+            f'{pings} pings from {len(driver_ids)} drivers: record {pings / record_time:,.0f} pings/s '
+            f'(load needs {required:,.0f}/s), drain {drain_time / options["flushes"] * 1000:.1f}ms per flush'
+        )
+        if options['persist']:
+            self.stdout.write(
+                f'Persist: {persist_time / options["flushes"] * 1000:.1f}ms per flush '
+                f'(budget {pipeline.flush_interval * 1000:.0f}ms)'
+            )
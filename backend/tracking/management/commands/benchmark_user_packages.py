@@ -0,0 +1,69 @@
+# backend/tracking/management/commands/benchmark_user_packages.py
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from packages.bulk import create_packages_in_bulk
+from packages.models import Package
+from tracking.models import TrackingEvent, attach_latest_events, with_latest_event
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-package latest-event lookup with the subquery annotation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=5000, help='Packages owned by the benchmark user')
+        parser.add_argument('--limit', type=int, default=10, help='Packages listed, as on connect')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        User = get_user_model()
+        user = User.objects.create(username='benchmark-latest-event', email='latest@example.com')
+        rows = [
+            {
+                'recipient_name': f'Recipient {i}',
+                'recipient_address': f'{i} Main Street',
+                'weight': Decimal('1.00'),
+                'shipping_cost': Decimal('12.00'),
+            }
+            for i in range(options['packages'])
+        ]
+        create_packages_in_bulk(user, rows)
+        self.stdout.write(f'Created {options["packages"]} packages (rolled back afterwards)')
+
+        limit, repeat = options['limit'], options['repeat']
+
+        def per_package():
+            packages = Package.objects.filter(sender=user).order_by('-created_at')[:limit]
+            return [
+                TrackingEvent.objects.filter(package=package).order_by('-timestamp').first()
+                for package in packages
+            ]
+
+        def annotated():
+            return attach_latest_events(with_latest_event(Package.objects.filter(sender=user)).order_by('-created_at')[:limit])
+
+        for label, func in (('Per-package lookups', per_package), ('Latest-event id and bulk load', annotated)):
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            elapsed = (time.perf_counter() - start) / repeat
+            self.stdout.write(f'{label}: {len(queries)} queries, {elapsed * 1000:.2f}ms per call')
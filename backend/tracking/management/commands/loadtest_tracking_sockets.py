@@ -0,0 +1,111 @@
+# backend/tracking/management/commands/loadtest_tracking_sockets.py
+import asyncio
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from swiftcourier_backend.channel_layers import TRACKING_LAYER_ALIAS
+from swiftcourier_backend.ws_auth import JWTAuthMiddleware
+from tracking.consumers import TrackingConsumer
+
+
+class Command(BaseCommand):
+    help = 'Open many concurrent TrackingConsumer sockets and measure broadcast fan-out latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=50000)
+        parser.add_argument('--groups', type=int, default=500, help='Distinct tracking numbers')
+        parser.add_argument('--concurrency', type=int, default=1000, help='Sockets connected at once')
+        parser.add_argument('--messages', type=int, default=5, help='Broadcasts per group')
+        parser.add_argument('--timeout', type=float, default=10.0)
+        parser.add_argument('--token', help='Access token to connect with; anonymous when omitted')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer(TRACKING_LAYER_ALIAS)
+        backend = f'{type(layer).__module__}.{type(layer).__name__}'
+        self.stdout.write(f'Tracking layer: {backend}')
+        if 'redis' not in backend.lower():
+            self.stdout.write(self.style.WARNING(
+                'The tracking layer is in-memory; start Redis (REDIS_URL) to test cross-process fan-out'
+            ))
+        asyncio.run(self._run(layer, options))
+
+    async def _run(self, layer, options):
+        # The consumer reads scope['user'], which the middleware sets as in asgi.py
+        application = JWTAuthMiddleware(TrackingConsumer.as_asgi())
+        path_suffix = f"?token={options['token']}" if options['token'] else ''
+        tracking_numbers = [f'LOADTEST{i:06d}' for i in range(options['groups'])]
+        timeout = options['timeout']
+
+        communicators = []
+        failures = 0
+        start = time.perf_counter()
+        for offset in range(0, options['sockets'], options['concurrency']):
+            batch = []
+            for i in range(offset, min(offset + options['concurrency'], options['sockets'])):
+                tracking_number = tracking_numbers[i % len(tracking_numbers)]
+                communicator = WebsocketCommunicator(
+                    application, f'/ws/tracking/{tracking_number}/{path_suffix}'
+                )
+                communicator.scope['url_route'] = {'kwargs': {'tracking_number': tracking_number}}
+                batch.append(communicator)
+
+            results = await asyncio.gather(
+                *(communicator.connect(timeout=timeout) for communicator in batch),
+                return_exceptions=True
+            )
+            for communicator, result in zip(batch, results):
+                if isinstance(result, Exception) or not result[0]:
+                    failures += 1
+                else:
+                    communicators.append(communicator)
+
+        # Drain the connection messages so only broadcasts remain queued
+        await asyncio.gather(*(self._drain(communicator) for communicator in communicators))
+        connect_elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Connected {len(communicators)} sockets in {connect_elapsed:.1f}s '
+            f'({len(communicators) / connect_elapsed:,.0f}/s), {failures} failed'
+        )
+
+        latencies = []
+        missed = 0
+        for sequence in range(options['messages']):
+            sent_at = time.perf_counter()
+            await asyncio.gather(*(
+                layer.group_send(f'tracking_{tracking_number}', {
+                    'type': 'package_update',
+                    'data': {'tracking_number': tracking_number, 'sequence': sequence},
+                })
+                for tracking_number in tracking_numbers
+            ))
+            results = await asyncio.gather(
+                *(communicator.receive_json_from(timeout=timeout) for communicator in communicators),
+                return_exceptions=True
+            )
+            received_at = time.perf_counter()
+            for result in results:
+                if isinstance(result, Exception):
+                    missed += 1
+            latencies.append(received_at - sent_at)
+
+        delivered = len(communicators) * options['messages'] - missed
+        self.stdout.write(f'Delivered {delivered} messages, {missed} missed')
+        if latencies:
+            ordered = sorted(latencies)
+            self.stdout.write(
+                f'Full fan-out per round: median {statistics.median(ordered) * 1000:.0f}ms, '
+                f'max {ordered[-1] * 1000:.0f}ms'
+            )
+
+        await asyncio.gather(
+            *(communicator.disconnect() for communicator in communicators),
+            return_exceptions=True
+        )
+
+    async def _drain(self, communicator):
+        while not await communicator.receive_nothing(timeout=0.1):
+            await communicator.receive_output()
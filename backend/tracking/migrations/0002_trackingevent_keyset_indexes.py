@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['package', 'timestamp', 'id'], name='trackingevent_package_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['timestamp', 'id'], name='trackingevent_timestamp_idx'),
+        ),
+    ]
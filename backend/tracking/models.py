@@ -16,6 +16,94 @@ class TrackingEvent(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Keyset pagination on (timestamp, id), per package and overall
+            models.Index(fields=['package', 'timestamp', 'id'], name='trackingevent_package_ts_idx'),
+            models.Index(fields=['timestamp', 'id'], name='trackingevent_timestamp_idx'),
+        ]
+
+    @classmethod
+    def initial_events_for(cls, package):
+        """Build (unsaved) events recorded when a package is first created"""
+        events = [
+            cls(
+                package=package,
+                status='created',
+                description=f'Package created and ready for pickup at {package.sender_address}',
+                location=package.sender_address,
+                latitude=package.current_latitude or None,
+                longitude=package.current_longitude or None,
+                created_by=package.sender
+            )
+        ]
+
+        # If package has a pending status, create another event
+        if package.status == 'pending':
+            events.append(cls(
+                package=package,
+                status='pending',
+                description='Package is pending pickup',
+                location=package.sender_address,
+                latitude=package.current_latitude or None,
+                longitude=package.current_longitude or None,
+                created_by=package.sender
+            ))
+
+        return events
 
     def __str__(self):
         return f"{self.package.tracking_number} - {self.status}"
+
+
+class DriverLocation(models.Model):
+    """Latest known position of a driver, written in batches by the ingestion pipeline"""
+    driver = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='driver_location')
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    recorded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.driver_id} @ {self.latitude},{self.longitude}"
+
+
+class DriverLocationSample(models.Model):
+    """Downsampled history of driver positions"""
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_samples')
+    latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['driver', 'recorded_at'], name='driverlocsample_driver_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_id} @ {self.recorded_at}"
+
+
+LATEST_EVENT_FIELDS = ('id', 'status', 'description', 'location', 'timestamp')
+
+
+def with_latest_event(packages):
+    """
+    Annotate a Package queryset with ``latest_event_id``, the newest tracking
+    event of each package, from one correlated subquery served by the
+    (package, timestamp, id) index. ``attach_latest_events`` loads the events.
+    """
+    latest = TrackingEvent.objects.filter(package=models.OuterRef('pk')).order_by('-timestamp', '-id')
+    return packages.annotate(latest_event_id=models.Subquery(latest.values('id')[:1]))
+
+
+def attach_latest_events(packages):
+    """
+    Evaluate ``packages`` from ``with_latest_event`` and set ``latest_event``
+    (None without events) on each, fetching every event in one query.
+    """
+    packages = list(packages)
+    ids = [package.latest_event_id for package in packages if package.latest_event_id is not None]
+    events = TrackingEvent.objects.only(*LATEST_EVENT_FIELDS).in_bulk(ids) if ids else {}
+    for package in packages:
+        package.latest_event = events.get(package.latest_event_id)
+    return packages
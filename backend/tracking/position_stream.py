@@ -0,0 +1,102 @@
+# backend/tracking/position_stream.py
+"""
+Compact position stream for tracking sockets.
+
+A ``TrackingConsumer`` in stream mode no longer forwards every package
+broadcast. Updates are merged into one pending frame, so intermediate
+positions collapse into the latest one. The frame is sent at most ``rate``
+times per second and carries only the fields that changed since the previous
+frame on that socket.
+"""
+import asyncio
+import json
+import math
+import time
+
+from django.conf import settings
+
+_MISSING = object()
+
+# Broadcast fields streamed to clients; identifiers never change on a socket
+PACKAGE_UPDATE_FIELDS = {
+    'status': 'status',
+    'current_location': 'location',
+    'latitude': 'lat',
+    'longitude': 'lng',
+    'estimated_delivery': 'eta',
+    'last_updated': 'at',
+}
+PACKAGE_LOCATION_FIELDS = {
+    'latitude': 'lat',
+    'longitude': 'lng',
+    'recorded_at': 'at',
+}
+
+
+def stream_fields(data, names):
+    """Pick and rename the streamed fields of a broadcast payload"""
+    precision = getattr(settings, 'TRACKING_STREAM_COORDINATE_PRECISION', 5)
+    fields = {}
+    for name, short in names.items():
+        if name in data:
+            value = data[name]
+            # Rounded so GPS jitter below ~1m is not a change
+            if short in ('lat', 'lng') and value is not None:
+                value = round(value, precision)
+            fields[short] = value
+    return fields
+
+
+def clamp_rate(rate):
+    """Frames per second a client may ask for, within TRACKING_STREAM_MAX_RATE"""
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        rate = None
+    # json.loads accepts NaN and Infinity, and NaN slips through min/max
+    if rate is None or not math.isfinite(rate):
+        rate = getattr(settings, 'TRACKING_STREAM_DEFAULT_RATE', 1)
+    return min(max(rate, 0.1), getattr(settings, 'TRACKING_STREAM_MAX_RATE', 5))
+
+
+class PositionStream:
+
+    def __init__(self, send, rate):
+        self._send = send
+        self.interval = 1 / clamp_rate(rate)
+        self._sent = {}
+        self._pending = {}
+        self._sent_at = 0.0
+        self._timer = None
+        self.seq = 0
+
+    def push(self, fields):
+        """Merge ``fields`` into the next frame and schedule it"""
+        self._pending.update(fields)
+        if self._timer is None or self._timer.done():
+            delay = self._sent_at + self.interval - time.monotonic()
+            self._timer = asyncio.ensure_future(self._flush_after(max(delay, 0)))
+
+    def reset(self):
+        """Make the next frame carry every field again"""
+        self._sent = {}
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_after(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        pending, self._pending = self._pending, {}
+        delta = {name: value for name, value in pending.items() if self._sent.get(name, _MISSING) != value}
+        if not delta:
+            return
+        self._sent.update(delta)
+        self._sent_at = time.monotonic()
+        self.seq += 1
+        await self._send(text_data=json.dumps({'type': 'position', 'seq': self.seq, 'd': delta}, separators=(',', ':')))
+        # Updates that arrived while sending go out in the next slot
+        if self._pending:
+            self._timer = asyncio.ensure_future(self._flush_after(self.interval))
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from swiftcourier_backend.instrumentation import TimedSerializerMixin
 from .models import TrackingEvent
 
-class TrackingEventSerializer(serializers.ModelSerializer):
+class TrackingEventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
 
     class Meta:
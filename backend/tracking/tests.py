@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import json
+import time
+from decimal import Decimal
+from unittest import mock
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from packages.list_cache import package_list_cache
+from packages.models import Package
+from routes.models import Route, RouteStop
+from tracking.connections import (
+    CLOSE_HEARTBEAT_TIMEOUT, CLOSE_TOO_MANY_CONNECTIONS, HeartbeatMixin, connection_registry,
+)
+from tracking.driver_locations import DriverLocationPipeline
+from tracking.models import TrackingEvent, attach_latest_events, with_latest_event
+from tracking.position_stream import PositionStream, clamp_rate
+
+User = get_user_model()
+
+
+class DriverLocationPipelineTests(TestCase):
+
+    def setUp(self):
+        self.driver = User.objects.create_user(username='driver', password='pw-12345678', user_type='driver')
+        route = Route.objects.create(driver=self.driver, route_date=timezone.localdate(), status='in_progress')
+        self.packages = []
+        for n in range(2):
+            package = Package.objects.create(sender=self.driver, weight=Decimal('1.00'), status='in_transit')
+            RouteStop.objects.create(route=route, package=package, stop_order=n + 1, address=f'{n} Main Street')
+            self.packages.append(package)
+        Package.objects.update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+
+    def test_every_moved_package_is_invalidated(self):
+        pipeline = DriverLocationPipeline()
+        # The first package was broadcast moments ago
+        pipeline._broadcast.set(self.packages[0].tracking_number, True)
+
+        with mock.patch('packages.snapshots.tracking_snapshots.invalidate') as invalidate, \
+                mock.patch('tracking.broadcasts.send_group_messages') as send:
+            moved = pipeline.persist({self.driver.id: (40.5, -75.5, time.time())}, [])
+
+        self.assertEqual(moved, 2)
+        self.assertCountEqual([call.args[0] for call in invalidate.call_args_list],
+                              [package.tracking_number for package in self.packages])
+        self.assertEqual(len(send.call_args.args[0]), 1)
+        for package in Package.objects.all():
+            self.assertEqual(package.current_latitude, Decimal('40.5'))
+            self.assertGreater(package.updated_at, timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_cached_package_list_shows_new_position(self):
+        package_list_cache._local.clear()
+        customer = User.objects.create_user(username='customer', password='pw-12345678')
+        Package.objects.update(sender=customer)
+        self.client.force_login(customer)
+
+        def positions():
+            response = self.client.get('/api/packages/', secure=True)
+            self.assertEqual(response.status_code, 200)
+            return {package['current_latitude'] for package in response.json()['results']}
+
+        self.assertEqual(positions(), {'0.00000000'})
+        with mock.patch('tracking.broadcasts.send_group_messages'):
+            DriverLocationPipeline().persist({self.driver.id: (40.5, -75.5, time.time())}, [])
+        self.assertEqual(positions(), {'40.50000000'})
+
+
+class LatestEventTests(TestCase):
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='merchant', password='pw-12345678')
+
+    def create_packages(self, count):
+        for n in range(count):
+            package = Package.objects.create(sender=self.sender, weight=Decimal('1.00'), status='in_transit')
+            TrackingEvent.objects.create(package=package, status='in_transit', description=f'Departed {n}')
+
+    def latest(self):
+        return attach_latest_events(
+            with_latest_event(Package.objects.filter(sender=self.sender)).order_by('-created_at')
+        )
+
+    def test_query_count_does_not_grow_with_packages(self):
+        for count in (1, 10):
+            with self.subTest(count=count):
+                Package.objects.all().delete()
+                self.create_packages(count)
+                with self.assertNumQueries(2):
+                    packages = self.latest()
+                self.assertEqual(len(packages), count)
+
+    def test_newest_event_of_each_package(self):
+        moving = Package.objects.create(sender=self.sender, weight=Decimal('1.00'), status='in_transit')
+        moving.tracking_events.update(timestamp=timezone.now() - datetime.timedelta(hours=1))
+        newest = TrackingEvent.objects.create(package=moving, status='in_transit', description='Departed')
+        quiet = Package.objects.create(sender=self.sender, weight=Decimal('1.00'))
+        quiet.tracking_events.all().delete()
+
+        packages = {package.id: package for package in self.latest()}
+
+        self.assertEqual(packages[moving.id].latest_event, newest)
+        self.assertIsNone(packages[quiet.id].latest_event)
+
+
+class PositionStreamTests(SimpleTestCase):
+
+    def setUp(self):
+        self.frames = []
+
+    async def send(self, text_data):
+        self.frames.append(json.loads(text_data))
+
+    def test_rate_is_clamped(self):
+        self.assertEqual(clamp_rate('2'), 2)
+        self.assertEqual(clamp_rate(100), 5)
+        self.assertEqual(clamp_rate(0), 0.1)
+        for rate in (None, 'fast', float('nan'), 'NaN', float('inf'), float('-inf')):
+            with self.subTest(rate=rate):
+                self.assertEqual(clamp_rate(rate), 1)
+
+    async def test_updates_coalesce_into_one_delta_frame(self):
+        stream = PositionStream(self.send, 5)
+        stream.push({'lat': 40.1, 'lng': -75.1, 'status': 'in_transit'})
+        stream.push({'lat': 40.2})
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.frames, [
+            {'type': 'position', 'seq': 1, 'd': {'lat': 40.2, 'lng': -75.1, 'status': 'in_transit'}},
+        ])
+
+        stream.push({'lat': 40.3, 'lng': -75.1})
+        await asyncio.sleep(0.01)
+        # The next slot is a fifth of a second after the first frame
+        self.assertEqual(len(self.frames), 1)
+        await asyncio.sleep(0.3)
+        self.assertEqual(self.frames[-1], {'type': 'position', 'seq': 2, 'd': {'lat': 40.3}})
+        stream.close()
+
+    async def test_closed_stream_sends_nothing(self):
+        stream = PositionStream(self.send, 5)
+        stream.push({'lat': 40.1})
+        stream.close()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.frames, [])
+
+
+class GroupConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
+
+    async def connect(self):
+        if await self.join_group('heartbeat-test'):
+            await self.accept()
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    WEBSOCKET_PING_INTERVAL=0.05,
+    WEBSOCKET_PING_TIMEOUT=0.05,
+)
+class HeartbeatTests(SimpleTestCase):
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(GroupConsumer.as_asgi(), '/ws/test/')
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def test_silent_socket_is_closed_and_leaves_its_group(self):
+        communicator, connected, _ = await self.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'heartbeat')
+
+        closed = await communicator.receive_output(timeout=1)
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': CLOSE_HEARTBEAT_TIMEOUT})
+        self.assertEqual(connection_registry.subscribers('heartbeat-test'), 0)
+        await communicator.disconnect()
+
+    async def test_acknowledged_heartbeat_keeps_the_socket_open(self):
+        communicator, _, _ = await self.connect()
+        for _ in range(3):
+            self.assertEqual((await communicator.receive_json_from())['type'], 'heartbeat')
+            await communicator.send_json_to({'type': 'heartbeat_ack'})
+        self.assertEqual(connection_registry.subscribers('heartbeat-test'), 1)
+        await communicator.disconnect()
+        self.assertEqual(connection_registry.subscribers('heartbeat-test'), 0)
+
+    async def test_sockets_past_the_connection_limit_are_rejected(self):
+        with self.settings(WEBSOCKET_MAX_CONNECTIONS=connection_registry.stats()['connections'] + 1):
+            first, connected, _ = await self.connect()
+            second, rejected, code = await self.connect()
+
+        self.assertTrue(connected)
+        self.assertEqual((rejected, code), (False, CLOSE_TOO_MANY_CONNECTIONS))
+        await first.disconnect()
+        await second.disconnect()
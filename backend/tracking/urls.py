@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'admin/events', views.AdminTrackingEventViewSet, basename='admin-tracking-events')
 
 urlpatterns = [
+    path('admin/websocket-stats/', views.websocket_stats, name='websocket-stats'),
     path('<str:tracking_number>/events/', views.TrackingEventListView.as_view(), name='tracking-events'),
     path('', include(router.urls)),  # Include admin routes
 ]
@@ -1,21 +1,25 @@
 from rest_framework import generics, viewsets
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from .models import TrackingEvent
+from .connections import connection_registry
 from .serializers import TrackingEventSerializer
+from swiftcourier_backend.pagination import KeysetStreamingMixin, TimestampKeysetPagination
 
-class TrackingEventListView(generics.ListAPIView):
+class TrackingEventListView(KeysetStreamingMixin, generics.ListAPIView):
     serializer_class = TrackingEventSerializer
+    pagination_class = TimestampKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         tracking_number = self.kwargs.get('tracking_number')
         return TrackingEvent.objects.filter(package__tracking_number=tracking_number)
 
-class AdminTrackingEventViewSet(viewsets.ModelViewSet):
+class AdminTrackingEventViewSet(KeysetStreamingMixin, viewsets.ModelViewSet):
     queryset = TrackingEvent.objects.all().select_related('package')
     serializer_class = TrackingEventSerializer
+    pagination_class = TimestampKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -30,3 +34,9 @@ class AdminTrackingEventViewSet(viewsets.ModelViewSet):
         recent_events = TrackingEvent.objects.select_related('package').order_by('-timestamp')[:10]
         serializer = self.get_serializer(recent_events, many=True)
         return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def websocket_stats(request):
+    """Admin endpoint with live socket and group subscriber counts of this process"""
+    return Response(connection_registry.stats())
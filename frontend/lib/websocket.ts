@@ -75,6 +75,11 @@ export class WebSocketManager {
       this.ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data)
+          // The server closes sockets that stop acknowledging its heartbeats
+          if (data.type === 'heartbeat') {
+            this.send({ type: 'heartbeat_ack', timestamp: data.timestamp })
+            return
+          }
             this.emit(data.type, data)
         } catch (error) {
         // Silent error handling for malformed messages
@@ -82,8 +87,8 @@ export class WebSocketManager {
       }
 
       this.ws.onclose = (event) => {
-      // Only reconnect on specific error codes
-      if (event.code === 1006 || event.code === 1008 || event.code === 1011) {
+      // Only reconnect on specific error codes; 4408 is a missed heartbeat
+      if (event.code === 1006 || event.code === 1008 || event.code === 1011 || event.code === 4408) {
         // These are recoverable errors
         this.handleReconnect()
       } else {